@@ -0,0 +1,175 @@
+import asyncio
+import logging
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Deque, Iterator, List, Optional
+
+logger = logging.getLogger("PDF_OCR_API")
+
+# Requisição já admitida (ou job em segundo plano): as próximas reservas esperam sem limite
+_admitted: ContextVar[bool] = ContextVar("admission_admitted", default=False)
+
+
+class AdmissionRejected(Exception):
+    """Sem vaga no orçamento de páginas/memória dentro do tempo de espera"""
+
+    def __init__(self, reason: str, retry_after: int):
+        super().__init__(reason)
+        self.retry_after = retry_after
+
+
+class Permit:
+    """Reserva de páginas e bytes de pixels; `release` devolve a reserva (uma única vez)"""
+
+    def __init__(self, controller: Optional["AdmissionController"], pages: int, pixel_bytes: int):
+        self._controller = controller
+        self.pages = pages
+        self.pixel_bytes = pixel_bytes
+
+    def release(self):
+        if self._controller is not None:
+            controller, self._controller = self._controller, None
+            controller._release(self.pages, self.pixel_bytes)
+
+
+class AdmissionController:
+    """
+    Controle de admissão do processo: orçamento de páginas e de bytes de pixels decodificados
+
+    Todas as requisições (e os jobs) reservam as páginas que vão renderizar e
+    processar, com a memória estimada das imagens, antes de renderizá-las, e
+    devolvem a reserva quando a página termina. Sem vaga, a reserva espera na
+    fila (ordem de chegada). A primeira reserva de uma requisição espera no
+    máximo `max_wait_seconds`, e com `max_waiting` requisições na fila ela é
+    recusada na hora (`AdmissionRejected`, para responder 503 com Retry-After).
+    Depois de admitida, a requisição não é mais recusada no meio do caminho.
+    Uma reserva maior que o orçamento inteiro é reduzida ao orçamento (a
+    requisição roda sozinha). Limites 0 desativam o respectivo orçamento.
+    """
+
+    def __init__(
+        self,
+        max_pages: int,
+        max_pixel_bytes: int,
+        max_wait_seconds: float = 30.0,
+        max_waiting: int = 100,
+        retry_after_seconds: int = 5
+    ):
+        self.max_pages = max(0, max_pages)
+        self.max_pixel_bytes = max(0, max_pixel_bytes)
+        self.max_wait_seconds = max_wait_seconds
+        self.max_waiting = max_waiting
+        self.retry_after_seconds = retry_after_seconds
+        self.pages_in_use = 0
+        self.pixel_bytes_in_use = 0
+        self.rejected = 0
+        self._waiters: Deque[List] = deque()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_pages > 0 or self.max_pixel_bytes > 0
+
+    @property
+    def waiting(self) -> int:
+        return len(self._waiters)
+
+    def _clamp(self, pages: int, pixel_bytes: int):
+        if self.max_pages:
+            pages = min(pages, self.max_pages)
+        if self.max_pixel_bytes:
+            pixel_bytes = min(pixel_bytes, self.max_pixel_bytes)
+        return pages, pixel_bytes
+
+    def _fits(self, pages: int, pixel_bytes: int) -> bool:
+        return (
+            (not self.max_pages or self.pages_in_use + pages <= self.max_pages)
+            and (not self.max_pixel_bytes or self.pixel_bytes_in_use + pixel_bytes <= self.max_pixel_bytes)
+        )
+
+    def _take(self, pages: int, pixel_bytes: int) -> Permit:
+        self.pages_in_use += pages
+        self.pixel_bytes_in_use += pixel_bytes
+        return Permit(self, pages, pixel_bytes)
+
+    def _release(self, pages: int, pixel_bytes: int):
+        self.pages_in_use -= pages
+        self.pixel_bytes_in_use -= pixel_bytes
+        self._wake_waiters()
+
+    def _wake_waiters(self):
+        # Ordem de chegada: a primeira reserva da fila bloqueia as seguintes até caber
+        while self._waiters:
+            pages, pixel_bytes, future = self._waiters[0]
+            if future.done():
+                self._waiters.popleft()
+                continue
+            if not self._fits(pages, pixel_bytes):
+                return
+            self._waiters.popleft()
+            future.set_result(self._take(pages, pixel_bytes))
+
+    def _reject(self, reason: str) -> AdmissionRejected:
+        self.rejected += 1
+        logger.warning(f"🚦 Admissão - Requisição recusada: {reason}")
+        return AdmissionRejected(reason, self.retry_after_seconds)
+
+    async def acquire(self, pages: int, pixel_bytes: int = 0) -> Permit:
+        """Reserva `pages` páginas e `pixel_bytes` bytes de pixels, esperando por vaga se necessário"""
+        if not self.enabled:
+            return Permit(None, pages, pixel_bytes)
+
+        pages, pixel_bytes = self._clamp(pages, pixel_bytes)
+        bounded = not _admitted.get()
+        if not self._waiters and self._fits(pages, pixel_bytes):
+            _admitted.set(True)
+            return self._take(pages, pixel_bytes)
+
+        if bounded and len(self._waiters) >= self.max_waiting:
+            raise self._reject(f"{len(self._waiters)} requisições aguardando vaga")
+
+        future = asyncio.get_running_loop().create_future()
+        entry = [pages, pixel_bytes, future]
+        self._waiters.append(entry)
+        try:
+            permit = await asyncio.wait_for(future, self.max_wait_seconds if bounded else None)
+        except BaseException as e:
+            # Tempo esgotado ou cancelada: devolver a reserva se ela chegou a ser concedida
+            if future.done() and not future.cancelled():
+                future.result().release()
+            else:
+                self._remove(entry)
+            if isinstance(e, asyncio.TimeoutError):
+                raise self._reject(f"sem vaga em {self.max_wait_seconds:g}s")
+            raise
+
+        _admitted.set(True)
+        return permit
+
+    def _remove(self, entry: List):
+        try:
+            self._waiters.remove(entry)
+        except ValueError:
+            pass
+        # A reserva removida podia estar bloqueando as seguintes
+        self._wake_waiters()
+
+    def snapshot(self) -> dict:
+        return {
+            "pages_in_use": self.pages_in_use,
+            "max_pages": self.max_pages,
+            "pixel_mb_in_use": round(self.pixel_bytes_in_use / (1024 * 1024), 1),
+            "max_pixel_mb": round(self.max_pixel_bytes / (1024 * 1024), 1),
+            "waiting": self.waiting,
+            "rejected": self.rejected
+        }
+
+
+@contextmanager
+def patient() -> Iterator[None]:
+    """Reservas feitas dentro do bloco esperam sem limite e nunca são recusadas (ex: jobs)"""
+    token = _admitted.set(True)
+    try:
+        yield
+    finally:
+        _admitted.reset(token)
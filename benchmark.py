@@ -0,0 +1,562 @@
+#!/usr/bin/env python3
+"""
+Benchmark de ponta a ponta dos pipelines de extração
+
+Gera PDFs sintéticos no formato das faturas Agibank e BMG (variando número de
+páginas, DPI, densidade de texto e tipo: escaneado ou digital) e executa os
+pipelines dos endpoints contra o backend de OCR simulado (OCR_BACKEND=fake).
+Renderização, recorte, codificação e parsing são os reais.
+
+Para cada cenário são medidos vazão, latência (p50/p95/p99), pico de memória
+(RSS) e o tempo gasto em cada etapa do pipeline. O resultado é um JSON com
+identificadores estáveis por cenário, para comparar execuções entre commits.
+
+Exemplos:
+    python benchmark.py --output bench.json
+    python benchmark.py --pages 1,20 --dpi 150,300 --lines 10,60 --repeat 5
+    python benchmark.py --endpoints agibank,bmg --kinds scanned,digital --concurrency 4
+    python benchmark.py --endpoints agibank,bmg --template-dpi 200,300
+"""
+
+import argparse
+import asyncio
+import io
+import json
+import logging
+import os
+import platform
+import random
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, replace
+from typing import Callable, Dict, List, Optional, Tuple
+
+from PIL import Image, ImageDraw, ImageFont
+
+# Tamanho A4 em pontos
+PAGE_WIDTH_PT = 595
+PAGE_HEIGHT_PT = 842
+
+TEMPLATES = ("agibank", "bmg")
+KINDS = ("scanned", "digital")
+
+# Endpoint -> (nome da função de pipeline em main, argumentos extras, templates aceitos)
+ENDPOINTS = {
+    "text": ("run_extract_text", {"ocr_mode": "raster"}, TEMPLATES),
+    "text-native": ("run_extract_text", {"ocr_mode": "native"}, TEMPLATES),
+    "simple": ("run_extract_text_simple", {"ocr_mode": "raster"}, TEMPLATES),
+    "agibank": ("run_extract_agibank", {}, ("agibank",)),
+    "bmg": ("run_extract_bmg", {}, ("bmg",)),
+}
+
+# Áreas de interesse (frações da página) usadas no layout sintético
+TEMPLATE_BOXES = {
+    "agibank": (0.45, 0.15, 0.95, 0.55),
+    "bmg": (0.0, 0.05, 0.92, 0.65),
+}
+
+DESCRIPTIONS = [
+    "COMPRA SUPERMERCADO", "PAGAMENTO FATURA", "TARIFA ANUIDADE", "SAQUE 24H",
+    "COMPRA FARMACIA", "ESTORNO COMPRA", "JUROS ROTATIVO", "IOF ADICIONAL",
+    "COMPRA POSTO", "SEGURO CARTAO",
+]
+
+
+# ---------------------------------------------------------------------------
+# Geração dos PDFs sintéticos
+# ---------------------------------------------------------------------------
+
+@dataclass
+class SyntheticDocument:
+    """PDF sintético de um cenário"""
+    template: str
+    kind: str
+    pages: int
+    dpi: int
+    lines: int
+    content: bytes
+
+    @property
+    def key(self) -> str:
+        return f"{self.template}/{self.kind}/p{self.pages}/dpi{self.dpi}/l{self.lines}"
+
+
+def page_lines(template: str, page_number: int, lines: int, rng: random.Random) -> List[Tuple[float, float, str]]:
+    """
+    Linhas de texto de uma página: (x, y, texto), com x/y em frações da página
+
+    Um cabeçalho fora da área de interesse e `lines` transações dentro dela,
+    com os valores no final (como no demonstrativo Agibank) ou na mesma linha (BMG).
+    """
+    left, top, right, bottom = TEMPLATE_BOXES[template]
+    bank = "BANCO AGIBANK S.A." if template == "agibank" else "BANCO BMG S.A."
+    items = [(0.05, 0.02, f"{bank} - FATURA DO CARTAO - PAGINA {page_number}")]
+
+    step = (bottom - top) / (lines + 4)
+    values = []
+    for index in range(lines):
+        date = f"{rng.randint(1, 28):02d}/{rng.randint(1, 12):02d}/2024"
+        description = rng.choice(DESCRIPTIONS)
+        value = f"{rng.randint(1, 9999)},{rng.randint(0, 99):02d}"
+        y = top + step * (index + 1)
+        if template == "agibank":
+            items.append((left + 0.01, y, f"{date} {description}"))
+            values.append(value)
+        else:
+            items.append((left + 0.03, y, f"{date} {description} {value}"))
+    if values:
+        items.append((left + 0.01, top + step * (lines + 2), " ".join(values)))
+
+    items.append((0.05, 0.95, "Central de atendimento 0800 000 0000"))
+    return items
+
+
+def _load_font(size: int):
+    try:
+        return ImageFont.load_default(size=size)
+    except TypeError:  # Pillow < 10.1
+        return ImageFont.load_default()
+
+
+def build_scanned_pdf(template: str, pages: int, dpi: int, lines: int, seed: int = 0) -> bytes:
+    """PDF só com imagens (como um documento escaneado), sem camada de texto"""
+    width = int(PAGE_WIDTH_PT * dpi / 72)
+    height = int(PAGE_HEIGHT_PT * dpi / 72)
+    font = _load_font(max(8, int(9 * dpi / 72)))
+    rng = random.Random(seed)
+
+    images = []
+    for page_number in range(1, pages + 1):
+        image = Image.new("L", (width, height), 255)
+        draw = ImageDraw.Draw(image)
+        for x, y, text in page_lines(template, page_number, lines, rng):
+            draw.text((x * width, y * height), text, fill=0, font=font)
+        images.append(image)
+
+    buffer = io.BytesIO()
+    try:
+        images[0].save(buffer, "PDF", save_all=True, append_images=images[1:], resolution=dpi)
+    finally:
+        for image in images:
+            image.close()
+    return buffer.getvalue()
+
+
+def _pdf_string(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def build_digital_pdf(template: str, pages: int, lines: int, seed: int = 0) -> bytes:
+    """PDF gerado digitalmente (texto em Helvetica), com camada de texto"""
+    rng = random.Random(seed)
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        None,  # Árvore de páginas, preenchida depois
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    page_ids = []
+    for page_number in range(1, pages + 1):
+        commands = ["BT /F1 9 Tf"]
+        for x, y, text in page_lines(template, page_number, lines, rng):
+            # PDF: origem no canto inferior esquerdo
+            commands.append(f"1 0 0 1 {x * PAGE_WIDTH_PT:.2f} {(1 - y) * PAGE_HEIGHT_PT - 9:.2f} Tm ({_pdf_string(text)}) Tj")
+        commands.append("ET")
+        stream = "\n".join(commands).encode("latin-1")
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream))
+        content_id = len(objects)
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 %d %d] /Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>"
+            % (PAGE_WIDTH_PT, PAGE_HEIGHT_PT, content_id)
+        )
+        page_ids.append(len(objects))
+    kids = " ".join(f"{page_id} 0 R" for page_id in page_ids).encode()
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (kids, pages)
+
+    output = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(output))
+        output += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+    xref = len(output)
+    output += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    output += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    output += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%EOF\n" % (len(objects) + 1, xref)
+    return bytes(output)
+
+
+def build_document(template: str, kind: str, pages: int, dpi: int, lines: int, seed: int = 0) -> SyntheticDocument:
+    if kind == "digital":
+        content = build_digital_pdf(template, pages, lines, seed)
+    else:
+        content = build_scanned_pdf(template, pages, dpi, lines, seed)
+    return SyntheticDocument(template, kind, pages, dpi, lines, content)
+
+
+# ---------------------------------------------------------------------------
+# Medição
+# ---------------------------------------------------------------------------
+
+def percentile(values: List[float], pct: float) -> float:
+    """Percentil com interpolação linear (valores em qualquer ordem)"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * pct / 100
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def current_rss_bytes() -> int:
+    """RSS atual do processo (Linux); 0 se indisponível"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return 0
+
+
+def max_rss_bytes(who: int = resource.RUSAGE_SELF) -> int:
+    """Pico de RSS desde o início do processo (ru_maxrss é em KB no Linux e em bytes no macOS)"""
+    max_rss = resource.getrusage(who).ru_maxrss
+    return max_rss if sys.platform == "darwin" else max_rss * 1024
+
+
+class RssSampler:
+    """Amostra o RSS em segundo plano para obter o pico de um trecho específico"""
+
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.peak = max(self.peak, current_rss_bytes())
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self.peak = current_rss_bytes()
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, current_rss_bytes())
+
+
+def stage_delta(before: Dict[str, dict], after: Dict[str, dict], pages: int) -> Dict[str, dict]:
+    """Diferença entre dois snapshots de `stage_timings`, com a média por página"""
+    from stage_timing import STAGES
+
+    stages = {}
+    for stage in list(STAGES) + sorted(set(after) - set(STAGES)):
+        count = after.get(stage, {}).get("count", 0) - before.get(stage, {}).get("count", 0)
+        seconds = after.get(stage, {}).get("seconds", 0.0) - before.get(stage, {}).get("seconds", 0.0)
+        stages[stage] = {
+            "count": count,
+            "seconds": round(seconds, 6),
+            "seconds_per_page": round(seconds / pages, 6) if pages else 0.0,
+        }
+    return stages
+
+
+async def run_scenario(
+    main,
+    endpoint: str,
+    document: SyntheticDocument,
+    repeat: int,
+    concurrency: int,
+    warmup: int
+) -> dict:
+    """Executa o pipeline do endpoint `repeat` vezes (até `concurrency` em paralelo)"""
+    from stage_timing import stage_timings
+    from uploads import SpooledUpload
+
+    func_name, extra, _ = ENDPOINTS[endpoint]
+    run: Callable = getattr(main, func_name)
+
+    async def one() -> Tuple[float, Optional[str], int, int]:
+        start = time.perf_counter()
+        error = None
+        failed_pages = 0
+        upload_bytes = 0
+        try:
+            # Como nos endpoints: o PDF é gravado em disco e o pipeline lê do arquivo
+            upload = await asyncio.to_thread(SpooledUpload.from_bytes, document.content, main.UPLOAD_DIR)
+            try:
+                response = await run(upload, **extra)
+            finally:
+                upload.remove()
+            upload_bytes = getattr(response, "upload_bytes", 0)
+            # Páginas sem texto indicam erro de OCR (simulado) ou de renderização
+            texts = getattr(response, "demonstrativo_pages", None) or getattr(response, "transacoes_pages", None)
+            if texts is None:
+                texts = [page if isinstance(page, str) else page.get("text", "") for page in response.pages]
+            failed_pages = sum(1 for text in texts if not text)
+        except Exception as e:
+            error = getattr(e, "detail", None) or str(e)
+        return time.perf_counter() - start, error, failed_pages, upload_bytes
+
+    for _ in range(warmup):
+        await one()
+
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def limited():
+        async with semaphore:
+            return await one()
+
+    before = stage_timings.snapshot()
+    with RssSampler() as sampler:
+        start = time.perf_counter()
+        results = await asyncio.gather(*(limited() for _ in range(repeat)))
+        wall = time.perf_counter() - start
+    after = stage_timings.snapshot()
+
+    latencies = [latency for latency, _, _, _ in results]
+    errors = [error for _, error, _, _ in results if error]
+    total_pages = document.pages * (repeat - len(errors))
+    return {
+        "id": f"{endpoint}/{document.key}",
+        "endpoint": endpoint,
+        "template": document.template,
+        "kind": document.kind,
+        "pages": document.pages,
+        "dpi": document.dpi,
+        "lines": document.lines,
+        "pdf_bytes": len(document.content),
+        "requests": repeat,
+        "concurrency": concurrency,
+        "errors": len(errors),
+        "error_samples": sorted(set(errors))[:3],
+        "empty_pages": sum(failed for _, _, failed, _ in results),
+        "upload_bytes_per_page": round(sum(sent for _, _, _, sent in results) / (document.pages * repeat)),
+        "wall_seconds": round(wall, 6),
+        "throughput": {
+            "requests_per_second": round(repeat / wall, 4) if wall else 0.0,
+            "pages_per_second": round(total_pages / wall, 4) if wall else 0.0,
+        },
+        "latency_seconds": {
+            "min": round(min(latencies), 6),
+            "mean": round(sum(latencies) / len(latencies), 6),
+            "p50": round(percentile(latencies, 50), 6),
+            "p95": round(percentile(latencies, 95), 6),
+            "p99": round(percentile(latencies, 99), 6),
+            "max": round(max(latencies), 6),
+        },
+        "peak_rss_mb": round(sampler.peak / (1024 * 1024), 2),
+        "stages": stage_delta(before, after, document.pages * repeat),
+    }
+
+
+@contextmanager
+def template_dpi(main, name: str, dpi: Optional[int]):
+    """Executa o bloco com o template `name` renderizado em `dpi` (None = DPI do arquivo do template)"""
+    registry = main.get_template_registry()
+    original = registry.get(name)
+    if dpi is not None:
+        registry.replace(replace(original, dpi=dpi))
+    try:
+        yield original.dpi if dpi is None else dpi
+    finally:
+        registry.replace(original)
+
+
+def template_dpi_deltas(scenarios: List[dict]) -> List[dict]:
+    """Bytes enviados, latência e renderização de cada DPI de template comparados com o primeiro DPI medido"""
+    baselines: Dict[str, dict] = {}
+    deltas = []
+    for scenario in scenarios:
+        if scenario.get("template_dpi") is None:
+            continue
+        base_id = scenario["id"].rsplit("/tdpi", 1)[0]
+        baseline = baselines.setdefault(base_id, scenario)
+        if baseline is scenario:
+            continue
+
+        def ratio(value: float, reference: float) -> Optional[float]:
+            return round(value / reference, 3) if reference else None
+
+        deltas.append({
+            "id": base_id,
+            "baseline_dpi": baseline["template_dpi"],
+            "dpi": scenario["template_dpi"],
+            "upload_bytes_per_page": scenario["upload_bytes_per_page"] - baseline["upload_bytes_per_page"],
+            "upload_bytes_ratio": ratio(scenario["upload_bytes_per_page"], baseline["upload_bytes_per_page"]),
+            "p50_seconds": round(scenario["latency_seconds"]["p50"] - baseline["latency_seconds"]["p50"], 6),
+            "p50_ratio": ratio(scenario["latency_seconds"]["p50"], baseline["latency_seconds"]["p50"]),
+            "render_seconds_per_page_ratio": ratio(
+                scenario["stages"]["render"]["seconds_per_page"], baseline["stages"]["render"]["seconds_per_page"]
+            ),
+        })
+    return deltas
+
+
+def git_revision() -> Optional[str]:
+    try:
+        revision = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__)), timeout=5
+        )
+        return revision.stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+async def run_benchmark(args, documents: List[SyntheticDocument]) -> dict:
+    import main
+    from config import settings
+
+    scenarios = []
+    async with main.lifespan(main.app):
+        for endpoint in args.endpoints:
+            for document in documents:
+                if document.template not in ENDPOINTS[endpoint][2]:
+                    continue
+                # O modo nativo não rasteriza localmente: o DPI não faz diferença
+                if endpoint == "text-native" and document.dpi != args.dpi[0]:
+                    continue
+                # Endpoints de banco: um cenário por DPI de template pedido em --template-dpi
+                bank = endpoint in TEMPLATES
+                for dpi in (args.template_dpi or [None]) if bank else [None]:
+                    if bank:
+                        with template_dpi(main, endpoint, dpi) as used_dpi:
+                            scenario = await run_scenario(main, endpoint, document, args.repeat, args.concurrency, args.warmup)
+                        if dpi is not None:
+                            scenario["id"] += f"/tdpi{used_dpi}"
+                        scenario["template_dpi"] = used_dpi if dpi is not None else None
+                    else:
+                        scenario = await run_scenario(main, endpoint, document, args.repeat, args.concurrency, args.warmup)
+                    scenarios.append(scenario)
+                    latency = scenario["latency_seconds"]
+                    print(
+                        f"{scenario['id']:<56} p50={latency['p50']:.3f}s p95={latency['p95']:.3f}s "
+                        f"{scenario['throughput']['pages_per_second']:.1f} pág/s {scenario['upload_bytes_per_page'] / 1024:.0f}KB/pág "
+                        f"rss={scenario['peak_rss_mb']:.0f}MB"
+                        + (f" erros={scenario['errors']}" if scenario["errors"] else ""),
+                        file=sys.stderr
+                    )
+
+    return {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "git_revision": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "ocr_backend": settings.OCR_BACKEND,
+            "settings": {
+                name: getattr(settings, name)
+                for name in (
+                    "OCR_MAX_WORKERS", "VISION_BATCH_SIZE", "VISION_BATCH_LINGER_MS", "VISION_POOL_SIZE",
+                    "TEXT_LAYER_ENABLED", "VISION_ENCODING_TEXT", "TEMPLATES_DIR",
+                    "FAKE_OCR_LATENCY_MS", "FAKE_OCR_LATENCY_PER_IMAGE_MS", "FAKE_OCR_ERROR_RATE",
+                    "FAKE_OCR_TRANSIENT_ERROR_RATE", "FAKE_OCR_SLOW_RATE", "FAKE_OCR_SLOW_MS", "OCR_RETRY_MAX_ATTEMPTS",
+                    "OCR_HEDGE_ENABLED", "OCR_RATE_LIMIT_RPM", "OCR_RATE_LIMIT_IMAGES_PER_MINUTE", "RENDER_WORKERS", "RENDER_CHUNK_PAGES",
+                )
+            },
+            "repeat": args.repeat,
+            "concurrency": args.concurrency,
+            "warmup": args.warmup,
+            "peak_rss_mb": round(max_rss_bytes() / (1024 * 1024), 2),
+            "children_peak_rss_mb": round(max_rss_bytes(resource.RUSAGE_CHILDREN) / (1024 * 1024), 2),
+        },
+        "scenarios": scenarios,
+        "template_dpi_deltas": template_dpi_deltas(scenarios),
+    }
+
+
+def int_list(value: str) -> List[int]:
+    return [int(item) for item in value.split(",") if item.strip()]
+
+
+def choice_list(choices):
+    def parse(value: str) -> List[str]:
+        items = [item.strip() for item in value.split(",") if item.strip()]
+        invalid = [item for item in items if item not in choices]
+        if invalid:
+            raise argparse.ArgumentTypeError(f"valores inválidos: {', '.join(invalid)} (use: {', '.join(choices)})")
+        return items
+    return parse
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark de ponta a ponta dos pipelines de extração")
+    parser.add_argument("--endpoints", type=choice_list(tuple(ENDPOINTS)), default=list(ENDPOINTS),
+                        help=f"Pipelines a medir (padrão: todos: {','.join(ENDPOINTS)})")
+    parser.add_argument("--templates", type=choice_list(TEMPLATES), default=list(TEMPLATES),
+                        help="Layouts dos PDFs sintéticos (padrão: agibank,bmg)")
+    parser.add_argument("--kinds", type=choice_list(KINDS), default=["scanned"],
+                        help="scanned (só imagem) e/ou digital (com camada de texto) (padrão: scanned)")
+    parser.add_argument("--pages", type=int_list, default=[1, 8], help="Números de páginas (padrão: 1,8)")
+    parser.add_argument("--dpi", type=int_list, default=[200], help="DPI das páginas escaneadas (padrão: 200)")
+    parser.add_argument("--template-dpi", type=int_list, default=[],
+                        help="DPIs dos templates nos endpoints de banco, comparados com o primeiro (padrão: o DPI do template)")
+    parser.add_argument("--lines", type=int_list, default=[12, 40], help="Transações por página (padrão: 12,40)")
+    parser.add_argument("--repeat", type=int, default=3, help="Requisições medidas por cenário (padrão: 3)")
+    parser.add_argument("--concurrency", type=int, default=1, help="Requisições simultâneas (padrão: 1)")
+    parser.add_argument("--warmup", type=int, default=1, help="Requisições descartadas por cenário (padrão: 1)")
+    parser.add_argument("--backend", default="fake", help="Backend de OCR (padrão: fake)")
+    parser.add_argument("--ocr-latency-ms", type=float, help="Latência do backend simulado (FAKE_OCR_LATENCY_MS)")
+    parser.add_argument("--ocr-error-rate", type=float, help="Taxa de erros do backend simulado (FAKE_OCR_ERROR_RATE)")
+    parser.add_argument("--seed", type=int, default=0, help="Semente dos PDFs sintéticos (padrão: 0)")
+    parser.add_argument("--output", "-o", help="Arquivo JSON de saída (padrão: stdout)")
+    parser.add_argument("--verbose", action="store_true", help="Mantém os logs da aplicação")
+    return parser.parse_args(argv)
+
+
+def main_cli(argv=None):
+    args = parse_args(argv)
+    if args.repeat < 1:
+        raise SystemExit("--repeat deve ser pelo menos 1")
+
+    # A configuração é lida na importação da aplicação: definir antes de importar main
+    work_dir = tempfile.mkdtemp(prefix="pdf_ocr_bench_")
+    os.environ["OCR_BACKEND"] = args.backend
+    os.environ["UPLOAD_DIR"] = work_dir
+    os.environ["OCR_CACHE_ENABLED"] = "False"  # Cada repetição deve executar o pipeline inteiro
+    os.environ.setdefault("JOBS_POLL_INTERVAL", "60")
+    if args.ocr_latency_ms is not None:
+        os.environ["FAKE_OCR_LATENCY_MS"] = str(args.ocr_latency_ms)
+    if args.ocr_error_rate is not None:
+        os.environ["FAKE_OCR_ERROR_RATE"] = str(args.ocr_error_rate)
+
+    try:
+        documents = [
+            build_document(template, kind, pages, dpi, lines, seed=args.seed)
+            for template in args.templates
+            for kind in args.kinds
+            for pages in args.pages
+            for dpi in (args.dpi if kind == "scanned" else args.dpi[:1])
+            for lines in args.lines
+        ]
+        print(f"📄 {len(documents)} PDF(s) sintético(s) gerado(s)", file=sys.stderr)
+
+        import main  # noqa: F401 (configura o logging da aplicação)
+        if not args.verbose:
+            logging.getLogger("PDF_OCR_API").setLevel(logging.WARNING)
+
+        report = asyncio.run(run_benchmark(args, documents))
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+        print(f"💾 Resultado salvo em {args.output}", file=sys.stderr)
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main_cli()
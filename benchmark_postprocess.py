@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark dos pós-processadores de texto (postprocess.py)
+
+Gera textos sintéticos de demonstrativos Agibank com um número crescente de
+transações e mede o tempo de `process_agibank_demonstrativo_text` em cada
+tamanho. O tempo por caractere deve ficar estável (escala linear): o campo
+`scaling` é a razão entre o tempo por caractere do maior e do menor texto.
+
+Até `--legacy-max` transações, a implementação anterior (que removia cada
+transação do texto com `str.replace`, O(n·m)) também é medida. As duas saídas
+precisam ser idênticas: o benchmark termina com erro se alguma for diferente.
+
+Exemplos:
+    python benchmark_postprocess.py
+    python benchmark_postprocess.py --transactions 100,1000,10000,100000 --repeat 5 --output parser.json
+"""
+
+import argparse
+import json
+import random
+import re
+import sys
+import time
+from typing import Callable, List
+
+from postprocess import process_agibank_demonstrativo_text
+
+# Descrições das transações sintéticas (as mesmas do benchmark.py, que depende do PIL)
+DESCRIPTIONS = [
+    "COMPRA SUPERMERCADO", "PAGAMENTO FATURA", "TARIFA ANUIDADE", "SAQUE 24H",
+    "COMPRA FARMACIA", "ESTORNO COMPRA", "JUROS ROTATIVO", "IOF ADICIONAL",
+    "COMPRA POSTO", "SEGURO CARTAO",
+]
+
+
+def legacy_agibank_demonstrativo_text(raw_text: str) -> str:
+    """Implementação anterior, mantida como referência de resultado e de tempo"""
+    if not raw_text:
+        return ""
+
+    transaction_pattern = r'(\d{2}/\d{2}/\d{4})\s+([^0-9/]+?)(?=\s*\d{2}/\d{2}/\d{4}|$)'
+    transactions = re.findall(transaction_pattern, raw_text)
+
+    text_without_transactions = raw_text
+    for date, desc in transactions:
+        text_without_transactions = text_without_transactions.replace(f"{date} {desc}", "", 1)
+
+    value_pattern = r'[-+]?\d{1,3}(?:\.\d{3})*(?:,\d{2})?|\d+,\d{2}|\d+'
+    values = re.findall(value_pattern, text_without_transactions)
+    monetary_values = [val for val in values if val and (len(val) >= 2 and (',' in val or len(val) >= 3))]
+
+    processed_transactions = []
+    for i, (date, description) in enumerate(transactions):
+        clean_desc = description.strip()
+        if i < len(monetary_values):
+            processed_transactions.append(f"{date} - {clean_desc} - R$ {monetary_values[i]}")
+        else:
+            processed_transactions.append(f"{date} - {clean_desc} - Valor: N/A")
+
+    if len(monetary_values) > len(transactions):
+        processed_transactions.append(f"Valores extras: {', '.join(monetary_values[len(transactions):])}")
+
+    return ' | '.join(processed_transactions) if processed_transactions else raw_text
+
+
+def demonstrativo_text(transactions: int, seed: int = 0) -> str:
+    """
+    Texto (já limpo) da área do demonstrativo com `transactions` transações
+
+    Como no OCR da área: as datas e descrições e depois os valores. O
+    pós-processador roda na área de cada página, então o texto é uma única
+    área (páginas concatenadas repetiriam a última transação de cada uma, que
+    fica sem data seguinte e não é reconhecida).
+    """
+    rng = random.Random(seed)
+    parts = [
+        f"{rng.randint(1, 28):02d}/{rng.randint(1, 12):02d}/2024 {rng.choice(DESCRIPTIONS)}"
+        for _ in range(transactions)
+    ]
+    parts.extend(f"{rng.randint(1, 9999)},{rng.randint(0, 99):02d}" for _ in range(transactions))
+    return " ".join(parts)
+
+
+def int_list(value: str) -> List[int]:
+    return [int(item) for item in value.split(",") if item.strip()]
+
+
+def best_time(function: Callable[[str], str], text: str, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function(text)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def run(sizes: List[int], repeat: int, legacy_max: int, seed: int) -> dict:
+    results = []
+    for transactions in sizes:
+        text = demonstrativo_text(transactions, seed=seed)
+        seconds = best_time(process_agibank_demonstrativo_text, text, repeat)
+        result = {
+            "transactions": transactions,
+            "chars": len(text),
+            "seconds": round(seconds, 6),
+            "ns_per_char": round(seconds * 1e9 / len(text), 2),
+        }
+        if transactions <= legacy_max:
+            legacy_seconds = best_time(legacy_agibank_demonstrativo_text, text, repeat)
+            result["legacy_seconds"] = round(legacy_seconds, 6)
+            result["speedup"] = round(legacy_seconds / seconds, 1) if seconds else None
+            result["same_output"] = legacy_agibank_demonstrativo_text(text) == process_agibank_demonstrativo_text(text)
+        results.append(result)
+        print(
+            f"{transactions:>8} transações {len(text):>10} chars  {seconds * 1000:9.2f}ms  {result['ns_per_char']:8.2f} ns/char"
+            + (f"  (anterior: {result['legacy_seconds'] * 1000:.2f}ms, igual: {result['same_output']})" if "legacy_seconds" in result else ""),
+            file=sys.stderr
+        )
+
+    different = [result["transactions"] for result in results if result.get("same_output") is False]
+    if different:
+        raise SystemExit(f"❌ Saída diferente da implementação anterior com {', '.join(map(str, different))} transações")
+
+    ratios = [result["ns_per_char"] for result in results]
+    return {
+        "parser": "process_agibank_demonstrativo_text",
+        "repeat": repeat,
+        "results": results,
+        "scaling": round(ratios[-1] / ratios[0], 2) if ratios and ratios[0] else None,
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Micro-benchmark dos pós-processadores de texto")
+    parser.add_argument("--transactions", type=int_list, default=[100, 1000, 10000, 50000],
+                        help="Transações por texto (padrão: 100,1000,10000,50000)")
+    parser.add_argument("--repeat", type=int, default=3, help="Execuções por tamanho; vale a mais rápida (padrão: 3)")
+    parser.add_argument("--legacy-max", type=int, default=10000,
+                        help="Maior tamanho em que a implementação anterior também é medida (padrão: 10000)")
+    parser.add_argument("--seed", type=int, default=0, help="Semente dos textos sintéticos (padrão: 0)")
+    parser.add_argument("--output", "-o", help="Arquivo JSON de saída (padrão: stdout)")
+    return parser.parse_args(argv)
+
+
+def main_cli(argv=None):
+    args = parse_args(argv)
+    if args.repeat < 1:
+        raise SystemExit("--repeat deve ser pelo menos 1")
+
+    report = run(sorted(args.transactions), args.repeat, args.legacy_max, args.seed)
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+        print(f"💾 Resultado salvo em {args.output}", file=sys.stderr)
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -1,4 +1,5 @@
 import os
+import tempfile
 from pathlib import Path
 from dotenv import load_dotenv
 
@@ -22,7 +23,122 @@ class Settings:
     
     # Configurações de processamento
     DEFAULT_DPI = int(os.getenv("DEFAULT_DPI", 300))
-    MAX_PAGES_PER_REQUEST = int(os.getenv("MAX_PAGES_PER_REQUEST", 50))
+    # Máximo de páginas selecionadas por requisição síncrona (0 = sem limite)
+    MAX_PAGES_PER_REQUEST = int(os.getenv("MAX_PAGES_PER_REQUEST", 0))
+    
+    # Backend de OCR: "vision" (Google Cloud Vision) ou "fake" (simulado, sem rede nem credenciais)
+    OCR_BACKEND = os.getenv("OCR_BACKEND", "vision").strip().lower()
+    
+    # Backend simulado (OCR_BACKEND=fake), para testes de carga e profiling
+    FAKE_OCR_LATENCY_MS = float(os.getenv("FAKE_OCR_LATENCY_MS", 200))  # Latência fixa por chamada
+    FAKE_OCR_LATENCY_PER_IMAGE_MS = float(os.getenv("FAKE_OCR_LATENCY_PER_IMAGE_MS", 0))  # Latência adicional por imagem/página
+    FAKE_OCR_ERROR_RATE = float(os.getenv("FAKE_OCR_ERROR_RATE", 0.0))  # Fração de imagens com erro (0 a 1)
+    FAKE_OCR_TEXT = os.getenv("FAKE_OCR_TEXT")  # Texto retornado; aceita {hash}, {bytes} e {page}
+    FAKE_OCR_SEED = int(os.getenv("FAKE_OCR_SEED", 0))
+    FAKE_OCR_TRANSIENT_ERROR_RATE = float(os.getenv("FAKE_OCR_TRANSIENT_ERROR_RATE", 0.0))  # Fração de imagens com erro transitório (sorteado a cada chamada)
+    FAKE_OCR_SLOW_RATE = float(os.getenv("FAKE_OCR_SLOW_RATE", 0.0))  # Fração de chamadas lentas (cauda de latência)
+    FAKE_OCR_SLOW_MS = float(os.getenv("FAKE_OCR_SLOW_MS", 2000))  # Latência adicional das chamadas lentas
+    
+    # Configurações de concorrência do OCR
+    OCR_MAX_WORKERS = int(os.getenv("OCR_MAX_WORKERS", 8))  # Threads para OCR/renderização
+    
+    # Controle de admissão: orçamento do processo (todas as requisições e jobs) de páginas
+    # renderizadas/em OCR e de memória estimada das imagens decodificadas (0 = sem limite)
+    ADMISSION_MAX_PAGES = int(os.getenv("ADMISSION_MAX_PAGES", 64))
+    ADMISSION_MAX_PIXEL_MB = int(os.getenv("ADMISSION_MAX_PIXEL_MB", 1024))
+    ADMISSION_MAX_WAIT_SECONDS = float(os.getenv("ADMISSION_MAX_WAIT_SECONDS", 30))  # Espera por vaga antes do 503
+    ADMISSION_MAX_WAITING = int(os.getenv("ADMISSION_MAX_WAITING", 100))  # Requisições na fila (acima disso: 503 imediato)
+    ADMISSION_RETRY_AFTER_SECONDS = int(os.getenv("ADMISSION_RETRY_AFTER_SECONDS", 5))  # Cabeçalho Retry-After do 503
+    
+    # Configurações de lote da Vision API (batch_annotate_images)
+    VISION_BATCH_SIZE = int(os.getenv("VISION_BATCH_SIZE", 16))  # Máximo de 16 imagens por chamada
+    VISION_BATCH_LINGER_MS = float(os.getenv("VISION_BATCH_LINGER_MS", 20))  # Espera por mais imagens antes de enviar
+    VISION_BATCH_MAX_BYTES = int(os.getenv("VISION_BATCH_MAX_BYTES", 8 * 1024 * 1024))  # Tamanho máximo do lote
+    
+    # Pool de clientes assíncronos da Vision API (um canal gRPC por cliente)
+    VISION_POOL_SIZE = int(os.getenv("VISION_POOL_SIZE", 2))  # Clientes/canais por processo
+    VISION_CHANNEL_MAX_CONCURRENT = int(os.getenv("VISION_CHANNEL_MAX_CONCURRENT", 32))  # Chamadas simultâneas por canal
+
+    # Resiliência das chamadas de OCR: retentativas com espera exponencial e jitter,
+    # prazos por tentativa/página/requisição (0 = sem prazo) e hedging opcional
+    OCR_RETRY_MAX_ATTEMPTS = int(os.getenv("OCR_RETRY_MAX_ATTEMPTS", 3))  # Tentativas por página (1 = sem retentativa)
+    OCR_RETRY_BACKOFF_MS = float(os.getenv("OCR_RETRY_BACKOFF_MS", 200))  # Espera base, dobrada a cada tentativa
+    OCR_RETRY_BACKOFF_MAX_MS = float(os.getenv("OCR_RETRY_BACKOFF_MAX_MS", 5000))
+    OCR_CALL_TIMEOUT_SECONDS = float(os.getenv("OCR_CALL_TIMEOUT_SECONDS", 30))  # Tempo limite de cada tentativa
+    OCR_PAGE_DEADLINE_SECONDS = float(os.getenv("OCR_PAGE_DEADLINE_SECONDS", 90))  # Todas as tentativas de uma página
+    OCR_REQUEST_DEADLINE_SECONDS = float(os.getenv("OCR_REQUEST_DEADLINE_SECONDS", 300))  # Requisição inteira (jobs não têm)
+    OCR_HEDGE_ENABLED = os.getenv("OCR_HEDGE_ENABLED", "False").lower() == "true"  # Duplicar chamadas lentas
+    OCR_HEDGE_QUANTILE = float(os.getenv("OCR_HEDGE_QUANTILE", 0.95))  # Percentil de latência que dispara a duplicata
+    OCR_HEDGE_MIN_SAMPLES = int(os.getenv("OCR_HEDGE_MIN_SAMPLES", 20))  # Latências observadas antes de ativar
+
+    # Cota da Vision API (token bucket) compartilhada pelos processos do host: as chamadas
+    # esperam a vez em vez de receber RESOURCE_EXHAUSTED (0 = sem limite)
+    OCR_RATE_LIMIT_RPM = float(os.getenv("OCR_RATE_LIMIT_RPM", 0))  # Chamadas por minuto
+    OCR_RATE_LIMIT_IMAGES_PER_MINUTE = float(os.getenv("OCR_RATE_LIMIT_IMAGES_PER_MINUTE", 0))  # Imagens/páginas por minuto
+    OCR_RATE_LIMIT_BURST_SECONDS = float(os.getenv("OCR_RATE_LIMIT_BURST_SECONDS", 1))  # Rajada após período ocioso (segundos de cota)
+    OCR_RATE_LIMIT_STORE = os.getenv("OCR_RATE_LIMIT_STORE", "file")  # "file" (entre processos), "memory" ou "<módulo>:<fábrica>"
+    OCR_RATE_LIMIT_PATH = os.getenv("OCR_RATE_LIMIT_PATH", os.path.join(UPLOAD_DIR, "ocr_rate_limit.json"))
+    
+    # Pool de processos de renderização e codificação (pdftoppm + recorte + PNG/JPEG), para usar
+    # todos os núcleos sem travar o event loop; as páginas voltam como arquivos em RENDER_SPOOL_DIR
+    # Processos por worker do uvicorn (0 = threads); o padrão divide os núcleos entre os WEB_CONCURRENCY workers
+    RENDER_WORKERS = int(os.getenv(
+        "RENDER_WORKERS", max(1, (os.cpu_count() or 1) // max(1, int(os.getenv("WEB_CONCURRENCY") or 1)))
+    ))
+    RENDER_CHUNK_PAGES = int(os.getenv("RENDER_CHUNK_PAGES", 4))  # Páginas consecutivas por tarefa (um pdftoppm por bloco)
+    RENDER_SPOOL_DIR = os.getenv("RENDER_SPOOL_DIR", "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir())
+
+    # Modo de OCR padrão: "raster" (renderiza localmente) ou "native" (PDF enviado direto à Vision API)
+    OCR_DEFAULT_MODE = os.getenv("OCR_DEFAULT_MODE", "raster").lower()
+    # Tamanho máximo do PDF enviado numa chamada do modo nativo (cada bloco leva só as suas páginas)
+    VISION_MAX_PDF_BYTES = int(os.getenv("VISION_MAX_PDF_BYTES", 10 * 1024 * 1024))
+    
+    # Cache de resultados de OCR (memória LRU + SQLite em disco)
+    OCR_CACHE_ENABLED = os.getenv("OCR_CACHE_ENABLED", "True").lower() == "true"
+    OCR_CACHE_MEMORY_MB = int(os.getenv("OCR_CACHE_MEMORY_MB", 64))
+    OCR_CACHE_DISK_ENABLED = os.getenv("OCR_CACHE_DISK_ENABLED", "True").lower() == "true"
+    OCR_CACHE_PATH = os.getenv("OCR_CACHE_PATH", os.path.join(UPLOAD_DIR, "ocr_cache.sqlite3"))
+    OCR_CACHE_TTL_SECONDS = int(os.getenv("OCR_CACHE_TTL_SECONDS", 7 * 24 * 3600))  # 7 dias
+    
+    # Camada de texto: páginas geradas digitalmente têm o texto lido do PDF (pdftotext), sem OCR
+    TEXT_LAYER_ENABLED = os.getenv("TEXT_LAYER_ENABLED", "True").lower() == "true"
+    TEXT_LAYER_MIN_CHARS = int(os.getenv("TEXT_LAYER_MIN_CHARS", 20))  # Mínimo de caracteres na página/área
+    TEXT_LAYER_MIN_ALNUM_RATIO = float(os.getenv("TEXT_LAYER_MIN_ALNUM_RATIO", 0.5))  # Fração mínima de letras/dígitos
+    
+    # Codificação das imagens enviadas à Vision API: png, gray, bilevel, jpeg ou jpeg-gray,
+    # com opções "quality=<1-95>" (JPEG) e "max_pixels=<n>", ex: "jpeg,quality=70,max_pixels=4000000"
+    VISION_ENCODING = os.getenv("VISION_ENCODING", "png")
+    VISION_ENCODING_TEXT = os.getenv("VISION_ENCODING_TEXT", VISION_ENCODING)  # /extract-text e /extract-text-simple
+    VISION_ENCODING_IMAGE = os.getenv("VISION_ENCODING_IMAGE", VISION_ENCODING)  # /extract-text-image
+    # Por template: VISION_ENCODING_<NOME> (ex: VISION_ENCODING_AGIBANK), acima do "encoding" do arquivo
+    
+    # Templates de layout (um arquivo JSON por tipo de documento), carregados na inicialização
+    TEMPLATES_DIR = os.getenv("TEMPLATES_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "templates"))
+    
+    # Detecção automática do template (/extract-auto): camada de texto do cabeçalho, miniaturas
+    # de documentos já identificados e, por último, OCR do cabeçalho em baixa resolução
+    DETECT_PROBE_DPI = int(os.getenv("DETECT_PROBE_DPI", 100))  # Resolução da página de sondagem
+    DETECT_THUMBNAIL_MAX_DISTANCE = int(os.getenv("DETECT_THUMBNAIL_MAX_DISTANCE", 12))  # Bits de diferença aceitos (0 = desativado)
+    DETECT_MAX_FINGERPRINTS = int(os.getenv("DETECT_MAX_FINGERPRINTS", 1000))  # Miniaturas guardadas em memória
+    
+    # Fila de jobs assíncronos (POST /jobs), persistida em SQLite
+    JOBS_WORKERS = int(os.getenv("JOBS_WORKERS", 2))  # Jobs processados ao mesmo tempo
+    JOBS_DB_PATH = os.getenv("JOBS_DB_PATH", os.path.join(UPLOAD_DIR, "jobs.sqlite3"))
+    JOBS_DIR = os.getenv("JOBS_DIR", os.path.join(UPLOAD_DIR, "jobs"))  # PDFs aguardando processamento
+    JOBS_POLL_INTERVAL = float(os.getenv("JOBS_POLL_INTERVAL", 2.0))  # Segundos entre consultas à fila
+    JOBS_RETENTION_HOURS = float(os.getenv("JOBS_RETENTION_HOURS", 24))  # Tempo que resultados ficam disponíveis
+    JOBS_MAX_ATTEMPTS = int(os.getenv("JOBS_MAX_ATTEMPTS", 3))  # Reinícios tolerados por job interrompido
+    JOBS_LEASE_SECONDS = float(os.getenv("JOBS_LEASE_SECONDS", 60))  # Concessão de um job em execução, renovada pelo processo dono
+    
+    # Artefatos de depuração: amostras das áreas recortadas (Agibank/BMG) gravadas em segundo plano
+    DEBUG_ARTIFACTS_SAMPLE_RATE = float(os.getenv("DEBUG_ARTIFACTS_SAMPLE_RATE", 0.0))  # Fração das páginas (0 = desativado)
+    DEBUG_ARTIFACTS_DIR = os.getenv("DEBUG_ARTIFACTS_DIR", os.path.join(UPLOAD_DIR, "debug_artifacts"))
+    DEBUG_ARTIFACTS_MAX_MB = int(os.getenv("DEBUG_ARTIFACTS_MAX_MB", 200))  # Tamanho máximo do diretório
+    DEBUG_ARTIFACTS_MAX_AGE_HOURS = float(os.getenv("DEBUG_ARTIFACTS_MAX_AGE_HOURS", 24))
+    DEBUG_ARTIFACTS_QUEUE_SIZE = int(os.getenv("DEBUG_ARTIFACTS_QUEUE_SIZE", 32))  # Amostras aguardando gravação
+    
+    # Métricas no formato do Prometheus (GET /metrics)
+    METRICS_ENABLED = os.getenv("METRICS_ENABLED", "True").lower() == "true"
     
     # Tipos de arquivo suportados
     SUPPORTED_PDF_EXTENSIONS = ['.pdf']
@@ -32,6 +148,10 @@ class Settings:
         # Criar diretório de upload se não existir
         Path(self.UPLOAD_DIR).mkdir(exist_ok=True)
     
+    def template_encoding(self, template_name: str):
+        """Codificação configurada para o template (VISION_ENCODING_<NOME>), ou None"""
+        return os.getenv(f"VISION_ENCODING_{template_name.upper().replace('-', '_')}") or None
+    
     def validate_google_credentials(self) -> bool:
         """Valida se as credenciais do Google Cloud estão configuradas"""
         if not self.GOOGLE_APPLICATION_CREDENTIALS:
@@ -0,0 +1,160 @@
+import logging
+import os
+import queue
+import random
+import shutil
+import threading
+import time
+import uuid
+from typing import Optional
+
+logger = logging.getLogger("PDF_OCR_API")
+
+# Extensão dos arquivos gerenciados (a limpeza só remove estes arquivos)
+ARTIFACT_SUFFIX = ".png"
+
+# Intervalo mínimo entre duas limpezas do diretório
+CLEANUP_INTERVAL_SECONDS = 60
+
+
+class ArtifactStore:
+    """
+    Armazena amostras das áreas recortadas para conferência (depuração)
+
+    Apenas uma fração das páginas (`sample_rate`) é guardada. O PNG da área,
+    gravado pelo pool de renderização, é entregue a uma thread de fundo, que o
+    move para o diretório e aplica a retenção por tamanho total e idade. Se a
+    fila estiver cheia, a amostra é descartada em vez de atrasar a requisição.
+    Com `sample_rate` 0 nada é gravado e nenhuma thread é criada.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        sample_rate: float = 0.0,
+        max_bytes: int = 200 * 1024 * 1024,
+        max_age_seconds: float = 24 * 3600,
+        queue_size: int = 32
+    ):
+        self.directory = directory
+        self.sample_rate = min(max(sample_rate, 0.0), 1.0)
+        self.max_bytes = max_bytes
+        self.max_age_seconds = max_age_seconds
+        self.dropped = 0
+        self._queue: "queue.Queue[Optional[tuple]]" = queue.Queue(maxsize=max(1, queue_size))
+        self._thread: Optional[threading.Thread] = None
+        self._last_cleanup = 0.0
+
+        if self.enabled:
+            os.makedirs(directory, exist_ok=True)
+            self._thread = threading.Thread(target=self._run, name="debug-artifacts", daemon=True)
+            self._thread.start()
+
+    @property
+    def enabled(self) -> bool:
+        return self.sample_rate > 0
+
+    def saver(self, prefix: str) -> Optional["ArtifactSaver"]:
+        """
+        Amostrador das áreas de uma requisição (`sample` e `save_file`)
+
+        Retorna None quando desativado, para que o pipeline nem chame a função.
+        Os arquivos recebem o nome `<prefix>_<id da requisição>_p<página>.png`.
+        """
+        if not self.enabled:
+            return None
+        return ArtifactSaver(self, f"{prefix}_{uuid.uuid4().hex[:12]}")
+
+    def sample(self) -> bool:
+        """Sorteia se a página entra na amostra"""
+        return self.enabled and random.random() < self.sample_rate
+
+    def submit_file(self, name: str, path: str) -> bool:
+        """Agenda a movimentação de um PNG já gravado (página já sorteada). Retorna True se agendada"""
+        try:
+            self._queue.put_nowait((name, path))
+            return True
+        except queue.Full:
+            self.dropped += 1
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        return False
+
+    def _run(self):
+        # Aplicar a retenção aos artefatos de execuções anteriores
+        self.cleanup()
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            name, source = item
+            path = os.path.join(self.directory, name + ARTIFACT_SUFFIX)
+            try:
+                # PNG gravado pelo pool de renderização (pode estar em outro sistema de arquivos)
+                shutil.move(source, path)
+                logger.debug(f"🐞 Artefato de depuração salvo: {path}")
+            except Exception as e:
+                logger.warning(f"⚠️ Erro ao salvar artefato de depuração {path}: {str(e)}")
+
+            if time.monotonic() - self._last_cleanup >= CLEANUP_INTERVAL_SECONDS:
+                self.cleanup()
+
+    def cleanup(self):
+        """Remove artefatos mais antigos que `max_age_seconds` e os mais antigos além de `max_bytes`"""
+        self._last_cleanup = time.monotonic()
+        try:
+            entries = []
+            with os.scandir(self.directory) as scan:
+                for entry in scan:
+                    if entry.is_file() and entry.name.endswith(ARTIFACT_SUFFIX):
+                        stat = entry.stat()
+                        entries.append((stat.st_mtime, stat.st_size, entry.path))
+        except OSError as e:
+            logger.warning(f"⚠️ Erro ao listar artefatos de depuração: {str(e)}")
+            return
+
+        entries.sort()
+        total = sum(size for _, size, _ in entries)
+        cutoff = time.time() - self.max_age_seconds
+        removed = 0
+        for mtime, size, path in entries:
+            if mtime >= cutoff and total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+                removed += 1
+            except OSError:
+                pass
+            total -= size
+
+        if removed:
+            logger.info(f"🧹 Artefatos de depuração - {removed} arquivo(s) removido(s)")
+
+    def close(self):
+        """Grava o que estiver na fila e encerra a thread"""
+        if self._thread is None:
+            return
+        self._queue.put(None)
+        self._thread.join(timeout=10)
+        self._thread = None
+
+
+class ArtifactSaver:
+    """
+    Amostras de uma requisição
+
+    O pool de renderização grava o PNG no próprio processo: as páginas são
+    sorteadas antes (`sample`) e o arquivo é entregue depois (`save_file`).
+    """
+
+    def __init__(self, store: ArtifactStore, name: str):
+        self.store = store
+        self.name = name
+
+    def sample(self) -> bool:
+        return self.store.sample()
+
+    def save_file(self, page_number: int, path: str) -> bool:
+        return self.store.submit_file(f"{self.name}_p{page_number}", path)
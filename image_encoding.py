@@ -0,0 +1,149 @@
+import io
+import math
+import threading
+import time
+from dataclasses import dataclass, replace
+from typing import Optional
+
+from PIL import Image
+
+# Limiar (0-255) usado na conversão para preto e branco
+BILEVEL_THRESHOLD = 160
+
+
+class EncodingError(ValueError):
+    """Especificação de codificação inválida"""
+
+
+@dataclass(frozen=True)
+class EncodingPreset:
+    """Como uma imagem é codificada antes do envio à Vision API"""
+    name: str
+    format: str  # "PNG" ou "JPEG"
+    mode: Optional[str] = None  # None mantém as cores; "L" tons de cinza; "1" preto e branco
+    quality: int = 85  # Apenas JPEG
+    max_pixels: int = 0  # 0 = sem limite
+
+    @property
+    def key(self) -> str:
+        """Identificação estável do preset (usada no cache e nas respostas)"""
+        key = self.name
+        if self.format == "JPEG":
+            key += f",quality={self.quality}"
+        if self.max_pixels:
+            key += f",max_pixels={self.max_pixels}"
+        return key
+
+
+ENCODING_PRESETS = {
+    "png": EncodingPreset("png", "PNG"),
+    "gray": EncodingPreset("gray", "PNG", mode="L"),
+    "bilevel": EncodingPreset("bilevel", "PNG", mode="1"),
+    "jpeg": EncodingPreset("jpeg", "JPEG"),
+    "jpeg-gray": EncodingPreset("jpeg-gray", "JPEG", mode="L"),
+}
+
+
+def parse_encoding(spec: Optional[str], default: str = "png") -> EncodingPreset:
+    """
+    Converte uma especificação no preset correspondente
+
+    Formato: "<preset>[,quality=<1-95>][,max_pixels=<n>]", ex: "gray",
+    "jpeg,quality=70" ou "bilevel,max_pixels=4000000".
+    """
+    parts = [part.strip() for part in (spec or default).lower().split(",") if part.strip()]
+    if not parts or parts[0] not in ENCODING_PRESETS:
+        raise EncodingError(
+            f"Codificação inválida: '{spec}'. Use: {', '.join(ENCODING_PRESETS)}"
+        )
+
+    preset = ENCODING_PRESETS[parts[0]]
+    for option in parts[1:]:
+        name, _, value = option.partition("=")
+        if name not in ("quality", "max_pixels"):
+            raise EncodingError(f"Opção de codificação desconhecida: '{name}'")
+        try:
+            if name == "quality":
+                quality = int(value)
+                if not 1 <= quality <= 95:
+                    raise ValueError
+                preset = replace(preset, quality=quality)
+            elif name == "max_pixels":
+                max_pixels = int(value)
+                if max_pixels < 0:
+                    raise ValueError
+                preset = replace(preset, max_pixels=max_pixels)
+        except ValueError:
+            raise EncodingError(f"Valor inválido para '{name}': '{value}'")
+    return preset
+
+
+class EncodingStats:
+    """Totais de codificação de uma requisição (atualizados pelas threads do motor de OCR)"""
+
+    def __init__(self):
+        self.images = 0
+        self.bytes = 0
+        self.seconds = 0.0
+        self._lock = threading.Lock()
+
+    def add(self, size: int, seconds: float):
+        with self._lock:
+            self.images += 1
+            self.bytes += size
+            self.seconds += seconds
+
+
+def _limit_pixels(image: Image.Image, max_pixels: int) -> Image.Image:
+    width, height = image.size
+    if not max_pixels or width * height <= max_pixels:
+        return image
+    ratio = math.sqrt(max_pixels / (width * height))
+    new_size = (max(1, int(width * ratio)), max(1, int(height * ratio)))
+    return image.resize(new_size, Image.Resampling.LANCZOS)
+
+
+def _convert_mode(image: Image.Image, preset: EncodingPreset) -> Image.Image:
+    if preset.mode == "1":
+        # Limiar fixo em vez de pontilhado: o pontilhado cria ruído em volta das letras
+        gray = image if image.mode == "L" else image.convert("L")
+        try:
+            return gray.point(lambda value: 255 if value >= BILEVEL_THRESHOLD else 0, mode="1")
+        finally:
+            if gray is not image:
+                gray.close()
+    if preset.mode == "L":
+        return image if image.mode == "L" else image.convert("L")
+    if preset.format == "JPEG" and image.mode not in ("RGB", "L"):
+        return image.convert("RGB")
+    return image
+
+
+def encode_image(image: Image.Image, preset: EncodingPreset, stats: Optional[EncodingStats] = None) -> bytes:
+    """Codifica a imagem conforme o preset, registrando tamanho e tempo em `stats`"""
+    start = time.perf_counter()
+
+    # Cada imagem intermediária é liberada assim que substituída (a original é do chamador)
+    resized = _limit_pixels(image, preset.max_pixels)
+    try:
+        prepared = _convert_mode(resized, preset)
+    except BaseException:
+        if resized is not image:
+            resized.close()
+        raise
+    if resized is not image and resized is not prepared:
+        resized.close()
+    buffer = io.BytesIO()
+    try:
+        if preset.format == "JPEG":
+            prepared.save(buffer, format="JPEG", quality=preset.quality)
+        else:
+            prepared.save(buffer, format="PNG")
+    finally:
+        if prepared is not image:
+            prepared.close()
+
+    content = buffer.getvalue()
+    if stats is not None:
+        stats.add(len(content), time.perf_counter() - start)
+    return content
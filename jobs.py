@@ -0,0 +1,520 @@
+import asyncio
+import json
+import logging
+import os
+import shutil
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, List, Optional
+
+logger = logging.getLogger("PDF_OCR_API")
+
+# Estados possíveis de um job
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_DONE = "done"
+JOB_FAILED = "failed"
+
+_COLUMNS = (
+    "id, mode, status, params, file_path, filename, created_at, started_at, finished_at, "
+    "attempts, pages_total, pages_done, pages, result, error, owner, lease_until"
+)
+
+
+@dataclass
+class Job:
+    """Job de extração persistido na fila"""
+    id: str
+    mode: str
+    status: str
+    params: dict
+    file_path: str
+    filename: Optional[str]
+    created_at: float
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    attempts: int = 0
+    pages_total: Optional[int] = None
+    pages_done: int = 0
+    pages: Dict[str, str] = field(default_factory=dict)  # {número da página: "done" | "failed"}
+    result: Optional[dict] = None
+    error: Optional[str] = None
+    owner: Optional[str] = None  # Processo que está executando o job
+    lease_until: Optional[float] = None  # Até quando o job é do `owner` sem renovar a concessão
+
+
+def default_owner() -> str:
+    """Identificador único deste processo na fila (host, pid e sufixo aleatório)"""
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+class JobStore:
+    """
+    Fila persistente de jobs em SQLite
+
+    O PDF de cada job fica em `files_dir` até o job terminar. Cada job em
+    execução pertence a um processo (`owner`) por uma concessão de
+    `lease_seconds`, renovada enquanto o processo está vivo. Vários processos
+    (uvicorn --workers, réplicas) podem dividir o mesmo banco: só os jobs cuja
+    concessão expirou, porque o processo dono parou, voltam para a fila.
+    """
+
+    def __init__(self, db_path: str, files_dir: str, lease_seconds: float = 60.0, owner: Optional[str] = None):
+        self.files_dir = files_dir
+        self.lease_seconds = max(1.0, lease_seconds)
+        self.owner = owner or default_owner()
+        Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+        Path(files_dir).mkdir(parents=True, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "id TEXT PRIMARY KEY, mode TEXT NOT NULL, status TEXT NOT NULL, params TEXT NOT NULL, "
+            "file_path TEXT NOT NULL, filename TEXT, created_at REAL NOT NULL, started_at REAL, "
+            "finished_at REAL, attempts INTEGER NOT NULL DEFAULT 0, pages_total INTEGER, "
+            "pages_done INTEGER NOT NULL DEFAULT 0, pages TEXT, result TEXT, error TEXT)"
+        )
+        # Bancos criados antes das concessões
+        columns = {row[1] for row in self._db.execute("PRAGMA table_info(jobs)")}
+        for column, kind in (("owner", "TEXT"), ("lease_until", "REAL")):
+            if column not in columns:
+                try:
+                    self._db.execute(f"ALTER TABLE jobs ADD COLUMN {column} {kind}")
+                except sqlite3.OperationalError:
+                    pass  # Outro processo adicionou a coluna ao mesmo tempo
+        self._db.execute("CREATE INDEX IF NOT EXISTS jobs_status_created ON jobs (status, created_at)")
+
+    @staticmethod
+    def _row_to_job(row) -> Job:
+        (job_id, mode, status, params, file_path, filename, created_at, started_at, finished_at,
+         attempts, pages_total, pages_done, pages, result, error, owner, lease_until) = row
+        return Job(
+            id=job_id,
+            mode=mode,
+            status=status,
+            params=json.loads(params),
+            file_path=file_path,
+            filename=filename,
+            created_at=created_at,
+            started_at=started_at,
+            finished_at=finished_at,
+            attempts=attempts,
+            pages_total=pages_total,
+            pages_done=pages_done,
+            pages=json.loads(pages) if pages else {},
+            result=json.loads(result) if result else None,
+            error=error,
+            owner=owner,
+            lease_until=lease_until
+        )
+
+    def create(self, mode: str, params: dict, pdf_path: str, filename: Optional[str] = None) -> Job:
+        """
+        Move o PDF já gravado em `pdf_path` para o diretório dos jobs e enfileira um novo job
+
+        No mesmo disco o arquivo é apenas renomeado, sem copiar o conteúdo.
+        """
+        job_id = uuid.uuid4().hex
+        file_path = os.path.join(self.files_dir, f"{job_id}.pdf")
+
+        # Mover o arquivo antes de enfileirar, para que nenhum worker pegue um job sem PDF
+        tmp_path = f"{file_path}.tmp"
+        shutil.move(pdf_path, tmp_path)
+        os.replace(tmp_path, file_path)
+
+        job = Job(
+            id=job_id,
+            mode=mode,
+            status=JOB_QUEUED,
+            params=params,
+            file_path=file_path,
+            filename=filename,
+            created_at=time.time()
+        )
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO jobs (id, mode, status, params, file_path, filename, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (job.id, job.mode, job.status, json.dumps(params), job.file_path, job.filename, job.created_at)
+            )
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        """Busca um job pelo id"""
+        with self._lock:
+            row = self._db.execute(f"SELECT {_COLUMNS} FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._row_to_job(row) if row else None
+
+    def claim_next(self) -> Optional[Job]:
+        """Retira o job mais antigo da fila e o marca como em execução por este processo (operação atômica)"""
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._db.execute(
+                    f"SELECT {_COLUMNS} FROM jobs WHERE status = ? ORDER BY created_at LIMIT 1", (JOB_QUEUED,)
+                ).fetchone()
+                if row is None:
+                    self._db.execute("COMMIT")
+                    return None
+
+                job = self._row_to_job(row)
+                job.status = JOB_RUNNING
+                job.started_at = time.time()
+                job.attempts += 1
+                job.owner = self.owner
+                job.lease_until = job.started_at + self.lease_seconds
+                self._db.execute(
+                    "UPDATE jobs SET status = ?, started_at = ?, attempts = ?, pages_done = 0, pages = NULL, "
+                    "owner = ?, lease_until = ? WHERE id = ?",
+                    (job.status, job.started_at, job.attempts, job.owner, job.lease_until, job.id)
+                )
+                self._db.execute("COMMIT")
+                return job
+            except Exception:
+                self._db.execute("ROLLBACK")
+                raise
+
+    def set_total(self, job_id: str, pages_total: int):
+        """Registra o número de páginas que o job vai processar"""
+        with self._lock:
+            self._db.execute("UPDATE jobs SET pages_total = ? WHERE id = ?", (pages_total, job_id))
+
+    def set_progress(self, job_id: str, pages: Dict[str, str]):
+        """Atualiza o estado de cada página já concluída (só enquanto o job é deste processo)"""
+        with self._lock:
+            self._db.execute(
+                "UPDATE jobs SET pages_done = ?, pages = ? WHERE id = ? AND owner = ?",
+                (len(pages), json.dumps(pages), job_id, self.owner)
+            )
+
+    def finish(self, job_id: str, result: dict) -> bool:
+        """Marca o job como concluído com o resultado e remove o PDF"""
+        return self._close_job(job_id, JOB_DONE, result=json.dumps(result, ensure_ascii=False))
+
+    def fail(self, job_id: str, error: str) -> bool:
+        """Marca o job como falho e remove o PDF"""
+        return self._close_job(job_id, JOB_FAILED, error=error)
+
+    def _close_job(self, job_id: str, status: str, result: Optional[str] = None, error: Optional[str] = None) -> bool:
+        """
+        Encerra o job, se ainda for deste processo
+
+        Um job cuja concessão expirou e que foi retomado por outro processo não
+        é alterado (devolve False): o resultado que vale é o do novo dono.
+        """
+        with self._lock:
+            row = self._db.execute("SELECT file_path FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            cursor = self._db.execute(
+                "UPDATE jobs SET status = ?, finished_at = ?, result = ?, error = ?, owner = NULL, lease_until = NULL "
+                "WHERE id = ? AND status = ? AND owner = ?",
+                (status, time.time(), result, error, job_id, JOB_RUNNING, self.owner)
+            )
+        if not cursor.rowcount:
+            logger.warning(f"⚠️ Jobs - Job {job_id} não pertence mais a este processo; resultado descartado")
+            return False
+        if row:
+            self._remove_file(row[0])
+        return True
+
+    def renew_leases(self, job_ids: List[str]) -> List[str]:
+        """
+        Renova a concessão dos jobs em execução neste processo
+
+        Returns:
+            Jobs que não pertencem mais a este processo (concessão perdida)
+        """
+        if not job_ids:
+            return []
+        with self._lock:
+            lease_until = time.time() + self.lease_seconds
+            lost = []
+            for job_id in job_ids:
+                cursor = self._db.execute(
+                    "UPDATE jobs SET lease_until = ? WHERE id = ? AND status = ? AND owner = ?",
+                    (lease_until, job_id, JOB_RUNNING, self.owner)
+                )
+                if not cursor.rowcount:
+                    lost.append(job_id)
+            return lost
+
+    def requeue_expired(self, max_attempts: int) -> int:
+        """
+        Devolve à fila os jobs em execução cuja concessão expirou (o processo dono parou)
+
+        Jobs de processos vivos, que renovam a concessão, não são tocados.
+        Jobs que já atingiram `max_attempts` são marcados como falhos, para que
+        um documento que derruba o processo não seja reprocessado para sempre.
+        O PDF dos jobs marcados como falhos é removido, como em `fail`.
+        """
+        now = time.time()
+        expired = "status = ? AND (lease_until IS NULL OR lease_until < ?)"
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                exhausted = self._db.execute(
+                    f"SELECT id, file_path FROM jobs WHERE {expired} AND attempts >= ?",
+                    (JOB_RUNNING, now, max_attempts)
+                ).fetchall()
+                self._db.executemany(
+                    "UPDATE jobs SET status = ?, finished_at = ?, error = ?, owner = NULL, lease_until = NULL WHERE id = ?",
+                    [(JOB_FAILED, now, "Processamento interrompido várias vezes", job_id) for job_id, _ in exhausted]
+                )
+                cursor = self._db.execute(
+                    f"UPDATE jobs SET status = ?, started_at = NULL, owner = NULL, lease_until = NULL WHERE {expired}",
+                    (JOB_QUEUED, JOB_RUNNING, now)
+                )
+                self._db.execute("COMMIT")
+            except Exception:
+                self._db.execute("ROLLBACK")
+                raise
+        for _, file_path in exhausted:
+            self._remove_file(file_path)
+        return cursor.rowcount
+
+    def release(self, job_ids: List[str]) -> int:
+        """Devolve à fila, sem esperar a concessão expirar, jobs deste processo interrompidos no encerramento"""
+        if not job_ids:
+            return 0
+        with self._lock:
+            released = 0
+            for job_id in job_ids:
+                cursor = self._db.execute(
+                    "UPDATE jobs SET status = ?, started_at = NULL, owner = NULL, lease_until = NULL "
+                    "WHERE id = ? AND status = ? AND owner = ?",
+                    (JOB_QUEUED, job_id, JOB_RUNNING, self.owner)
+                )
+                released += cursor.rowcount
+            return released
+
+    def purge_finished(self, older_than_seconds: float) -> int:
+        """Remove jobs concluídos ou falhos mais antigos que o prazo de retenção (e o PDF que tenha sobrado)"""
+        where = "status IN (?, ?) AND finished_at < ?"
+        params = (JOB_DONE, JOB_FAILED, time.time() - older_than_seconds)
+        with self._lock:
+            file_paths = [row[0] for row in self._db.execute(f"SELECT file_path FROM jobs WHERE {where}", params)]
+            cursor = self._db.execute(f"DELETE FROM jobs WHERE {where}", params)
+        for file_path in file_paths:
+            if os.path.exists(file_path):
+                self._remove_file(file_path)
+        return cursor.rowcount
+
+    @staticmethod
+    def _remove_file(file_path: str):
+        try:
+            os.remove(file_path)
+        except OSError:
+            pass
+
+    def close(self):
+        """Fecha a conexão com o banco da fila"""
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+
+class JobProgress:
+    """
+    Progresso por página de um job em execução, gravado na fila a cada página
+
+    As gravações rodam numa thread, fora do event loop, uma de cada vez: as
+    páginas concluídas durante uma gravação entram juntas na seguinte. Erros
+    de gravação (ex: "database is locked") só são registrados no log; o
+    progresso é informativo e não interrompe a extração.
+    """
+
+    def __init__(self, store: JobStore, job_id: str):
+        self.store = store
+        self.job_id = job_id
+        self.pages: Dict[str, str] = {}
+        self._writer: Optional[asyncio.Task] = None
+        self._dirty = False
+
+    async def start(self, pages_total: int):
+        """Registra o número de páginas que o job vai processar"""
+        try:
+            await asyncio.to_thread(self.store.set_total, self.job_id, pages_total)
+        except Exception as e:
+            logger.warning(f"⚠️ Jobs - Erro ao gravar o total de páginas do job {self.job_id}: {e}")
+
+    def page_done(self, page_number: int, ok: bool = True):
+        """Registra a conclusão (ou falha) de uma página (chamado no event loop; a gravação segue em segundo plano)"""
+        self.pages[str(page_number)] = "done" if ok else "failed"
+        self._dirty = True
+        if self._writer is None or self._writer.done():
+            self._writer = asyncio.get_running_loop().create_task(self._write())
+
+    async def _write(self):
+        while self._dirty:
+            self._dirty = False
+            try:
+                await asyncio.to_thread(self.store.set_progress, self.job_id, dict(self.pages))
+            except Exception as e:
+                logger.warning(f"⚠️ Jobs - Erro ao gravar o progresso do job {self.job_id}: {e}")
+
+    async def flush(self):
+        """Aguarda a gravação do progresso pendente"""
+        if self._writer is not None:
+            await self._writer
+
+
+# Função que executa um job e retorna o resultado serializável em JSON
+JobRunner = Callable[[Job, JobProgress], Awaitable[dict]]
+
+
+class JobQueue:
+    """
+    Pool de workers assíncronos que consome a fila persistente de jobs
+
+    Os workers rodam no event loop da aplicação; o trabalho pesado de cada job
+    continua no motor de OCR, como nas requisições síncronas. Uma tarefa de
+    manutenção renova a concessão dos jobs em execução e devolve à fila os
+    jobs de processos que pararam.
+    """
+
+    def __init__(
+        self,
+        store: JobStore,
+        runner: JobRunner,
+        workers: int = 2,
+        poll_interval: float = 2.0,
+        retention_seconds: float = 24 * 3600,
+        max_attempts: int = 3
+    ):
+        self.store = store
+        self.runner = runner
+        self.workers = max(1, workers)
+        self.poll_interval = poll_interval
+        self.retention_seconds = retention_seconds
+        self.max_attempts = max_attempts
+        self._tasks = []
+        self._wake: Optional[asyncio.Event] = None
+        self._last_purge = 0.0
+        self._running: Dict[str, Job] = {}  # Jobs em execução neste processo
+
+    async def start(self):
+        """Recupera jobs de processos que pararam e inicia os workers"""
+        await self._requeue_expired()
+
+        self._wake = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._worker(n)) for n in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self._heartbeat()))
+        logger.info(f"🗂️ Fila de jobs iniciada - {self.workers} worker(s), processo {self.store.owner}")
+
+    async def submit(self, mode: str, params: dict, pdf_path: str, filename: Optional[str] = None) -> Job:
+        """Enfileira um job com o PDF em `pdf_path` e acorda os workers (o arquivo é movido fora do event loop)"""
+        job = await asyncio.to_thread(self.store.create, mode, params, pdf_path, filename)
+        logger.info(f"📥 Jobs - Job {job.id} enfileirado ({mode}, {os.path.getsize(job.file_path)} bytes)")
+        if self._wake is not None:
+            self._wake.set()
+        return job
+
+    async def stop(self):
+        """
+        Encerra os workers
+
+        Jobs em execução neste processo voltam para a fila imediatamente. Se o
+        processo morrer sem passar por aqui, eles voltam quando a concessão expirar.
+        """
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        interrupted = list(self._running)
+        self._running.clear()
+        try:
+            released = await asyncio.to_thread(self.store.release, interrupted)
+            if released:
+                logger.info(f"🔁 Jobs - {released} job(s) em execução devolvido(s) à fila")
+        except Exception as e:
+            logger.warning(f"⚠️ Jobs - Erro ao devolver jobs à fila: {e}")
+        logger.info("🧹 Fila de jobs encerrada")
+
+    async def _requeue_expired(self) -> int:
+        requeued = await asyncio.to_thread(self.store.requeue_expired, self.max_attempts)
+        if requeued:
+            logger.info(f"🔁 Jobs - {requeued} job(s) interrompido(s) devolvido(s) à fila")
+            if self._wake is not None:
+                self._wake.set()
+        return requeued
+
+    async def _heartbeat(self):
+        """Renova as concessões deste processo e recupera as expiradas, a cada terço da concessão"""
+        while True:
+            await asyncio.sleep(self.store.lease_seconds / 3)
+            try:
+                lost = await asyncio.to_thread(self.store.renew_leases, list(self._running))
+                for job_id in lost:
+                    logger.warning(f"⚠️ Jobs - Concessão do job {job_id} perdida; o resultado deste processo será descartado")
+                await self._requeue_expired()
+            except Exception as e:
+                logger.warning(f"⚠️ Jobs - Erro ao renovar concessões: {e}")
+
+    async def _worker(self, worker_id: int):
+        errors = 0
+        while True:
+            try:
+                await self._purge_if_due()
+
+                # Transações SQLite (podem esperar o lock do banco) fora do event loop
+                job = await asyncio.to_thread(self.store.claim_next)
+                if job is None:
+                    try:
+                        await asyncio.wait_for(self._wake.wait(), timeout=self.poll_interval)
+                    except asyncio.TimeoutError:
+                        pass
+                    self._wake.clear()
+                    continue
+
+                await self._run(job, worker_id)
+                errors = 0
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # Ex: "database is locked": o worker espera e tenta de novo, em vez de morrer
+                errors += 1
+                backoff = min(60.0, self.poll_interval * 2 ** min(errors - 1, 5))
+                logger.error(f"❌ Jobs - Erro no worker {worker_id}: {e} (nova tentativa em {backoff:.1f}s)")
+                await asyncio.sleep(backoff)
+
+    async def _run(self, job: Job, worker_id: int):
+        logger.info(f"▶️ Jobs - Worker {worker_id} iniciou o job {job.id} ({job.mode}, tentativa {job.attempts})")
+        self._running[job.id] = job
+        progress = JobProgress(self.store, job.id)
+        try:
+            try:
+                result = await self.runner(job, progress)
+            finally:
+                await progress.flush()
+        except asyncio.CancelledError:
+            raise  # Continua em `_running`: `stop` devolve o job à fila
+        except Exception as e:
+            self._running.pop(job.id, None)
+            error = getattr(e, "detail", None) or str(e)
+            logger.error(f"❌ Jobs - Job {job.id} falhou: {error}")
+            await asyncio.to_thread(self.store.fail, job.id, str(error))
+            return
+
+        self._running.pop(job.id, None)
+        if await asyncio.to_thread(self.store.finish, job.id, result):
+            elapsed = time.time() - job.started_at
+            logger.info(f"✅ Jobs - Job {job.id} concluído em {elapsed:.2f}s")
+
+    async def _purge_if_due(self):
+        now = time.time()
+        if now - self._last_purge < 60:
+            return
+        self._last_purge = now
+        try:
+            purged = await asyncio.to_thread(self.store.purge_finished, self.retention_seconds)
+            if purged:
+                logger.info(f"🧹 Jobs - {purged} job(s) antigo(s) removido(s)")
+        except Exception as e:
+            logger.warning(f"⚠️ Erro ao remover jobs antigos: {e}")
@@ -0,0 +1,197 @@
+import json
+import logging
+import os
+import re
+from dataclasses import dataclass
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from image_encoding import EncodingError, parse_encoding
+from ocr_layout import Box, union_box
+from postprocess import PostProcessor, clean_text, resolve_postprocessor
+
+logger = logging.getLogger("PDF_OCR_API")
+
+# DPI padrão da região renderizada dos templates: o mesmo dos recortes originais Agibank/BMG
+DEFAULT_TEMPLATE_DPI = 200
+
+# Faixa do cabeçalho usada na detecção automática quando o template não define "header"
+DEFAULT_HEADER_BOX: Box = (0.0, 0.0, 1.0, 0.2)
+
+_NAME_PATTERN = re.compile(r"^[a-z0-9][a-z0-9_-]*$")
+
+
+class TemplateError(ValueError):
+    """Template inválido ou inexistente"""
+
+
+@dataclass(frozen=True)
+class LayoutTemplate:
+    """
+    Template de um tipo de documento: áreas de interesse e como processá-las
+
+    Carregado uma única vez na inicialização, já validado: as áreas viram
+    tuplas, o pós-processador é resolvido para a função e a codificação é
+    conferida. O OCR é da região que contém todas as áreas (`bounds`); o texto
+    de cada área sai das caixas das palavras (ver `ocr_layout.PageLayout.text`).
+    """
+    name: str
+    label: str  # Prefixo dos logs (ex: "AGIBANK")
+    icon: str
+    title: str  # Descrição da área na mensagem de resposta (ex: "Área do demonstrativo")
+    regions: Tuple[Tuple[str, Box], ...]  # (nome, caixa em frações da página), na ordem do arquivo
+    dpi: int = DEFAULT_TEMPLATE_DPI
+    encoding: Optional[str] = None  # None = codificação padrão (VISION_ENCODING)
+    postprocess_name: str = "clean"
+    postprocess: PostProcessor = clean_text
+    description: str = ""
+    keywords: Tuple[str, ...] = ()  # Palavras que identificam o documento no cabeçalho (detecção automática)
+    header: Box = DEFAULT_HEADER_BOX
+
+    @property
+    def region_names(self) -> List[str]:
+        return [name for name, _ in self.regions]
+
+    @property
+    def detectable(self) -> bool:
+        """Template com palavras-chave, disponível para a detecção automática (/extract-auto)"""
+        return bool(self.keywords)
+
+    @property
+    def bounds(self) -> Box:
+        """Menor caixa que contém todas as áreas (a região renderizada para o OCR)"""
+        return union_box([box for _, box in self.regions])
+
+    def describe(self) -> dict:
+        return {
+            "name": self.name,
+            "title": self.title,
+            "description": self.description,
+            "regions": {name: list(box) for name, box in self.regions},
+            "dpi": self.dpi,
+            "encoding": self.encoding,
+            "postprocess": self.postprocess_name,
+            "match": {"keywords": list(self.keywords), "header": list(self.header)} if self.keywords else None
+        }
+
+
+def _parse_box(name: str, value) -> Box:
+    try:
+        box = tuple(float(v) for v in value)
+    except (TypeError, ValueError):
+        box = ()
+    if len(box) != 4 or not (0 <= box[0] < box[2] <= 1 and 0 <= box[1] < box[3] <= 1):
+        raise TemplateError(f"área '{name}' inválida: use [left, top, right, bottom] em frações da página (0 a 1)")
+    return box
+
+
+def parse_template(data: dict, default_name: str = "") -> LayoutTemplate:
+    """Valida a definição de um template (conteúdo do arquivo JSON) e o compila"""
+    if not isinstance(data, dict):
+        raise TemplateError("o template deve ser um objeto JSON")
+
+    name = str(data.get("name") or default_name).strip().lower()
+    if not _NAME_PATTERN.match(name):
+        raise TemplateError(f"nome inválido: '{name}' (use letras minúsculas, dígitos, '-' ou '_')")
+
+    regions = data.get("regions")
+    if not isinstance(regions, dict) or not regions:
+        raise TemplateError("'regions' deve ser um objeto {nome: [left, top, right, bottom]} com ao menos uma área")
+
+    try:
+        dpi = int(data.get("dpi") or DEFAULT_TEMPLATE_DPI)
+    except (TypeError, ValueError):
+        dpi = 0
+    if not 50 <= dpi <= 600:
+        raise TemplateError(f"DPI inválido: {data.get('dpi')!r} (use de 50 a 600)")
+
+    encoding = data.get("encoding") or None
+    if encoding is not None:
+        try:
+            parse_encoding(encoding)
+        except EncodingError as e:
+            raise TemplateError(str(e))
+
+    postprocess_name = str(data.get("postprocess") or "clean")
+    try:
+        postprocess = resolve_postprocessor(postprocess_name)
+    except ValueError as e:
+        raise TemplateError(str(e))
+
+    match = data.get("match") or {}
+    if not isinstance(match, dict):
+        raise TemplateError("'match' deve ser um objeto {\"keywords\": [...], \"header\": [left, top, right, bottom]}")
+    keywords = match.get("keywords") or []
+    if isinstance(keywords, str) or not all(isinstance(keyword, str) and keyword.strip() for keyword in keywords):
+        raise TemplateError("'match.keywords' deve ser uma lista de textos")
+    header = _parse_box("match.header", match["header"]) if match.get("header") else DEFAULT_HEADER_BOX
+
+    return LayoutTemplate(
+        name=name,
+        label=str(data.get("label") or name.upper()),
+        icon=str(data.get("icon") or "📄"),
+        title=str(data.get("title") or f"Área do template {name}"),
+        regions=tuple((str(region), _parse_box(str(region), box)) for region, box in regions.items()),
+        dpi=dpi,
+        encoding=encoding,
+        postprocess_name=postprocess_name,
+        postprocess=postprocess,
+        description=str(data.get("description") or ""),
+        keywords=tuple(keyword.strip() for keyword in keywords),
+        header=header
+    )
+
+
+class TemplateRegistry:
+    """Templates carregados dos arquivos `*.json` de um diretório, indexados pelo nome"""
+
+    def __init__(self, templates: Optional[List[LayoutTemplate]] = None):
+        self._templates: Dict[str, LayoutTemplate] = {}
+        for template in templates or []:
+            self.add(template)
+
+    def add(self, template: LayoutTemplate):
+        if template.name in self._templates:
+            raise TemplateError(f"Template duplicado: '{template.name}'")
+        self._templates[template.name] = template
+
+    def get(self, name: str) -> LayoutTemplate:
+        template = self._templates.get((name or "").strip().lower())
+        if template is None:
+            raise TemplateError(f"Template não encontrado: '{name}'. Disponíveis: {', '.join(self.names()) or 'nenhum'}")
+        return template
+
+    def replace(self, template: LayoutTemplate):
+        """Substitui um template já carregado (ex: o benchmark, comparando DPIs)"""
+        self.get(template.name)
+        self._templates[template.name] = template
+
+    def names(self) -> List[str]:
+        return list(self._templates)
+
+    def __iter__(self) -> Iterator[LayoutTemplate]:
+        return iter(self._templates.values())
+
+    def __len__(self) -> int:
+        return len(self._templates)
+
+    @classmethod
+    def load(cls, directory: str) -> "TemplateRegistry":
+        """
+        Carrega todos os templates do diretório (em ordem alfabética dos arquivos)
+
+        Um arquivo inválido impede a inicialização, com o nome do arquivo no erro.
+        """
+        registry = cls()
+        if not os.path.isdir(directory):
+            raise TemplateError(f"Diretório de templates não encontrado: {directory}")
+        for filename in sorted(os.listdir(directory)):
+            if not filename.endswith(".json"):
+                continue
+            path = os.path.join(directory, filename)
+            try:
+                with open(path, encoding="utf-8") as f:
+                    data = json.load(f)
+                registry.add(parse_template(data, default_name=os.path.splitext(filename)[0]))
+            except (OSError, ValueError) as e:
+                raise TemplateError(f"Template inválido em {path}: {str(e)}")
+        return registry
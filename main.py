@@ -1,25 +1,52 @@
 import os
-import io
 import tempfile
 import logging
 import datetime
 import asyncio
-import gc
-from concurrent.futures import ThreadPoolExecutor
-from typing import List, Optional
+import functools
+import json
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
 from pathlib import Path
 
 import uvicorn
-from fastapi import FastAPI, File, UploadFile, HTTPException, Form
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, File, UploadFile, HTTPException, Form, Request
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
+from starlette.background import BackgroundTask
 from pydantic import BaseModel
 from google.cloud import vision
-from pdf2image import convert_from_bytes
 from PIL import Image
 import aiofiles
 from dotenv import load_dotenv
 
+from config import settings
+from ocr_engine import OCREngine
+from vision_batcher import VisionBatcher
+from vision_pool import VisionClientPool, create_async_client
+from ocr_backends import OCRBackend, OCRPageResult, create_ocr_backend
+from ocr_layout import Box, PageLayout
+from layout_templates import LayoutTemplate, TemplateError, TemplateRegistry
+from postprocess import clean_text
+from template_detection import DETECT_CACHE, DETECT_OCR_PROBE, DETECT_TEXT_LAYER, DETECT_THUMBNAIL, Detection, TemplateDetector, probe_page
+from rate_limit import RateLimitedBackend, RateLimiter, create_bucket_store
+from ocr_resilience import OCRDeadlineExceeded, OCRResilience, current_call_stats, without_request_deadline
+from stage_timing import record as record_stage, timed, timed_call
+from metrics import labeled, observe_admission, observe_page, observe_rate_limit, record_extraction, record_ocr_calls, record_page_error, render_metrics, track_pages, track_request, tracked
+from vision_files import chunk_pages
+from ocr_cache import OCRCache
+from pdf_inspect import PdfInfo, PdfInspectionError, PdfSliceError, inspect_pdf_file, slice_pdf
+from pdf_render import PdfRenderError, estimate_render_bytes
+from render_pool import RenderPool, RenderedPage
+from image_encoding import ENCODING_PRESETS, EncodingError, EncodingPreset, EncodingStats, encode_image, parse_encoding
+from pdf_text import PageTextLayer, PdfTextError, extract_text_layer, is_usable_text
+from admission import AdmissionController, AdmissionRejected, Permit, patient
+from debug_artifacts import ArtifactSaver, ArtifactStore
+from uploads import SpooledUpload, UploadTooLarge, spool_upload, spooling_route_class
+from jobs import JOB_DONE, JOB_FAILED, Job, JobProgress, JobQueue, JobStore
+
 # Configurar logging
 logging.basicConfig(
     level=logging.INFO,
@@ -55,8 +82,9 @@ def auto_configure_gcloud():
     except Exception as e:
         logger.warning(f"⚠️ Erro na auto-configuração: {e}")
 
-# Executar auto-configuração na inicialização
-auto_configure_gcloud()
+# Executar auto-configuração na inicialização (apenas com a Vision API)
+if settings.OCR_BACKEND == "vision":
+    auto_configure_gcloud()
 
 # Garantir que as credenciais corretas estão carregadas
 def ensure_correct_credentials():
@@ -81,12 +109,363 @@ def ensure_correct_credentials():
     except Exception as e:
         logger.error(f"❌ Erro ao configurar credenciais: {e}")
 
-ensure_correct_credentials()
+if settings.OCR_BACKEND == "vision":
+    ensure_correct_credentials()
+
+# Motor de concorrência do OCR (criado no lifespan da aplicação)
+ocr_engine: Optional[OCREngine] = None
+
+def get_ocr_engine() -> OCREngine:
+    """Retorna o motor de concorrência do OCR, criando-o se necessário"""
+    global ocr_engine
+    if ocr_engine is None:
+        ocr_engine = OCREngine(max_workers=settings.OCR_MAX_WORKERS)
+        logger.info(f"⚙️ Motor de OCR iniciado - {settings.OCR_MAX_WORKERS} workers")
+    return ocr_engine
+
+# Limite de cota do OCR (token bucket compartilhado entre processos)
+rate_limiter: Optional[RateLimiter] = None
+
+def get_rate_limiter() -> RateLimiter:
+    """Retorna o limite de cota das chamadas de OCR, criando-o se necessário"""
+    global rate_limiter
+    if rate_limiter is None:
+        enabled = settings.OCR_RATE_LIMIT_RPM > 0 or settings.OCR_RATE_LIMIT_IMAGES_PER_MINUTE > 0
+        try:
+            store = create_bucket_store(settings.OCR_RATE_LIMIT_STORE if enabled else "memory", settings)
+        except ValueError as e:
+            raise HTTPException(status_code=500, detail=str(e))
+        rate_limiter = RateLimiter(
+            store=store,
+            requests_per_minute=settings.OCR_RATE_LIMIT_RPM,
+            images_per_minute=settings.OCR_RATE_LIMIT_IMAGES_PER_MINUTE,
+            burst_seconds=settings.OCR_RATE_LIMIT_BURST_SECONDS
+        )
+        if rate_limiter.enabled:
+            logger.info(f"⏳ Cota do OCR - {settings.OCR_RATE_LIMIT_RPM:g} chamadas/min, {settings.OCR_RATE_LIMIT_IMAGES_PER_MINUTE:g} imagens/min (0 = sem limite), estado: {store.name}")
+    return rate_limiter
+
+# Pool de processos de renderização e codificação das páginas
+render_pool: Optional[RenderPool] = None
+
+def get_render_pool() -> RenderPool:
+    """Retorna o pool de renderização, criando-o se necessário (os processos são iniciados no lifespan)"""
+    global render_pool
+    if render_pool is None:
+        render_pool = RenderPool(
+            workers=settings.RENDER_WORKERS,
+            chunk_pages=settings.RENDER_CHUNK_PAGES,
+            spool_dir=settings.RENDER_SPOOL_DIR
+        )
+    return render_pool
+
+# Templates de layout (áreas de interesse por tipo de documento), carregados de TEMPLATES_DIR
+template_registry: Optional[TemplateRegistry] = None
+
+def get_template_registry() -> TemplateRegistry:
+    """Retorna os templates de layout, carregando-os se necessário"""
+    global template_registry
+    if template_registry is None:
+        try:
+            template_registry = TemplateRegistry.load(settings.TEMPLATES_DIR)
+        except TemplateError as e:
+            raise HTTPException(status_code=500, detail=str(e))
+        logger.info(f"🧩 Templates de layout - {', '.join(template_registry.names()) or 'nenhum'} ({settings.TEMPLATES_DIR})")
+    return template_registry
+
+# Detecção automática do template (/extract-auto), com as miniaturas já aprendidas
+template_detector: Optional[TemplateDetector] = None
+
+def get_template_detector() -> TemplateDetector:
+    """Retorna o detector de templates, criando-o se necessário"""
+    global template_detector
+    if template_detector is None:
+        template_detector = TemplateDetector(
+            get_template_registry(),
+            max_distance=settings.DETECT_THUMBNAIL_MAX_DISTANCE,
+            max_fingerprints=settings.DETECT_MAX_FINGERPRINTS
+        )
+        logger.info(f"🔎 Detecção automática - templates: {', '.join(template.name for template in template_detector.templates) or 'nenhum'}")
+    return template_detector
+
+# Backend de OCR (Vision API ou simulado, conforme OCR_BACKEND)
+ocr_backend: Optional[OCRBackend] = None
+
+def get_ocr_backend() -> OCRBackend:
+    """Retorna o backend de OCR configurado, criando-o se necessário"""
+    global ocr_backend
+    if ocr_backend is None:
+        try:
+            pool = VisionClientPool(
+                size=settings.VISION_POOL_SIZE,
+                max_concurrent_per_client=settings.VISION_CHANNEL_MAX_CONCURRENT,
+                client_factory=create_vision_client
+            )
+            backend = create_ocr_backend(settings.OCR_BACKEND, settings, pool=pool)
+        except ValueError as e:
+            raise HTTPException(status_code=500, detail=str(e))
+        # Todas as chamadas (lotes, PDF nativo, retentativas) passam pela cota
+        limiter = get_rate_limiter()
+        ocr_backend = RateLimitedBackend(backend, limiter, on_wait=observe_rate_limit) if limiter.enabled else backend
+        logger.info(f"🔌 Backend de OCR - {ocr_backend.name}")
+    return ocr_backend
+
+# Agrupador de chamadas da Vision API (compartilhado entre requisições)
+vision_batcher: Optional[VisionBatcher] = None
+
+def get_vision_batcher() -> VisionBatcher:
+    """Retorna o agrupador de chamadas ao backend de OCR, criando-o se necessário"""
+    global vision_batcher
+    if vision_batcher is None:
+        backend = get_ocr_backend()
+        # Com cota, o agrupador reserva uma vez por lote (antes do envio) e chama o backend interno
+        limited = isinstance(backend, RateLimitedBackend)
+        vision_batcher = VisionBatcher(
+            backend=backend.backend if limited else backend,
+            batch_size=settings.VISION_BATCH_SIZE,
+            linger_ms=settings.VISION_BATCH_LINGER_MS,
+            max_batch_bytes=settings.VISION_BATCH_MAX_BYTES,
+            acquire=backend.acquire if limited else None
+        )
+        logger.info(f"📦 Lotes de OCR - até {vision_batcher.batch_size} imagens, espera de {settings.VISION_BATCH_LINGER_MS}ms")
+    return vision_batcher
+
+# Retentativas, prazos e hedging das chamadas de OCR (janela de latência compartilhada)
+ocr_resilience: Optional[OCRResilience] = None
+
+def get_ocr_resilience() -> OCRResilience:
+    """Retorna a política de retentativas, prazos e hedging do OCR, criando-a se necessário"""
+    global ocr_resilience
+    if ocr_resilience is None:
+        ocr_resilience = OCRResilience(
+            max_attempts=settings.OCR_RETRY_MAX_ATTEMPTS,
+            backoff_ms=settings.OCR_RETRY_BACKOFF_MS,
+            backoff_max_ms=settings.OCR_RETRY_BACKOFF_MAX_MS,
+            call_timeout=settings.OCR_CALL_TIMEOUT_SECONDS,
+            page_deadline=settings.OCR_PAGE_DEADLINE_SECONDS,
+            request_deadline=settings.OCR_REQUEST_DEADLINE_SECONDS,
+            hedge=settings.OCR_HEDGE_ENABLED,
+            hedge_quantile=settings.OCR_HEDGE_QUANTILE,
+            hedge_min_samples=settings.OCR_HEDGE_MIN_SAMPLES
+        )
+        logger.info(f"🔁 Resiliência do OCR - até {ocr_resilience.max_attempts} tentativa(s), prazo de {settings.OCR_PAGE_DEADLINE_SECONDS:g}s por página e {settings.OCR_REQUEST_DEADLINE_SECONDS:g}s por requisição, hedging {'ativo' if ocr_resilience.hedge else 'desativado'}")
+    return ocr_resilience
+
+def resilient(func):
+    """Decorador das extrações: prazo total da requisição e contadores de retentativas/hedging do OCR"""
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        with get_ocr_resilience().scope() as calls:
+            try:
+                return await func(*args, **kwargs)
+            finally:
+                record_ocr_calls(calls.retries, calls.hedges, calls.timeouts)
+    return wrapper
+
+def is_retryable_result(result: OCRPageResult) -> bool:
+    """Página com erro transitório do backend (vale tentar de novo)"""
+    return bool(result.error) and result.retryable
+
+# Cache de resultados de OCR (memória + disco)
+ocr_cache: Optional[OCRCache] = None
+
+def get_ocr_cache() -> OCRCache:
+    """Retorna o cache de resultados de OCR, criando-o se necessário"""
+    global ocr_cache
+    if ocr_cache is None:
+        ocr_cache = OCRCache(
+            enabled=settings.OCR_CACHE_ENABLED,
+            memory_max_bytes=settings.OCR_CACHE_MEMORY_MB * 1024 * 1024,
+            disk_path=settings.OCR_CACHE_PATH if settings.OCR_CACHE_DISK_ENABLED else None,
+            ttl_seconds=settings.OCR_CACHE_TTL_SECONDS
+        )
+        if ocr_cache.enabled:
+            logger.info(f"💾 Cache de OCR ativo - {settings.OCR_CACHE_MEMORY_MB}MB em memória, disco: {settings.OCR_CACHE_PATH if settings.OCR_CACHE_DISK_ENABLED else 'desativado'}")
+    return ocr_cache
+
+# Amostras das áreas recortadas para depuração (desativado com DEBUG_ARTIFACTS_SAMPLE_RATE=0)
+debug_artifacts: Optional[ArtifactStore] = None
+
+def get_debug_artifacts() -> ArtifactStore:
+    """Retorna o armazenamento de artefatos de depuração, criando-o se necessário"""
+    global debug_artifacts
+    if debug_artifacts is None:
+        debug_artifacts = ArtifactStore(
+            directory=settings.DEBUG_ARTIFACTS_DIR,
+            sample_rate=settings.DEBUG_ARTIFACTS_SAMPLE_RATE,
+            max_bytes=settings.DEBUG_ARTIFACTS_MAX_MB * 1024 * 1024,
+            max_age_seconds=settings.DEBUG_ARTIFACTS_MAX_AGE_HOURS * 3600,
+            queue_size=settings.DEBUG_ARTIFACTS_QUEUE_SIZE
+        )
+        if debug_artifacts.enabled:
+            logger.info(f"🐞 Artefatos de depuração ativos - {debug_artifacts.sample_rate:.0%} das páginas em {settings.DEBUG_ARTIFACTS_DIR}")
+    return debug_artifacts
+
+# Controle de admissão: orçamento de páginas e memória compartilhado por todas as requisições
+admission: Optional[AdmissionController] = None
+
+def get_admission() -> AdmissionController:
+    """Retorna o controle de admissão do processo, criando-o se necessário"""
+    global admission
+    if admission is None:
+        admission = AdmissionController(
+            max_pages=settings.ADMISSION_MAX_PAGES,
+            max_pixel_bytes=settings.ADMISSION_MAX_PIXEL_MB * 1024 * 1024,
+            max_wait_seconds=settings.ADMISSION_MAX_WAIT_SECONDS,
+            max_waiting=settings.ADMISSION_MAX_WAITING,
+            retry_after_seconds=settings.ADMISSION_RETRY_AFTER_SECONDS
+        )
+        if admission.enabled:
+            logger.info(f"🚦 Controle de admissão - até {settings.ADMISSION_MAX_PAGES} página(s) e {settings.ADMISSION_MAX_PIXEL_MB}MB de pixels em processamento")
+    return admission
+
+async def admit(pages: int, pixel_bytes: int = 0) -> Permit:
+    """
+    Reserva páginas e memória no controle de admissão antes de renderizar
+    
+    Sem vaga a tempo, responde 503 com Retry-After. A reserva deve ser
+    devolvida (`permit.release()`) quando as páginas terminarem.
+    """
+    start = datetime.datetime.now()
+    try:
+        permit = await get_admission().acquire(pages, pixel_bytes)
+    except AdmissionRejected as e:
+        observe_admission((datetime.datetime.now() - start).total_seconds(), rejected=True)
+        raise HTTPException(
+            status_code=503,
+            detail=f"Servidor ocupado ({str(e)}). Tente novamente em {e.retry_after}s",
+            headers={"Retry-After": str(e.retry_after)}
+        )
+    observe_admission((datetime.datetime.now() - start).total_seconds())
+    return permit
+
+@asynccontextmanager
+async def admitted(pages: int, pixel_bytes: int = 0) -> AsyncIterator[Permit]:
+    """`admit` mantendo a reserva enquanto o bloco executa"""
+    permit = await admit(pages, pixel_bytes)
+    try:
+        yield permit
+    finally:
+        permit.release()
+
+async def gather_admitted(
+    chunks: Iterable[List[int]],
+    cost: Callable[[List[int]], int],
+    process: Callable[[List[int]], Awaitable[Any]]
+) -> list:
+    """
+    Executa `process` em cada bloco de páginas, reservando no controle de admissão só um bloco por vez
+    
+    Cada bloco reserva as suas páginas e `cost(bloco)` bytes antes de começar e
+    devolve a vaga ao terminar; os blocos seguintes esperam a vez junto com os
+    das outras requisições, sem que um documento grande ocupe o orçamento
+    inteiro. Se um bloco falhar ou for recusado (503), os já iniciados são
+    cancelados. Retorna os resultados na ordem dos blocos.
+    """
+    async def run(chunk: List[int], permit: Permit):
+        try:
+            return await process(chunk)
+        finally:
+            permit.release()
+    
+    tasks = []
+    try:
+        for chunk in chunks:
+            permit = await admit(len(chunk), cost(chunk))
+            tasks.append(asyncio.create_task(run(chunk, permit)))
+        return await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+
+# Tamanho assumido (A4, em pontos) quando a inspeção não informa o tamanho da página
+DEFAULT_PAGE_SIZE = (595.0, 842.0)
+
+def estimate_page_bytes(pdf_info: Optional[PdfInfo], page_number: int, dpi: float, box: Optional[Box] = None) -> int:
+    """Memória estimada da imagem da página (base 1), ou só da região `box`, renderizada em `dpi`"""
+    page_size = (pdf_info.page_size(page_number) if pdf_info else None) or DEFAULT_PAGE_SIZE
+    return estimate_render_bytes(page_size, dpi, box)
+
+def page_sizes(pdf_info: PdfInfo, page_numbers: List[int]) -> Tuple[Tuple[int, Tuple[float, float]], ...]:
+    """Tamanho das páginas (base 1) conhecido pela inspeção, para a renderização só da região"""
+    return tuple((page_number, pdf_info.page_size(page_number)) for page_number in page_numbers if pdf_info.page_size(page_number))
+
+# Fila persistente de jobs assíncronos (POST /jobs)
+job_queue: Optional[JobQueue] = None
+
+def get_job_queue() -> JobQueue:
+    """Retorna a fila de jobs, criando-a se necessário (os workers são iniciados no lifespan)"""
+    global job_queue
+    if job_queue is None:
+        job_queue = JobQueue(
+            store=JobStore(settings.JOBS_DB_PATH, settings.JOBS_DIR, lease_seconds=settings.JOBS_LEASE_SECONDS),
+            runner=run_job,
+            workers=settings.JOBS_WORKERS,
+            poll_interval=settings.JOBS_POLL_INTERVAL,
+            retention_seconds=settings.JOBS_RETENTION_HOURS * 3600,
+            max_attempts=settings.JOBS_MAX_ATTEMPTS
+        )
+    return job_queue
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Cria e encerra os recursos compartilhados da aplicação"""
+    global ocr_engine, render_pool, template_registry, template_detector, rate_limiter, ocr_backend, vision_batcher, ocr_resilience, ocr_cache, debug_artifacts, admission, job_queue
+    # Falhar na inicialização se algum template ou codificação configurada for inválida
+    templates = get_template_registry()
+    for name in ("VISION_ENCODING_TEXT", "VISION_ENCODING_IMAGE"):
+        logger.info(f"🖼️ {name} = {parse_encoding(getattr(settings, name)).key}")
+    for template in templates:
+        logger.info(f"🖼️ {template.name} = {parse_encoding(template_encoding(template)).key}")
+    get_template_detector()
+    get_ocr_engine()
+    get_render_pool().start()
+    backend = get_ocr_backend()
+    try:
+        # Clientes da Vision API criados já no event loop; sem credenciais, o erro volta na primeira chamada
+        backend.open()
+    except Exception as e:
+        logger.error(f"❌ Erro ao conectar o backend de OCR: {getattr(e, 'detail', str(e))}")
+    get_vision_batcher()
+    get_ocr_resilience()
+    get_ocr_cache()
+    get_debug_artifacts()
+    get_admission()
+    await get_job_queue().start()
+    yield
+    if job_queue is not None:
+        await job_queue.stop()
+        job_queue.store.close()
+        job_queue = None
+    admission = None
+    ocr_resilience = None
+    vision_batcher = None
+    if ocr_backend is not None:
+        await ocr_backend.close()
+        ocr_backend = None
+    rate_limiter = None
+    if debug_artifacts is not None:
+        debug_artifacts.close()
+        debug_artifacts = None
+    if ocr_cache is not None:
+        ocr_cache.close()
+        ocr_cache = None
+    if render_pool is not None:
+        render_pool.shutdown()
+        render_pool = None
+    template_detector = None
+    template_registry = None
+    if ocr_engine is not None:
+        ocr_engine.shutdown()
+        ocr_engine = None
 
 app = FastAPI(
     title="PDF OCR Vision API",
     description="API para extração de texto de arquivos PDF usando Google Cloud Vision",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # Configuração CORS
@@ -98,6 +477,28 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Folga para os cabeçalhos e campos do multipart além do próprio arquivo
+MULTIPART_OVERHEAD = 1024 * 1024
+
+@app.middleware("http")
+async def reject_oversized_uploads(request: Request, call_next):
+    """
+    Recusa com 413, antes de ler o corpo, uploads cujo Content-Length já
+    ultrapassa MAX_FILE_SIZE (os demais são limitados durante o recebimento)
+    """
+    content_length = request.headers.get("content-length")
+    if (
+        settings.MAX_FILE_SIZE
+        and content_length
+        and content_length.isdigit()
+        and int(content_length) > settings.MAX_FILE_SIZE + MULTIPART_OVERHEAD
+    ):
+        return JSONResponse(
+            status_code=413,
+            content={"detail": f"Arquivo excede o tamanho máximo de {settings.MAX_FILE_SIZE} bytes"}
+        )
+    return await call_next(request)
+
 # Configurações
 UPLOAD_DIR = os.getenv("UPLOAD_DIR", "temp_uploads")
 GOOGLE_APPLICATION_CREDENTIALS = os.getenv("GOOGLE_APPLICATION_CREDENTIALS")
@@ -105,33 +506,31 @@ GOOGLE_APPLICATION_CREDENTIALS = os.getenv("GOOGLE_APPLICATION_CREDENTIALS")
 # Criar diretório de upload se não existir
 Path(UPLOAD_DIR).mkdir(exist_ok=True)
 
-# Cliente do Google Cloud Vision (inicializado sob demanda)
-vision_client = None
+# Rotas declaradas daqui em diante recebem os arquivos do multipart direto em UPLOAD_DIR
+app.router.route_class = spooling_route_class(UPLOAD_DIR, settings.MAX_FILE_SIZE)
 
-def get_vision_client():
-    """Inicializa e retorna o cliente do Google Cloud Vision"""
-    global vision_client
-    if vision_client is None:
-        try:
-            # Primeiro, limpar qualquer variável que aponte para arquivo inválido
-            service_account_file = "/app/gcloud-config/service-account-key.json"
-            if os.getenv("GOOGLE_APPLICATION_CREDENTIALS") == service_account_file:
-                # Se está apontando para o arquivo vazio, remover a variável
-                if os.path.exists(service_account_file) and os.path.getsize(service_account_file) == 0:
-                    os.environ.pop("GOOGLE_APPLICATION_CREDENTIALS", None)
-                    logger.info("🔧 Removida referência a arquivo de Service Account vazio")
-            
-            # Usar Application Default Credentials (que sabemos que funcionam)
-            vision_client = vision.ImageAnnotatorClient()
-            logger.info("✅ Cliente Vision criado com Application Default Credentials")
-            
-        except Exception as e:
-            logger.error(f"❌ Erro na criação do cliente Vision: {str(e)}")
-            raise HTTPException(
-                status_code=503, 
-                detail=f"Erro na configuração do Google Cloud Vision: {str(e)}"
-            )
-    return vision_client
+def create_vision_client():
+    """Cria um cliente assíncrono do Google Cloud Vision (um por canal do pool)"""
+    try:
+        # Primeiro, limpar qualquer variável que aponte para arquivo inválido
+        service_account_file = "/app/gcloud-config/service-account-key.json"
+        if os.getenv("GOOGLE_APPLICATION_CREDENTIALS") == service_account_file:
+            # Se está apontando para o arquivo vazio, remover a variável
+            if os.path.exists(service_account_file) and os.path.getsize(service_account_file) == 0:
+                os.environ.pop("GOOGLE_APPLICATION_CREDENTIALS", None)
+                logger.info("🔧 Removida referência a arquivo de Service Account vazio")
+        
+        # Usar Application Default Credentials (que sabemos que funcionam)
+        client = create_async_client()
+        logger.info("✅ Cliente Vision criado com Application Default Credentials")
+        return client
+    
+    except Exception as e:
+        logger.error(f"❌ Erro na criação do cliente Vision: {str(e)}")
+        raise HTTPException(
+            status_code=503, 
+            detail=f"Erro na configuração do Google Cloud Vision: {str(e)}"
+        )
 
 class TextExtractionResponse(BaseModel):
     """Modelo de resposta para extração de texto"""
@@ -139,26 +538,77 @@ class TextExtractionResponse(BaseModel):
     total_pages: int
     success: bool
     message: str
+    cache_hits: int = 0
+    encoding: Optional[str] = None
+    upload_bytes: int = 0
+    encode_time: float = 0.0
+    ocr_retries: int = 0
+    ocr_hedges: int = 0
 
 class SimpleTextResponse(BaseModel):
     """Modelo de resposta simples com texto limpo por páginas"""
     pages: List[str]
+    page_sources: List[str] = []
     total_pages: int
     success: bool
+    cache_hits: int = 0
+    encoding: Optional[str] = None
+    upload_bytes: int = 0
+    encode_time: float = 0.0
+    ocr_retries: int = 0
+    ocr_hedges: int = 0
 
 class AgibankResponse(BaseModel):
     """Modelo de resposta para extração de área específica do Agibank"""
     demonstrativo_pages: List[str]
+    page_sources: List[str] = []
     total_pages: int
     success: bool
     message: str
+    cache_hits: int = 0
+    encoding: Optional[str] = None
+    upload_bytes: int = 0
+    encode_time: float = 0.0
+    failed_pages: List[int] = []
+    ocr_retries: int = 0
+    ocr_hedges: int = 0
 
 class BmgResponse(BaseModel):
     """Modelo de resposta para extração de área específica do BMG"""
     transacoes_pages: List[str]
+    page_sources: List[str] = []
+    total_pages: int
+    success: bool
+    message: str
+    cache_hits: int = 0
+    encoding: Optional[str] = None
+    upload_bytes: int = 0
+    encode_time: float = 0.0
+    failed_pages: List[int] = []
+    ocr_retries: int = 0
+    ocr_hedges: int = 0
+
+class RegionExtractionResponse(BaseModel):
+    """Modelo de resposta para extração das áreas de um template de layout"""
+    template: str
+    regions: List[str]
+    pages: List[Dict[str, str]]  # Texto de cada área, por página
+    page_sources: List[str] = []
     total_pages: int
     success: bool
     message: str
+    cache_hits: int = 0
+    encoding: Optional[str] = None
+    upload_bytes: int = 0
+    encode_time: float = 0.0
+    failed_pages: List[int] = []
+    ocr_retries: int = 0
+    ocr_hedges: int = 0
+
+class AutoExtractionResponse(RegionExtractionResponse):
+    """Modelo de resposta para extração com o template detectado automaticamente"""
+    detected_by: str  # cache, text_layer, thumbnail ou ocr_probe
+    detection_time: float = 0.0
 
 class ErrorResponse(BaseModel):
     """Modelo de resposta para erros"""
@@ -166,300 +616,1233 @@ class ErrorResponse(BaseModel):
     message: str
     error_code: str
 
-def pdf_to_images(pdf_bytes: bytes) -> List[Image.Image]:
-    """Converte PDF em lista de imagens"""
-    try:
-        images = convert_from_bytes(pdf_bytes, dpi=300)
-        return images
-    except Exception as e:
-        raise HTTPException(status_code=400, detail=f"Erro ao converter PDF: {str(e)}")
+class JobResponse(BaseModel):
+    """Modelo de resposta com o status de um job assíncrono"""
+    job_id: str
+    mode: str
+    status: str
+    filename: Optional[str] = None
+    pages_total: Optional[int] = None
+    pages_done: int = 0
+    pages: Dict[int, str] = {}
+    created_at: str
+    started_at: Optional[str] = None
+    finished_at: Optional[str] = None
+    error: Optional[str] = None
 
-def clean_text(text: str) -> str:
-    """Limpa o texto removendo quebras de linha e espaços extras"""
-    if not text:
-        return ""
-    
-    # Substituir quebras de linha por espaços
-    cleaned_text = text.replace('\n', ' ')
-    
-    # Remover espaços extras (múltiplos espaços se tornam um só)
-    cleaned_text = ' '.join(cleaned_text.split())
-    
-    return cleaned_text
+# Modos de OCR disponíveis para /extract-text e /extract-text-simple
+OCR_MODES = ("raster", "native")
+
+def resolve_ocr_mode(ocr_mode: Optional[str]) -> str:
+    """Valida o modo de OCR solicitado, usando o padrão da configuração se não informado"""
+    mode = (ocr_mode or settings.OCR_DEFAULT_MODE).strip().lower()
+    if mode not in OCR_MODES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Modo de OCR inválido: '{mode}'. Use: {', '.join(OCR_MODES)}"
+        )
+    return mode
 
-def crop_agibank_demonstrativo_area(image: Image.Image) -> Image.Image:
+def inspect_document(pdf_path: str) -> PdfInfo:
     """
-    Recorta a área do demonstrativo da fatura Agibank
+    Inspeciona a estrutura do PDF (páginas e tamanhos) sem rasterizá-lo
     
-    Baseado na área marcada em vermelho na imagem de referência:
-    - Lado direito da fatura onde ficam as transações
-    - Região do "DEMONSTRATIVO"
+    Compartilhado por todos os endpoints; o resultado é reutilizado na seleção
+    de páginas e nas etapas seguintes da requisição.
     """
-    width, height = image.size
+    try:
+        with timed("inspect"):
+            return inspect_pdf_file(pdf_path)
+    except PdfInspectionError as e:
+        logger.error(f"❌ Erro ao analisar PDF: {str(e)}")
+        raise HTTPException(status_code=400, detail=f"PDF inválido ou corrompido: {str(e)}")
+
+async def spool_file(file: UploadFile, suffix: str = ".pdf") -> SpooledUpload:
+    """
+    Grava o upload em disco (em blocos) e o retorna como SpooledUpload
     
-    # Coordenadas da área do demonstrativo (valores aproximados baseados na imagem)
-    # Área direita superior onde está o demonstrativo
-    left = int(width * 0.45)    # Começa em 45% da largura
-    top = int(height * 0.15)    # Começa em 15% da altura  
-    right = int(width * 0.95)   # Vai até 95% da largura
-    bottom = int(height * 0.55)  # Vai até 55% da altura
+    O arquivo é gravado uma única vez, em UPLOAD_DIR, enquanto o corpo é
+    recebido (`spooling_route_class`); as etapas seguintes usam o caminho.
+    Uploads acima de MAX_FILE_SIZE são recusados com 413: pelo Content-Length,
+    no middleware, ou assim que o limite é ultrapassado no recebimento.
+    O chamador remove o arquivo ao final (`upload.remove()`).
+    """
+    try:
+        upload = await spool_upload(file, UPLOAD_DIR, settings.MAX_FILE_SIZE, suffix=suffix)
+    except UploadTooLarge as e:
+        logger.error(f"❌ Upload recusado: {file.filename} excede {e.max_size} bytes")
+        raise HTTPException(status_code=413, detail=str(e))
+    logger.info(f"📥 Upload gravado: {file.filename} ({upload.size} bytes)")
+    return upload
+
+# Jobs (POST /jobs) existem para documentos grandes: sem o limite de páginas por requisição
+_unlimited_pages: ContextVar[bool] = ContextVar("unlimited_pages", default=False)
+
+@contextmanager
+def without_page_limit():
+    """Seleções de páginas feitas dentro do bloco não passam por MAX_PAGES_PER_REQUEST (ex: jobs)"""
+    token = _unlimited_pages.set(True)
+    try:
+        yield
+    finally:
+        _unlimited_pages.reset(token)
+
+def select_pages(extract_pages: Optional[str], total_pages: int) -> List[int]:
+    """
+    Converte o parâmetro `extract_pages` nos índices (base 0) das páginas a processar
     
-    # Recortar a área específica
-    cropped_image = image.crop((left, top, right, bottom))
+    Páginas fora do intervalo do documento (`PdfInfo.page_count`) são ignoradas.
+    Com MAX_PAGES_PER_REQUEST (0 = sem limite), mais páginas selecionadas são
+    recusadas com 413, antes de qualquer renderização (exceto em `without_page_limit`).
+    """
+    if not extract_pages or extract_pages.lower() == "all":
+        pages = list(range(total_pages))
+    else:
+        try:
+            specified_pages = [int(p.strip()) - 1 for p in extract_pages.split(",")]
+        except ValueError:
+            logger.error(f"❌ Formato inválido de páginas: {extract_pages}")
+            raise HTTPException(
+                status_code=400,
+                detail="Formato inválido para páginas. Use números separados por vírgula (ex: '1,3,5')"
+            )
+        pages = [p for p in specified_pages if 0 <= p < total_pages]
     
-    return cropped_image
+    limit = settings.MAX_PAGES_PER_REQUEST
+    if limit > 0 and len(pages) > limit and not _unlimited_pages.get():
+        raise HTTPException(
+            status_code=413,
+            detail=f"Documento com {len(pages)} páginas selecionadas; o limite por requisição é {limit}. "
+                   f"Use extract_pages ou POST /jobs"
+        )
+    return pages
+
+# DPI usado na rasterização de páginas completas
+PDF_TO_IMAGES_DPI = 300
 
-def crop_bmg_transacoes_area(image: Image.Image) -> Image.Image:
+async def render_pages(
+    pdf_path: str,
+    page_numbers: List[int],
+    dpi: float,
+    encoding: EncodingPreset,
+    stats: Optional[EncodingStats] = None,
+    debug_save: Optional[ArtifactSaver] = None,
+    **options
+) -> List[RenderedPage]:
     """
-    Recorta a área das transações da fatura BMG
+    Renderiza e codifica um bloco de páginas (base 1) no pool de renderização
     
-    Baseado na área marcada em vermelho na imagem de referência:
-    - Parte central-esquerda onde ficam DATA e HISTÓRICO
-    - Região das transações listadas
+    Os tempos de renderização e codificação medidos no processo do pool
+    entram nas métricas da requisição, e o tamanho enviado em `stats`. As
+    páginas sorteadas para depuração (a mesma imagem enviada ao OCR) são
+    gravadas pelo próprio pool.
     """
-    width, height = image.size
+    pool = get_render_pool()
+    debug_pages = frozenset(page_number for page_number in page_numbers if debug_save.sample()) if debug_save else frozenset()
+    task = pool.task(pdf_path, page_numbers, dpi, encoding, debug_pages=debug_pages, **options)
+    pages = await pool.render(task, get_ocr_engine().executor)
     
-    # Coordenadas da área das transações BMG (baseado na área marcada)
-    # Área central-esquerda onde estão as transações
-    left = 0    # Começa na posição 0 da largura (extrema esquerda)
-    top = int(height * 0.05)    # Começa em 5% da altura (quase no topo)
-    right = int(width * 0.92)   # Vai até 95% da largura (quase toda a largura)
-    bottom = int(height * 0.65)  # Vai até 65% da altura (área das transações)
+    for page in pages:
+        record_stage("render", page.render_seconds)
+        if page.debug_path:
+            debug_save.save_file(page.page_number, page.debug_path)
+            page.debug_path = None
+        if page.path:
+            record_stage("encode", page.encode_seconds)
+            if stats is not None:
+                stats.add(page.size, page.encode_seconds)
+    return pages
+
+# Origem do texto de cada página
+PAGE_SOURCE_CACHE = "cache"
+PAGE_SOURCE_TEXT_LAYER = "text_layer"
+PAGE_SOURCE_OCR = "ocr"
+
+async def read_text_layer(pdf_path: str, page_numbers: List[int], label: str) -> Dict[int, PageTextLayer]:
+    """Lê a camada de texto das páginas (base 1); se falhar, todas as páginas seguem para o OCR"""
+    if not settings.TEXT_LAYER_ENABLED or not page_numbers:
+        return {}
+    try:
+        return await get_ocr_engine().run(timed_call, "text_layer", extract_text_layer, pdf_path, page_numbers)
+    except PdfTextError as e:
+        logger.warning(f"⚠️ {label} - Camada de texto indisponível, usando OCR: {str(e)}")
+        return {}
+
+def usable_text_layer(layer: Optional[PageTextLayer], box: Optional[Tuple[float, float, float, float]] = None) -> Optional[str]:
+    """Texto da camada de texto (dentro de `box`, se informado) quando utilizável no lugar do OCR"""
+    if layer is None:
+        return None
+    text = layer.text(box)
+    if is_usable_text(text, settings.TEXT_LAYER_MIN_CHARS, settings.TEXT_LAYER_MIN_ALNUM_RATIO):
+        return text
+    return None
+
+def page_cache_key(
+    doc_hash: str,
+    page_number: int,
+    mode: str,
+    encoding: Optional[EncodingPreset] = None,
+    dpi: int = PDF_TO_IMAGES_DPI,
+    region: Optional[Box] = None
+) -> str:
+    """
+    Chave de cache do OCR da página (base 1), inteira ou só da região `region`
     
-    # Recortar a área específica
-    cropped_image = image.crop((left, top, right, bottom))
+    A página vai para o cache com o layout (caixas das palavras, em frações da
+    página), e o texto de cada área é extraído dele.
+    """
+    if mode != "raster":
+        return get_ocr_cache().make_key(doc_hash, page_number, mode=mode, backend=settings.OCR_BACKEND)
+    return get_ocr_cache().make_key(
+        doc_hash, page_number, mode=mode, region=region, dpi=dpi, encoding=encoding.key, backend=settings.OCR_BACKEND
+    )
+
+def region_texts(layout: Optional[dict], template: LayoutTemplate) -> Dict[str, str]:
+    """Texto de cada área do template a partir do layout da página (caixas das palavras do OCR), já processado"""
+    page_layout = PageLayout.from_dict(layout) if layout else PageLayout()
+    texts = {}
+    for name, box in template.regions:
+        with timed("crop"):
+            text = page_layout.text(box)
+        with timed("postprocess"):
+            texts[name] = template.postprocess(clean_text(text))
+    return texts
+
+def resolve_encoding(encoding: Optional[str], default: str) -> EncodingPreset:
+    """Valida a codificação solicitada, usando o padrão do endpoint se não informada"""
+    try:
+        return parse_encoding(encoding, default=default)
+    except EncodingError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+def template_encoding(template: LayoutTemplate) -> str:
+    """Codificação padrão do template: VISION_ENCODING_<NOME>, o "encoding" do arquivo ou VISION_ENCODING"""
+    return settings.template_encoding(template.name) or template.encoding or settings.VISION_ENCODING
+
+def resolve_template(name: str) -> LayoutTemplate:
+    """Busca o template de layout pelo nome (404 se não existir)"""
+    try:
+        return get_template_registry().get(name)
+    except TemplateError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+def encode_image_for_vision(
+    image: Image.Image,
+    encoding: EncodingPreset = ENCODING_PRESETS["png"],
+    stats: Optional[EncodingStats] = None
+) -> bytes:
+    """Converte a imagem PIL nos bytes enviados para a Vision API"""
+    with timed("encode"):
+        return encode_image(image, encoding, stats)
+
+def build_page_result(ocr_result: OCRPageResult) -> dict:
+    """Converte o resultado do backend de OCR no resultado da página"""
+    if ocr_result.error:
+        raise Exception(ocr_result.error)
     
-    # Salvar a imagem cortada para conferência
-    import datetime
-    timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-    crop_filename = f"bmg_crop_{timestamp}.png"
-    crop_path = os.path.join(UPLOAD_DIR, crop_filename)
+    raw_text = ocr_result.text
+    if raw_text:
+        # Limpar o texto
+        with timed("postprocess"):
+            cleaned_text = clean_text(raw_text)
+        
+        return {
+            "text": cleaned_text,
+            "confidence": 0.9,  # Vision API não retorna confiança diretamente
+            "words_count": len(cleaned_text.split()) if cleaned_text else 0,
+            "layout": ocr_result.layout.to_dict() if ocr_result.layout else None
+        }
+    else:
+        return {
+            "text": "",
+            "confidence": 0.0,
+            "words_count": 0,
+            "layout": ocr_result.layout.to_dict() if ocr_result.layout else None
+        }
+
+async def extract_text_from_image(
+    image: Image.Image,
+    encoding: EncodingPreset = ENCODING_PRESETS["png"],
+    stats: Optional[EncodingStats] = None
+) -> dict:
+    """Extrai texto de uma imagem usando o backend de OCR configurado"""
+    try:
+        content = await get_ocr_engine().run(encode_image_for_vision, image, encoding, stats)
+        
+        # Realizar OCR (com retentativas em falhas transitórias)
+        backend = get_ocr_backend()
+        with timed("ocr"):
+            ocr_result = (await get_ocr_resilience().call(
+                lambda: backend.annotate_images([content]),
+                retry_result=lambda results: is_retryable_result(results[0]),
+                label="Vision API",
+                queued=backend.queued
+            ))[0]
+        return build_page_result(ocr_result)
+            
+    except HTTPException:
+        raise
+    except OCRDeadlineExceeded as e:
+        raise HTTPException(status_code=504, detail=f"Tempo limite do OCR esgotado: {str(e)}")
+    except Exception as e:
+        error_msg = f"Erro na extração de texto: {str(e)}"
+        logger.error(f"❌ Vision API - {error_msg}")
+        raise HTTPException(status_code=500, detail=error_msg)
+
+async def extract_text_from_content_async(content: bytes) -> dict:
+    """
+    Extrai texto de uma imagem já codificada usando lotes da Vision API
     
+    A imagem entra no próximo lote do `VisionBatcher`, junto com outras
+    páginas deste documento ou de outras requisições concorrentes. Falhas
+    transitórias voltam para um novo lote (retentativa), e com hedging uma
+    página lenta ganha uma cópia no lote seguinte.
+    """
+    batcher = get_vision_batcher()
     try:
-        cropped_image.save(crop_path)
-        print(f"DEBUG: Imagem cortada BMG salva em: {crop_path}")
-        print(f"DEBUG: Coordenadas do corte - left:{left}, top:{top}, right:{right}, bottom:{bottom}")
-        print(f"DEBUG: Tamanho original: {width}x{height}, Tamanho cortado: {cropped_image.size}")
+        with timed("ocr"):
+            ocr_result = await get_ocr_resilience().call(
+                lambda: batcher.annotate(content),
+                retry_result=is_retryable_result,
+                label="Vision API",
+                queued=batcher.queued
+            )
+        return build_page_result(ocr_result)
+    except HTTPException:
+        raise
+    except OCRDeadlineExceeded as e:
+        raise HTTPException(status_code=504, detail=f"Tempo limite do OCR esgotado: {str(e)}")
     except Exception as e:
-        print(f"DEBUG: Erro ao salvar imagem cortada: {str(e)}")
+        error_msg = f"Erro na extração de texto: {str(e)}"
+        logger.error(f"❌ Vision API - {error_msg}")
+        raise HTTPException(status_code=500, detail=error_msg)
+
+def native_chunk_content(upload: SpooledUpload, chunk: List[int], page_count: Optional[int]) -> Tuple[bytes, List[int]]:
+    """
+    PDF enviado à Vision API para um bloco de páginas (índices base 0) e as páginas (base 1) a pedir nele
     
-    return cropped_image
+    O bloco leva um PDF só com as suas páginas (numeradas de 1 em diante), em vez
+    do documento inteiro a cada chamada. Um documento que cabe inteiro no bloco
+    vai como está. Se a separação falhar, o documento inteiro é enviado com as
+    páginas originais. Acima de VISION_MAX_PDF_BYTES, responde 413.
+    """
+    page_numbers = [page_num + 1 for page_num in chunk]
+    if page_count is not None and page_numbers == list(range(1, page_count + 1)):
+        content = upload.read_bytes()
+    else:
+        try:
+            with timed("encode"):
+                content = slice_pdf(upload.path, page_numbers)
+            page_numbers = list(range(1, len(page_numbers) + 1))
+        except PdfSliceError as e:
+            logger.warning(f"⚠️ Vision API - Não foi possível separar as páginas {page_numbers[0]}-{page_numbers[-1]}, enviando o PDF inteiro: {str(e)}")
+            content = upload.read_bytes()
+    if len(content) > settings.VISION_MAX_PDF_BYTES:
+        raise HTTPException(
+            status_code=413,
+            detail=f"PDF grande demais para o modo nativo ({len(content)} bytes nas páginas {chunk[0] + 1}-{chunk[-1] + 1}, "
+                   f"limite de {settings.VISION_MAX_PDF_BYTES}). Use ocr_mode=raster"
+        )
+    return content, page_numbers
 
-def extract_text_from_image(image: Image.Image) -> dict:
-    """Extrai texto de uma imagem usando Google Cloud Vision"""
+async def extract_pages_native(pdf_content: bytes, page_numbers: List[int]) -> List[dict]:
+    """
+    Extrai texto enviando o PDF diretamente para a Vision API (sem rasterização local)
+    
+    As páginas são divididas em blocos de até 5 (limite de batch_annotate_files),
+    enviados em paralelo. Os resultados voltam na ordem de `page_numbers`.
+    Um bloco com falha transitória é enviado de novo.
+    """
+    backend = get_ocr_backend()
+    resilience = get_ocr_resilience()
+    
+    async def annotate_chunk(chunk: List[int]):
+        with timed("ocr"):
+            return await resilience.call(
+                lambda: backend.annotate_pdf(pdf_content, chunk),
+                retry_result=lambda responses: any(is_retryable_result(r) for r in responses.values()),
+                label=f"Vision API (páginas {chunk[0]}-{chunk[-1]})",
+                queued=backend.queued
+            )
+    
     try:
-        # Converter imagem PIL para bytes
-        img_byte_arr = io.BytesIO()
-        image.save(img_byte_arr, format='PNG')
-        img_byte_arr = img_byte_arr.getvalue()
-        
-        # Criar objeto de imagem para Vision API
-        vision_image = vision.Image(content=img_byte_arr)
-        
-        # Realizar OCR
-        client = get_vision_client()
-        response = client.text_detection(image=vision_image)
-        texts = response.text_annotations
+        chunk_responses = await asyncio.gather(*(
+            annotate_chunk(chunk)
+            for chunk in chunk_pages(page_numbers, backend.max_pages_per_pdf_request)
+        ))
         
-        if response.error.message:
-            raise Exception(f"Erro na Vision API: {response.error.message}")
+        page_responses = {}
+        for responses in chunk_responses:
+            page_responses.update(responses)
         
-        # Extrair texto e confiança
-        if texts:
-            raw_text = texts[0].description
-            # Limpar o texto
-            cleaned_text = clean_text(raw_text)
-            
-            return {
-                "text": cleaned_text,
-                "confidence": 0.9,  # Vision API não retorna confiança diretamente
-                "words_count": len(cleaned_text.split()) if cleaned_text else 0
-            }
-        else:
-            return {
-                "text": "",
-                "confidence": 0.0,
-                "words_count": 0
-            }
-            
+        return [build_page_result(page_responses[page_num]) for page_num in page_numbers]
     except HTTPException:
         raise
+    except OCRDeadlineExceeded as e:
+        raise HTTPException(status_code=504, detail=f"Tempo limite do OCR esgotado: {str(e)}")
     except Exception as e:
         error_msg = f"Erro na extração de texto: {str(e)}"
         logger.error(f"❌ Vision API - {error_msg}")
         raise HTTPException(status_code=500, detail=error_msg)
 
-def process_agibank_demonstrativo_text(raw_text: str) -> str:
+# Callback chamado a cada página concluída: (número da página, registro da página)
+PageCallback = Callable[[int, dict], None]
+
+async def extract_full_pages(
+    upload: SpooledUpload,
+    pages_to_process: List[int],
+    mode: str,
+    on_page_done: Optional[PageCallback] = None,
+    encoding: EncodingPreset = ENCODING_PRESETS["png"],
+    stats: Optional[EncodingStats] = None,
+    pdf_info: Optional[PdfInfo] = None
+) -> Tuple[List[dict], int]:
     """
-    Processa o texto do demonstrativo Agibank para associar títulos com valores
+    Extrai o texto das páginas completas (índices base 0), consultando o cache antes do OCR
     
-    Padrão esperado: "data descrição data descrição ... valores valores valores"
+    Páginas com camada de texto utilizável têm o texto lido direto do PDF.
+    Só as páginas restantes são rasterizadas (modo raster) ou enviadas
+    à Vision API (modo native). Os resultados novos do OCR são gravados no
+    cache junto com o layout da página, que também atende os endpoints de banco.
+    No modo raster as páginas são codificadas conforme `encoding`; o tamanho
+    enviado e o tempo de codificação são somados em `stats`.
+    `on_page_done` é chamado assim que cada página fica pronta, na ordem de conclusão.
+    Antes do OCR de cada bloco, as suas páginas e a memória estimada das imagens
+    (tamanhos de `pdf_info`) são reservadas no controle de admissão.
+    
+    Returns:
+        (dados de cada página na ordem de `pages_to_process`, páginas atendidas pelo cache)
     """
-    if not raw_text:
-        return ""
+    cache = get_ocr_cache()
+    cache_keys = {page_num: page_cache_key(upload.sha256, page_num + 1, mode, encoding) for page_num in pages_to_process}
+    results = {}
     
-    import re
+    sources = {}
     
-    # Usar regex para encontrar todas as transações (data + descrição)
-    # Padrão: dd/mm/yyyy seguido de texto até a próxima data ou final
-    transaction_pattern = r'(\d{2}/\d{2}/\d{4})\s+([^0-9/]+?)(?=\s*\d{2}/\d{2}/\d{4}|$)'
-    transactions = re.findall(transaction_pattern, raw_text)
+    engine = get_ocr_engine()
     
-    # Extrair a parte final que contém os valores monetários
-    # Remover todas as transações identificadas e pegar o que sobra
-    text_without_transactions = raw_text
-    for date, desc in transactions:
-        text_without_transactions = text_without_transactions.replace(f"{date} {desc}", "", 1)
+    def store(page_num: int, page_result: dict, source: str = PAGE_SOURCE_OCR, fresh: Optional[Dict[str, dict]] = None):
+        result = {
+            "text": page_result["text"],
+            "confidence": page_result["confidence"],
+            "words_count": page_result["words_count"]
+        }
+        if fresh is not None:
+            # Com o layout, a mesma entrada atende as áreas dos endpoints de banco
+            fresh[cache_keys[page_num]] = {**result, "layout": page_result.get("layout")}
+        results[page_num] = result
+        sources[page_num] = source
+        if on_page_done:
+            on_page_done(page_num + 1, {"page_number": page_num + 1, **result, "source": source})
     
-    # Encontrar valores monetários na parte restante
-    # Padrão: números com vírgulas, pontos, sinais negativos
-    value_pattern = r'[-+]?\d{1,3}(?:\.\d{3})*(?:,\d{2})?|\d+,\d{2}|\d+'
-    values = re.findall(value_pattern, text_without_transactions)
+    # Cache em disco (SQLite) fora do event loop: uma consulta para o documento, uma gravação por bloco
+    cached_pages = await engine.run(cache.get_many, list(cache_keys.values()))
+    for page_num, cache_key in cache_keys.items():
+        cached = cached_pages.get(cache_key)
+        if cached is not None:
+            store(page_num, cached, source=PAGE_SOURCE_CACHE)
     
-    # Filtrar valores válidos (que parecem monetários)
-    monetary_values = []
-    for val in values:
-        # Aceitar valores que tenham pelo menos um dígito e formato monetário
-        if val and (len(val) >= 2 and (',' in val or len(val) >= 3)):
-            monetary_values.append(val)
+    cache_hits = sum(1 for page_num in pages_to_process if page_num in results)
+    if cache_hits:
+        logger.info(f"💾 Cache - {cache_hits}/{len(pages_to_process)} página(s) encontrada(s) no cache")
     
-    # Montar as transações processadas
-    processed_transactions = []
+    missing = [page_num for page_num in cache_keys if page_num not in results]
+    if missing and settings.TEXT_LAYER_ENABLED:
+        # Páginas geradas digitalmente: texto lido direto do PDF, sem OCR
+        text_layers = await read_text_layer(upload.path, [page_num + 1 for page_num in missing], "EXTRAÇÃO")
+        for page_num in missing:
+            layer_text = usable_text_layer(text_layers.get(page_num + 1))
+            if layer_text is not None:
+                cleaned_text = clean_text(layer_text)
+                store(page_num, {"text": cleaned_text, "confidence": 1.0, "words_count": len(cleaned_text.split())}, source=PAGE_SOURCE_TEXT_LAYER)
+        
+        text_layer_pages = len(missing) - len([page_num for page_num in missing if page_num not in results])
+        if text_layer_pages:
+            logger.info(f"📝 Camada de texto - {text_layer_pages}/{len(missing)} página(s) sem necessidade de OCR")
+        missing = [page_num for page_num in missing if page_num not in results]
     
-    for i, (date, description) in enumerate(transactions):
-        # Limpar a descrição
-        clean_desc = description.strip()
-        
-        # Associar com valor se disponível
-        if i < len(monetary_values):
-            value = monetary_values[i]
-            processed_transactions.append(f"{date} - {clean_desc} - R$ {value}")
+    if missing:
+        if mode == "native":
+            page_count = pdf_info.page_count if pdf_info else None
+            
+            async def process_chunk(chunk: List[int]):
+                pdf_content, page_numbers = await engine.run(native_chunk_content, upload, chunk, page_count)
+                with track_pages(len(chunk)):
+                    chunk_results = await extract_pages_native(pdf_content, page_numbers)
+                if stats is not None:
+                    stats.add(len(pdf_content), 0.0)
+                fresh = {}
+                for page_num, page_result in zip(chunk, chunk_results):
+                    store(page_num, page_result, fresh=fresh)
+                await engine.run(cache.set_many, fresh)
+            
+            # Cada bloco envia um PDF só com as suas páginas e reserva a vaga com a sua parte do documento
+            chunk_size = get_ocr_backend().max_pages_per_pdf_request
+            await gather_admitted(
+                chunk_pages(missing, chunk_size),
+                lambda chunk: upload.size * len(chunk) // (page_count or len(missing)),
+                process_chunk
+            )
         else:
-            processed_transactions.append(f"{date} - {clean_desc} - Valor: N/A")
+            async def process_rendered(page: RenderedPage, fresh: Dict[str, dict]):
+                try:
+                    if page.error:
+                        raise HTTPException(status_code=400, detail=f"Erro ao converter PDF (página {page.page_number}): {page.error}")
+                    content = await engine.run(page.read)
+                finally:
+                    page.discard()
+                store(page.page_number - 1, await process_single_page(content, page.page_number), fresh=fresh)
+            
+            async def process_chunk(chunk: List[int]):
+                pages = await render_pages(upload.path, chunk, PDF_TO_IMAGES_DPI, encoding, stats)
+                # Aguardar todas as páginas do bloco (mesmo com erro) para não deixar arquivos para trás
+                fresh = {}
+                results = await asyncio.gather(*(process_rendered(page, fresh) for page in pages), return_exceptions=True)
+                await engine.run(cache.set_many, fresh)
+                for result in results:
+                    if isinstance(result, BaseException):
+                        raise result
+            
+            # Só as páginas fora do cache são rasterizadas, em blocos no pool de renderização;
+            # cada bloco reserva as suas páginas e a memória das imagens antes de renderizar
+            await gather_admitted(
+                get_render_pool().chunks([page_num + 1 for page_num in missing]),
+                lambda chunk: sum(estimate_page_bytes(pdf_info, page_num, PDF_TO_IMAGES_DPI) for page_num in chunk),
+                process_chunk
+            )
+    
+    return [
+        {"page_number": page_num + 1, **results[page_num], "source": sources[page_num]}
+        for page_num in pages_to_process
+    ], cache_hits
+
+async def process_single_page(content: bytes, page_num: int) -> dict:
+    """
+    Processa uma página completa (sem recorte), já codificada pelo pool de
+    renderização, e retorna os dados da página. O OCR entra em lote na Vision API.
+    """
+    page_start = datetime.datetime.now()
+    with track_pages():
+        page_result = await extract_text_from_content_async(content)
+    page_elapsed = (datetime.datetime.now() - page_start).total_seconds()
+    observe_page(page_elapsed)
     
-    # Se sobraram valores, mostrar separadamente
-    if len(monetary_values) > len(transactions):
-        remaining_values = monetary_values[len(transactions):]
-        processed_transactions.append(f"Valores extras: {', '.join(remaining_values)}")
+    logger.info(f"  ✅ Página {page_num} processada - {page_result['words_count']} palavras em {page_elapsed:.2f}s")
     
-    return ' | '.join(processed_transactions) if processed_transactions else raw_text
+    return {
+        "page_number": page_num,
+        "text": page_result["text"],
+        "confidence": page_result["confidence"],
+        "words_count": page_result["words_count"],
+        "layout": page_result["layout"]
+    }
 
-def process_single_agibank_page(image: Image.Image, page_num: int) -> tuple:
+async def process_single_region_page(
+    content: bytes,
+    page_num: int,
+    template: LayoutTemplate,
+    cache_key: Optional[str] = None,
+    fresh: Optional[Dict[str, dict]] = None
+) -> tuple:
     """
-    Processa uma única página Agibank e retorna o texto extraído.
-    Retorna: (page_num, texto_extraido, tempo_processamento, erro)
+    Processa uma única página de um template a partir da região das áreas
+    (`template.bounds`) já renderizada e codificada.
+    O OCR entra em lote na Vision API junto com as demais páginas; as caixas
+    das palavras são convertidas para frações da página, e o texto de cada área
+    sai delas (`region_texts`).
+    O resultado da página entra em `fresh` (chave `cache_key`), gravado no cache pelo chamador.
+    Retorna: (page_num, texto de cada área, tempo_processamento, erro)
     """
+    start_time = datetime.datetime.now()
     try:
-        start_time = datetime.datetime.now()
-        
-        # Recortar área específica do demonstrativo
-        cropped_image = crop_agibank_demonstrativo_area(image)
+        # Extrair texto da região das áreas
+        with track_pages():
+            result = await extract_text_from_content_async(content)
+        if result["layout"] is not None:
+            result["layout"] = PageLayout.from_dict(result["layout"]).to_page(template.bounds).to_dict()
         
-        # Extrair texto da área recortada
-        result = extract_text_from_image(cropped_image)
+        # Guardar no cache apenas resultados sem erro (com o layout, serve qualquer área)
+        if cache_key and fresh is not None:
+            fresh[cache_key] = result
         
-        # Processar o texto para associar títulos com valores
-        processed_text = process_agibank_demonstrativo_text(result["text"])
-        
-        # Liberar recursos
-        if hasattr(cropped_image, 'close'):
-            cropped_image.close()
+        # Filtrar as palavras de cada área e processar o texto
+        texts = region_texts(result["layout"], template)
         
         process_time = (datetime.datetime.now() - start_time).total_seconds()
+        observe_page(process_time)
         
-        return (page_num, processed_text, process_time, None)
+        return (page_num, texts, process_time, None)
         
     except Exception as e:
-        import traceback
-        error_details = traceback.format_exc()
-        logger.error(f"❌ AGIBANK - Erro na página {page_num}: {str(e)}")
+        # HTTPException não tem mensagem em str(e): usar o detalhe, para a falha não passar como página vazia
+        error = getattr(e, "detail", None) or str(e) or type(e).__name__
+        logger.error(f"❌ {template.label} - Erro na página {page_num}: {error}")
         process_time = (datetime.datetime.now() - start_time).total_seconds()
-        return (page_num, "", process_time, str(e))
+        observe_page(process_time, error=True)
+        return (page_num, empty_regions(template), process_time, error)
 
-def extract_text_from_agibank_demonstrativo(image: Image.Image) -> str:
-    """Extrai texto apenas da área do demonstrativo da fatura Agibank"""
-    try:
-        # Recortar área específica do demonstrativo
-        cropped_image = crop_agibank_demonstrativo_area(image)
-        
-        # Extrair texto da área recortada
-        result = extract_text_from_image(cropped_image)
-        
-        # Processar o texto para associar títulos com valores
-        processed_text = process_agibank_demonstrativo_text(result["text"])
-        
-        return processed_text
+def empty_regions(template: LayoutTemplate) -> Dict[str, str]:
+    """Texto vazio em todas as áreas (página com falha)"""
+    return {name: "" for name in template.region_names}
+
+def joined_regions(texts: Dict[str, str]) -> str:
+    """Texto das áreas de uma página numa única string (registros de streaming e jobs)"""
+    return "\n\n".join(text for text in texts.values() if text)
+
+async def extract_template_pages(
+    upload: SpooledUpload,
+    pdf_info: PdfInfo,
+    pages_to_process: List[int],
+    template: LayoutTemplate,
+    debug_save=None,
+    on_page_done: Optional[PageCallback] = None,
+    encoding: EncodingPreset = ENCODING_PRESETS["png"],
+    stats: Optional[EncodingStats] = None
+) -> Tuple[List[Dict[str, str]], List[str], int, float, List[int]]:
+    """
+    Extrai o texto das áreas do template nas páginas (índices base 0) de um documento
+    
+    Uma página que já passou pelo OCR inteira em /extract-text (com a mesma
+    codificação) é atendida pelo cache, sem nova chamada. Nas demais, só a
+    região que contém as áreas (`template.bounds`) é renderizada e vai para o
+    OCR. O texto de cada área sai do layout (caixas das palavras) do resultado. Páginas com camada de texto utilizável em todas as áreas têm o
+    texto lido direto do PDF, sem OCR. As demais são renderizadas e
+    codificadas no pool de renderização, em blocos de páginas consecutivas, e
+    seguem para o OCR enquanto os próximos blocos são renderizados. O texto de
+    cada área passa pelo pós-processador do template.
+    `on_page_done` é chamado assim que cada página fica pronta, na ordem de conclusão.
+    
+    Returns:
+        (texto de cada área, por página, na ordem de `pages_to_process`, origem de cada página,
+        páginas atendidas pelo cache, tempo total de processamento das páginas,
+        páginas (base 1) que falharam e voltam com as áreas vazias)
+    """
+    label = template.label
+    total_pages = pdf_info.page_count
+    pages = []
+    sources = []
+    failed_pages = []
+    page_sources = {}
+    total_processing_time = 0
+    
+    engine = get_ocr_engine()
+    cache = get_ocr_cache()
+    doc_hash = upload.sha256
+    page_results = {}
+    cache_keys = {}
+    
+    def report(page_num: int, texts: Dict[str, str], error: Optional[str] = None):
+        if on_page_done:
+            on_page_done(page_num, {
+                "page_number": page_num,
+                "text": joined_regions(texts),
+                "regions": texts,
+                "error": error,
+                "source": page_sources[page_num]
+            })
+    
+    # Consultar o cache antes de renderizar (entradas antigas, sem layout, voltam ao OCR), numa
+    # única consulta fora do event loop: a página inteira já processada por /extract-text (mesma
+    # codificação) serve todas as áreas; senão, a região deste template
+    page_keys = {}
+    for page_index in pages_to_process:
+        page_keys[page_index + 1] = page_cache_key(doc_hash, page_index + 1, "raster", encoding)
+        cache_keys[page_index + 1] = page_cache_key(doc_hash, page_index + 1, "raster", encoding, template.dpi, template.bounds)
+    cached_pages = await engine.run(cache.get_many, [*page_keys.values(), *cache_keys.values()])
+    for page_num, cache_key in cache_keys.items():
+        cached = cached_pages.get(page_keys[page_num])
+        if cached is None or cached.get("layout") is None:
+            cached = cached_pages.get(cache_key)
+        if cached is not None and cached.get("layout") is not None and page_num not in page_results:
+            logger.info(f"💾 {label} - Página {page_num} encontrada no cache")
+            texts = region_texts(cached["layout"], template)
+            page_results[page_num] = (page_num, texts, 0.0, None)
+            page_sources[page_num] = PAGE_SOURCE_CACHE
+            report(page_num, texts)
+    
+    cache_hits = len(page_results)
+    pages_to_render = [page_num for page_num in cache_keys if page_num not in page_results]
+    
+    # Páginas geradas digitalmente: texto das áreas lido direto do PDF, sem OCR
+    text_layers = await read_text_layer(upload.path, pages_to_render, label)
+    for page_num in pages_to_render:
+        layer = text_layers.get(page_num)
+        layer_texts = {name: usable_text_layer(layer, box) for name, box in template.regions}
+        if all(text is not None for text in layer_texts.values()):
+            texts = {name: template.postprocess(clean_text(text)) for name, text in layer_texts.items()}
+            page_results[page_num] = (page_num, texts, 0.0, None)
+            page_sources[page_num] = PAGE_SOURCE_TEXT_LAYER
+            report(page_num, texts)
+    
+    text_layer_pages = len(pages_to_render) - len([page_num for page_num in pages_to_render if page_num not in page_results])
+    if text_layer_pages:
+        logger.info(f"📝 {label} - {text_layer_pages} página(s) com camada de texto, sem OCR")
+    pages_to_render = [page_num for page_num in pages_to_render if page_num not in page_results]
+    for page_num in pages_to_render:
+        page_sources[page_num] = PAGE_SOURCE_OCR
+    
+    async def process_rendered(page: RenderedPage, fresh: Dict[str, dict]) -> tuple:
+        if page.error:
+            page.discard()
+            logger.error(f"❌ {label} - Não foi possível carregar página {page.page_number}: {page.error}")
+            record_page_error()
+            report(page.page_number, empty_regions(template), page.error)
+            return (page.page_number, empty_regions(template), 0.0, page.error)
+        
+        logger.info(f"{template.icon} {label} - Processando página {page.page_number}/{total_pages}...")
+        try:
+            content = await engine.run(page.read)
+        finally:
+            page.discard()
+        page_result = await process_single_region_page(content, page.page_number, template, cache_keys[page.page_number], fresh)
+        report(page.page_number, page_result[1], page_result[3])
+        return page_result
+    
+    async def render_and_process(chunk: List[int]) -> List[tuple]:
+        try:
+            rendered = await render_pages(
+                upload.path, chunk, template.dpi, encoding, stats, debug_save,
+                box=template.bounds, page_sizes=page_sizes(pdf_info, chunk)
+            )
+            # OCR em lote: as páginas seguem para a Vision API enquanto os próximos blocos são renderizados
+            fresh = {}
+            page_results = await asyncio.gather(*(process_rendered(page, fresh) for page in rendered))
+            # Uma gravação no cache por bloco, fora do event loop
+            await engine.run(cache.set_many, fresh)
+            return page_results
+        except Exception as e:
+            # As páginas do bloco voltam como falhas; os demais blocos continuam
+            logger.error(f"❌ {label} - Erro inesperado na renderização: {str(e)}")
+            return []
+    
+    # Renderizar (só a região das áreas) e codificar as páginas no pool de renderização, em blocos
+    # de páginas consecutivas (um processo do Poppler por bloco), direto do arquivo do upload; cada
+    # bloco reserva as suas páginas (e a memória das imagens) antes de renderizar e a vaga volta após o OCR
+    chunk_results = await gather_admitted(
+        get_render_pool().chunks(pages_to_render),
+        lambda chunk: sum(estimate_page_bytes(pdf_info, page_num, template.dpi, template.bounds) for page_num in chunk),
+        render_and_process
+    )
+    for results in chunk_results:
+        for page_result in results:
+            page_results[page_result[0]] = page_result
+    
+    # Aguardar o OCR de todas as páginas, mantendo a ordem
+    for page_index in pages_to_process:
+        sources.append(page_sources.get(page_index + 1, PAGE_SOURCE_OCR))
+        page_result = page_results.get(page_index + 1)
+        if page_result is None:
+            # Página não renderizada
+            failed_pages.append(page_index + 1)
+            pages.append(empty_regions(template))
+            continue
+        
+        page_num, texts, process_time, error = page_result
+        
+        if error:
+            logger.error(f"❌ {label} - Página {page_num} teve erro: {error}")
+            failed_pages.append(page_num)
+            pages.append(empty_regions(template))
+        else:
+            logger.info(f"✅ {label} - Página {page_num} processada em {process_time:.2f}s")
+            pages.append(texts)
         
-    except Exception as e:
-        print(f"DEBUG: Erro na extração Agibank: {str(e)}")
-        return ""
+        total_processing_time += process_time
+    
+    if failed_pages:
+        logger.warning(f"⚠️ {label} - {len(failed_pages)} página(s) com falha: {failed_pages}")
+    return pages, sources, cache_hits, total_processing_time, failed_pages
+
+@tracked("extract-text")
+@resilient
+async def run_extract_text(
+    upload: SpooledUpload,
+    extract_pages: Optional[str] = None,
+    ocr_mode: Optional[str] = None,
+    encoding: Optional[str] = None,
+    pdf_info: Optional[PdfInfo] = None,
+    on_page_done: Optional[PageCallback] = None
+) -> TextExtractionResponse:
+    """Extração de texto de páginas completas (usada por /extract-text e pelos jobs)"""
+    start_time = datetime.datetime.now()
+    mode = resolve_ocr_mode(ocr_mode)
+    preset = resolve_encoding(encoding, settings.VISION_ENCODING_TEXT)
+    stats = EncodingStats()
+    
+    # Inspecionar o PDF sem rasterizar (a conversão só ocorre se houver páginas fora do cache)
+    if mode == "native":
+        logger.info(f"📄 Modo nativo: PDF enviado diretamente à Vision API")
+    if pdf_info is None:
+        pdf_info = await get_ocr_engine().run(inspect_document, upload.path)
+    total_pages = pdf_info.page_count
+    logger.info(f"✅ PDF analisado: {total_pages} página(s)")
+    
+    # Determinar quais páginas processar
+    pages_to_process = select_pages(extract_pages, total_pages)
+    if extract_pages and extract_pages.lower() != "all":
+        logger.info(f"🎯 Páginas específicas selecionadas: {[p+1 for p in pages_to_process]}")
+    else:
+        logger.info(f"📄 Processando todas as páginas: {total_pages}")
+    
+    # Extrair texto das páginas em paralelo (resultado na ordem das páginas)
+    logger.info(f"🔍 Iniciando extração OCR de {len(pages_to_process)} página(s) em paralelo...")
+    extracted_pages, cache_hits = await extract_full_pages(
+        upload, pages_to_process, mode, on_page_done, encoding=preset, stats=stats, pdf_info=pdf_info
+    )
+    
+    total_elapsed = (datetime.datetime.now() - start_time).total_seconds()
+    total_words = sum(page["words_count"] for page in extracted_pages)
+    
+    logger.info(f"🎉 EXTRAÇÃO CONCLUÍDA - {len(pages_to_process)} páginas ({cache_hits} do cache), {total_words} palavras em {total_elapsed:.2f}s")
+    record_extraction([page["source"] for page in extracted_pages], cache_hits, stats.bytes)
+    calls = current_call_stats()
+    if calls.retries or calls.hedges:
+        logger.info(f"🔁 OCR - {calls.retries} retentativa(s), {calls.hedges} chamada(s) duplicada(s)")
+    logger.info(f"📤 Upload: {stats.bytes} bytes em {stats.images} envio(s), codificação {preset.key if mode == 'raster' else 'pdf'} em {stats.seconds:.2f}s")
+    
+    return TextExtractionResponse(
+        pages=extracted_pages,
+        total_pages=len(pages_to_process),
+        success=True,
+        message=f"Texto extraído com sucesso de {len(pages_to_process)} página(s)",
+        cache_hits=cache_hits,
+        encoding=preset.key if mode == "raster" else None,
+        upload_bytes=stats.bytes,
+        encode_time=round(stats.seconds, 3),
+        ocr_retries=calls.retries,
+        ocr_hedges=calls.hedges
+    )
+
+@tracked("extract-text-simple")
+@resilient
+async def run_extract_text_simple(
+    upload: SpooledUpload,
+    extract_pages: Optional[str] = None,
+    ocr_mode: Optional[str] = None,
+    encoding: Optional[str] = None,
+    pdf_info: Optional[PdfInfo] = None,
+    on_page_done: Optional[PageCallback] = None
+) -> SimpleTextResponse:
+    """Extração de texto limpo por página (usada por /extract-text-simple e pelos jobs)"""
+    mode = resolve_ocr_mode(ocr_mode)
+    preset = resolve_encoding(encoding, settings.VISION_ENCODING_TEXT)
+    stats = EncodingStats()
+    
+    # Inspecionar o PDF sem rasterizar (a conversão só ocorre se houver páginas fora do cache)
+    if pdf_info is None:
+        pdf_info = await get_ocr_engine().run(inspect_document, upload.path)
+    
+    # Determinar quais páginas processar
+    pages_to_process = select_pages(extract_pages, pdf_info.page_count)
+    
+    # Extrair texto limpo das páginas em paralelo (resultado na ordem das páginas)
+    page_results, cache_hits = await extract_full_pages(
+        upload, pages_to_process, mode, on_page_done, encoding=preset, stats=stats, pdf_info=pdf_info
+    )
+    
+    # Adicionar apenas o texto limpo
+    clean_pages = [page_result["text"] or "" for page_result in page_results]
+    record_extraction([page_result["source"] for page_result in page_results], cache_hits, stats.bytes)
+    calls = current_call_stats()
+    
+    return SimpleTextResponse(
+        pages=clean_pages,
+        page_sources=[page_result["source"] for page_result in page_results],
+        total_pages=len(clean_pages),
+        success=True,
+        cache_hits=cache_hits,
+        encoding=preset.key if mode == "raster" else None,
+        upload_bytes=stats.bytes,
+        encode_time=round(stats.seconds, 3),
+        ocr_retries=calls.retries,
+        ocr_hedges=calls.hedges
+    )
 
-def process_bmg_transacoes_text(raw_text: str) -> str:
+# Codificação da faixa do cabeçalho na sondagem da detecção automática
+DETECT_PROBE_ENCODING = ENCODING_PRESETS["gray"]
+
+async def detect_template(upload: SpooledUpload, pdf_info: PdfInfo, page_number: int) -> Detection:
     """
-    Retorna o texto PURO extraído pelo Vision API - sem organização
+    Identifica o template do documento pela página `page_number` (base 1), do sinal mais barato ao mais caro
     
-    Apenas limpa quebras de linha e espaços extras, mantendo a ordem original do Vision
+    1. documento já identificado antes (cache pelo hash do PDF);
+    2. palavras-chave na camada de texto da faixa do cabeçalho;
+    3. miniatura parecida com a de documentos já identificados;
+    4. OCR da faixa do cabeçalho renderizada em DETECT_PROBE_DPI.
+    Só a última etapa chama o OCR, com uma imagem pequena. Sem
+    identificação, responde 422.
     """
-    if not raw_text:
-        return ""
+    detector = get_template_detector()
+    if not detector.enabled:
+        raise HTTPException(status_code=422, detail="Nenhum template com 'match.keywords' para a detecção automática")
+    
+    start = datetime.datetime.now()
+    cache = get_ocr_cache()
+    cache_key = cache.make_key(upload.sha256, page_number, mode="detect")
+    detection = None
+    
+    cached = await get_ocr_engine().run(cache.get, cache_key)
+    if cached is not None and detector.get(cached.get("template")):
+        detection = Detection(detector.get(cached["template"]), DETECT_CACHE)
+    
+    if detection is None:
+        layers = await read_text_layer(upload.path, [page_number], "DETECÇÃO")
+        layer = layers.get(page_number)
+        if layer is not None:
+            with timed("detect"):
+                template = detector.match_text(layer.text(detector.header_box))
+            if template is not None:
+                detection = Detection(template, DETECT_TEXT_LAYER)
+    
+    if detection is None:
+        dpi = settings.DETECT_PROBE_DPI
+        async with admitted(1, estimate_page_bytes(pdf_info, page_number, dpi)):
+            try:
+                with timed("detect"):
+                    fingerprint, header = await get_ocr_engine().run(probe_page, upload.path, page_number, dpi, detector.header_box)
+            except PdfRenderError as e:
+                raise HTTPException(status_code=400, detail=f"Não foi possível renderizar a página {page_number}: {str(e)}")
+            try:
+                template = detector.match_fingerprint(fingerprint)
+                if template is not None:
+                    detection = Detection(template, DETECT_THUMBNAIL, fingerprint=fingerprint)
+                else:
+                    content = await get_ocr_engine().run(encode_image_for_vision, header, DETECT_PROBE_ENCODING)
+                    probe = await extract_text_from_content_async(content)
+                    with timed("detect"):
+                        template = detector.match_text(probe["text"])
+                    if template is not None:
+                        detection = Detection(template, DETECT_OCR_PROBE, fingerprint=fingerprint)
+            finally:
+                header.close()
+    
+    if detection is None:
+        logger.warning(f"🔎 DETECÇÃO - Nenhum template reconhecido na página {page_number}")
+        raise HTTPException(
+            status_code=422,
+            detail=f"Tipo de documento não reconhecido. Use /extract-region/{{template}} com um destes templates: {', '.join(get_template_registry().names())}"
+        )
     
-    # Usar apenas a função clean_text que já existe
-    return clean_text(raw_text)
+    detection.seconds = (datetime.datetime.now() - start).total_seconds()
+    if detection.method != DETECT_CACHE:
+        await get_ocr_engine().run(cache.set, cache_key, {"template": detection.template.name})
+    detector.learn(detection.fingerprint, detection.template)
+    detector.record(detection)
+    logger.info(f"🔎 DETECÇÃO - {detection.template.icon} {detection.template.label} ({detection.method}) em {detection.seconds:.2f}s")
+    return detection
 
-def process_single_bmg_page(image: Image.Image, page_num: int) -> tuple:
+async def extract_region(
+    upload: SpooledUpload,
+    template: LayoutTemplate,
+    extract_pages: Optional[str] = None,
+    encoding: Optional[str] = None,
+    pdf_info: Optional[PdfInfo] = None,
+    on_page_done: Optional[PageCallback] = None
+) -> RegionExtractionResponse:
+    """Extração das áreas de um template (núcleo de /extract-region, /extract-text-agibank, /extract-text-bmg e dos jobs)"""
+    label = template.label
+    start_time = datetime.datetime.now()
+    preset = resolve_encoding(encoding, template_encoding(template))
+    stats = EncodingStats()
+    
+    # Descobrir número total de páginas pela estrutura do PDF, sem rasterizar
+    logger.info(f"{template.icon} {label} - Analisando PDF...")
+    if pdf_info is None:
+        pdf_info = await get_ocr_engine().run(inspect_document, upload.path)
+    total_pages = pdf_info.page_count
+    
+    logger.info(f"{template.icon} {label} - PDF contém {total_pages} página(s)")
+    
+    # Determinar quais páginas processar
+    pages_to_process = select_pages(extract_pages, total_pages)
+    logger.info(f"{template.icon} {label} - Processando {len(pages_to_process)} página(s), áreas: {', '.join(template.region_names)}")
+    
+    pages, page_sources, cache_hits, total_processing_time, failed_pages = await extract_template_pages(
+        upload, pdf_info, pages_to_process, template,
+        debug_save=get_debug_artifacts().saver(template.name),
+        on_page_done=on_page_done,
+        encoding=preset,
+        stats=stats
+    )
+    
+    # Calcular tempo total
+    total_elapsed = (datetime.datetime.now() - start_time).total_seconds()
+    pages_processed = len([texts for texts in pages if any(text.strip() for text in texts.values())])  # Páginas com conteúdo
+    
+    logger.info(f"🎉 {label} - CONCLUÍDO: {pages_processed}/{len(pages)} páginas em {total_elapsed:.2f}s (tempo processamento: {total_processing_time:.2f}s, {cache_hits} do cache)")
+    logger.info(f"📤 {label} - Upload: {stats.bytes} bytes em {stats.images} imagem(ns), codificação {preset.key} em {stats.seconds:.2f}s")
+    record_extraction(page_sources, cache_hits, stats.bytes)
+    calls = current_call_stats()
+    if calls.retries or calls.hedges:
+        logger.info(f"🔁 OCR - {calls.retries} retentativa(s), {calls.hedges} chamada(s) duplicada(s)")
+    
+    return RegionExtractionResponse(
+        template=template.name,
+        regions=template.region_names,
+        pages=pages,
+        page_sources=page_sources,
+        total_pages=len(pages),
+        success=True,
+        message=f"{template.title} extraída de {pages_processed}/{len(pages)} página(s) em {total_elapsed:.1f}s" + (f"; falha nas páginas {failed_pages}" if failed_pages else ""),
+        cache_hits=cache_hits,
+        encoding=preset.key,
+        upload_bytes=stats.bytes,
+        encode_time=round(stats.seconds, 3),
+        failed_pages=failed_pages,
+        ocr_retries=calls.retries,
+        ocr_hedges=calls.hedges
+    )
+
+@resilient
+async def run_extract_region(
+    upload: SpooledUpload,
+    template: str,
+    extract_pages: Optional[str] = None,
+    encoding: Optional[str] = None,
+    pdf_info: Optional[PdfInfo] = None,
+    on_page_done: Optional[PageCallback] = None
+) -> RegionExtractionResponse:
+    """Extração das áreas de um template pelo nome (usada por /extract-region e pelos jobs)"""
+    layout_template = resolve_template(template)
+    with track_request("extract-region", layout_template.name):
+        return await extract_region(upload, layout_template, extract_pages, encoding, pdf_info, on_page_done)
+
+@resilient
+async def run_extract_auto(
+    upload: SpooledUpload,
+    extract_pages: Optional[str] = None,
+    encoding: Optional[str] = None,
+    pdf_info: Optional[PdfInfo] = None,
+    on_page_done: Optional[PageCallback] = None
+) -> AutoExtractionResponse:
     """
-    Processa uma única página BMG e retorna o texto extraído.
-    Retorna: (page_num, texto_extraido, tempo_processamento, erro)
+    Extração com o template detectado automaticamente (usada por /extract-auto e pelos jobs)
+    
+    A detecção usa a primeira página selecionada; a passagem em resolução
+    completa acontece uma única vez, já com o template certo.
     """
+    if pdf_info is None:
+        pdf_info = await get_ocr_engine().run(inspect_document, upload.path)
+    pages_to_process = select_pages(extract_pages, pdf_info.page_count)
+    if not pages_to_process:
+        raise HTTPException(status_code=400, detail="Nenhuma página válida para extrair")
+    
+    with labeled("extract-auto"):
+        detection = await detect_template(upload, pdf_info, pages_to_process[0] + 1)
+    template = detection.template
+    with track_request("extract-auto", template.name):
+        response = await extract_region(upload, template, extract_pages, encoding, pdf_info, on_page_done)
+    return AutoExtractionResponse(
+        template=response.template,
+        regions=response.regions,
+        pages=response.pages,
+        detected_by=detection.method,
+        detection_time=round(detection.seconds, 3),
+        **single_region_fields(response)
+    )
+
+def single_region_fields(response: RegionExtractionResponse) -> dict:
+    """Campos da resposta de uma única área (formato de /extract-text-agibank e /extract-text-bmg), sem a lista de páginas"""
+    return {
+        "page_sources": response.page_sources,
+        "total_pages": response.total_pages,
+        "success": response.success,
+        "message": response.message,
+        "cache_hits": response.cache_hits,
+        "encoding": response.encoding,
+        "upload_bytes": response.upload_bytes,
+        "encode_time": response.encode_time,
+        "failed_pages": response.failed_pages,
+        "ocr_retries": response.ocr_retries,
+        "ocr_hedges": response.ocr_hedges
+    }
+
+def region_pages(response: RegionExtractionResponse, region: str) -> List[str]:
+    """Texto de uma única área em cada página da resposta"""
+    return [texts.get(region, "") for texts in response.pages]
+
+@tracked("extract-text-agibank", "agibank")
+@resilient
+async def run_extract_agibank(
+    upload: SpooledUpload,
+    extract_pages: Optional[str] = None,
+    encoding: Optional[str] = None,
+    pdf_info: Optional[PdfInfo] = None,
+    on_page_done: Optional[PageCallback] = None
+) -> AgibankResponse:
+    """Extração da área do demonstrativo Agibank (usada por /extract-text-agibank e pelos jobs)"""
+    response = await extract_region(upload, resolve_template("agibank"), extract_pages, encoding, pdf_info, on_page_done)
+    return AgibankResponse(
+        demonstrativo_pages=region_pages(response, "demonstrativo"),
+        **single_region_fields(response)
+    )
+
+@tracked("extract-text-bmg", "bmg")
+@resilient
+async def run_extract_bmg(
+    upload: SpooledUpload,
+    extract_pages: Optional[str] = None,
+    encoding: Optional[str] = None,
+    pdf_info: Optional[PdfInfo] = None,
+    on_page_done: Optional[PageCallback] = None
+) -> BmgResponse:
+    """Extração da área das transações BMG (usada por /extract-text-bmg e pelos jobs)"""
+    response = await extract_region(upload, resolve_template("bmg"), extract_pages, encoding, pdf_info, on_page_done)
+    return BmgResponse(
+        transacoes_pages=region_pages(response, "transacoes"),
+        **single_region_fields(response)
+    )
+
+# Modos aceitos por POST /jobs e a extração correspondente
+JOB_MODES = {
+    "text": run_extract_text,
+    "simple": run_extract_text_simple,
+    "agibank": run_extract_agibank,
+    "bmg": run_extract_bmg,
+    "region": run_extract_region,
+    "auto": run_extract_auto
+}
+
+async def run_job(job: Job, progress: JobProgress) -> dict:
+    """Executa um job da fila com a mesma extração do endpoint síncrono correspondente"""
+    engine = get_ocr_engine()
+    upload = await engine.run(SpooledUpload.from_path, job.file_path, job.filename)
+    pdf_info = await engine.run(inspect_document, upload.path)
+    with without_page_limit():
+        await progress.start(len(select_pages(job.params.get("extract_pages"), pdf_info.page_count)))
+    
+    def on_page_done(page_number: int, record: dict):
+        progress.page_done(page_number, ok=not record.get("error"))
+    
+    kwargs = {
+        "extract_pages": job.params.get("extract_pages"),
+        "encoding": job.params.get("encoding"),
+        "pdf_info": pdf_info,
+        "on_page_done": on_page_done
+    }
+    if job.mode in ("text", "simple"):
+        kwargs["ocr_mode"] = job.params.get("ocr_mode")
+    if job.mode == "region":
+        kwargs["template"] = job.params.get("template")
+    
+    # Jobs esperam por vaga no controle de admissão em vez de serem recusados,
+    # e não têm prazo total (só o prazo de cada página) nem limite de páginas
+    with patient(), without_request_deadline(), without_page_limit():
+        response = await JOB_MODES[job.mode](upload, **kwargs)
+    return jsonable_encoder(response)
+
+# Formatos de streaming dos endpoints /stream
+STREAM_FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "sse": "text/event-stream"
+}
+
+def resolve_stream_format(stream_format: Optional[str]) -> str:
+    """Valida o formato de streaming solicitado (padrão: ndjson)"""
+    fmt = (stream_format or "ndjson").strip().lower()
+    if fmt not in STREAM_FORMATS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Formato de streaming inválido: '{fmt}'. Use: {', '.join(STREAM_FORMATS)}"
+        )
+    return fmt
+
+def format_stream_record(record: dict, fmt: str) -> str:
+    """Serializa um registro como linha NDJSON ou evento SSE"""
+    data = json.dumps(record, ensure_ascii=False)
+    if fmt == "sse":
+        return f"event: {record['type']}\ndata: {data}\n\n"
+    return data + "\n"
+
+async def stream_extraction(run, upload: SpooledUpload, fmt: str, label: str, **kwargs) -> AsyncIterator[str]:
+    """
+    Executa a extração `run` e entrega o resultado de cada página assim que fica pronto
+    
+    Cada página gera um registro {"type": "page", ...}, na ordem de conclusão.
+    No final vem um registro {"type": "summary", ...} com os totais da resposta
+    síncrona (sem repetir os textos) ou {"type": "error", ...} em caso de falha.
+    Se o cliente desconectar, a extração é cancelada. O arquivo do upload é
+    removido quando a extração termina, inclusive se ela for cancelada antes
+    de começar ou se o streaming for encerrado antes da primeira leitura.
+    """
+    queue: asyncio.Queue = asyncio.Queue()
+    
+    def on_page_done(page_number: int, record: dict):
+        queue.put_nowait({"type": "page", **record})
+    
+    async def run_pipeline():
+        try:
+            response = jsonable_encoder(await run(upload, on_page_done=on_page_done, **kwargs))
+            summary = {key: value for key, value in response.items() if not isinstance(value, list)}
+            queue.put_nowait({"type": "summary", **summary})
+        except Exception as e:
+            detail = e.detail if isinstance(e, HTTPException) else f"Erro interno do servidor: {str(e)}"
+            logger.error(f"❌ {label} - Erro no streaming: {detail}")
+            queue.put_nowait({"type": "error", "success": False, "detail": detail})
+    
+    task: Optional[asyncio.Task] = None
     try:
-        start_time = datetime.datetime.now()
-        
-        # Recortar área específica das transações
-        cropped_image = crop_bmg_transacoes_area(image)
-        
-        # Extrair texto da área recortada
-        result = extract_text_from_image(cropped_image)
-        
-        # Processar o texto para organizar as transações
-        processed_text = process_bmg_transacoes_text(result["text"])
-        
-        # Liberar recursos
-        if hasattr(cropped_image, 'close'):
-            cropped_image.close()
-        
-        process_time = (datetime.datetime.now() - start_time).total_seconds()
-        
-        return (page_num, processed_text, process_time, None)
-        
-    except Exception as e:
-        import traceback
-        error_details = traceback.format_exc()
-        logger.error(f"❌ BMG - Erro na página {page_num}: {str(e)}")
-        process_time = (datetime.datetime.now() - start_time).total_seconds()
-        return (page_num, "", process_time, str(e))
+        task = asyncio.create_task(run_pipeline())
+        while True:
+            record = await queue.get()
+            yield format_stream_record(record, fmt)
+            if record["type"] != "page":
+                break
+    finally:
+        if task is None or task.done():
+            upload.remove()
+        else:
+            logger.warning(f"⚠️ {label} - Cliente desconectou, cancelando a extração")
+            # Remover só quando a extração parar de usar o arquivo (o callback roda mesmo
+            # se a tarefa for cancelada antes de começar)
+            task.add_done_callback(lambda _: upload.remove())
+            task.cancel()
 
-def extract_text_from_bmg_transacoes(image: Image.Image) -> str:
-    """Extrai texto apenas da área das transações da fatura BMG"""
+async def stream_response(
+    run,
+    file: UploadFile,
+    extract_pages: Optional[str],
+    stream_format: Optional[str],
+    label: str,
+    **kwargs
+) -> StreamingResponse:
+    """
+    Valida a requisição e inicia a resposta em streaming
+    
+    O PDF é inspecionado antes do início do streaming, para que arquivos
+    inválidos ainda recebam o código de erro HTTP apropriado.
+    """
+    # Validar tipo de arquivo
+    if not file.filename.lower().endswith('.pdf'):
+        raise HTTPException(
+            status_code=400,
+            detail="Apenas arquivos PDF são suportados"
+        )
+    
+    fmt = resolve_stream_format(stream_format)
+    upload = await spool_file(file)
+    
     try:
-        # Recortar área específica das transações
-        cropped_image = crop_bmg_transacoes_area(image)
-        
-        # Extrair texto da área recortada
-        result = extract_text_from_image(cropped_image)
-        
-        # Processar o texto para organizar as transações
-        processed_text = process_bmg_transacoes_text(result["text"])
-        
-        return processed_text
-        
+        pdf_info = await get_ocr_engine().run(inspect_document, upload.path)
+        select_pages(extract_pages, pdf_info.page_count)
+    except HTTPException:
+        upload.remove()
+        raise
     except Exception as e:
-        import traceback
-        error_details = traceback.format_exc()
-        logger.error(f"❌ BMG - Erro na extração: {str(e)}")
-        logger.error(f"❌ BMG - Traceback completo: {error_details}")
-        print(f"DEBUG: Erro na extração BMG: {str(e)}")
-        print(f"DEBUG: Traceback: {error_details}")
-        return ""
+        upload.remove()
+        raise HTTPException(
+            status_code=500,
+            detail=f"Erro interno do servidor: {str(e)}"
+        )
+    
+    logger.info(f"📡 {label} - Streaming ({fmt}) de {file.filename}")
+    return StreamingResponse(
+        stream_extraction(run, upload, fmt, label, extract_pages=extract_pages, pdf_info=pdf_info, **kwargs),
+        media_type=STREAM_FORMATS[fmt],
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        # Se a resposta terminar sem iterar o gerador, o `finally` dele não roda
+        background=BackgroundTask(upload.remove)
+    )
 
 @app.get("/")
 async def root():
@@ -473,12 +1856,26 @@ async def root():
             "extract_text_simple": "/extract-text-simple (RECOMENDADO - Texto limpo)",
             "extract_text_agibank": "/extract-text-agibank (ESPECÍFICO - Área demonstrativo)",
             "extract_text_bmg": "/extract-text-bmg (ESPECÍFICO - Área transações)",
+            "extract_region": "/extract-region/{template} (TEMPLATES - Áreas de um layout configurado, ver /templates)",
+            "extract_auto": "/extract-auto (AUTOMÁTICO - Detecta o template pelo cabeçalho)",
+            "templates": "/templates",
+            "extract_text_stream": "/extract-text/stream, /extract-text-agibank/stream, /extract-text-bmg/stream, /extract-region/{template}/stream, /extract-auto/stream (STREAMING - NDJSON ou SSE por página)",
             "extract_text_image": "/extract-text-image",
+            "jobs": "/jobs (ASSÍNCRONO - POST para enfileirar, GET /jobs/{job_id} para o status)",
             "health": "/health",
+            "metrics": "/metrics (Prometheus)",
             "docs": "/docs"
         }
     }
 
+@app.get("/metrics")
+async def metrics_endpoint():
+    """Métricas no formato do Prometheus (tempo por etapa, páginas, bytes enviados, cache, erros)"""
+    if not settings.METRICS_ENABLED:
+        raise HTTPException(status_code=404, detail="Métricas desativadas (METRICS_ENABLED)")
+    content, content_type = render_metrics()
+    return Response(content=content, media_type=content_type)
+
 @app.get("/health")
 async def health_check():
     """Endpoint de verificação de saúde"""
@@ -488,8 +1885,13 @@ async def health_check():
         # Este é um teste simples para verificar se o cliente está configurado
         return {
             "status": "healthy",
-            "google_vision": "connected",
-            "upload_dir": os.path.exists(UPLOAD_DIR)
+            "ocr_backend": settings.OCR_BACKEND,
+            "google_vision": "connected" if settings.OCR_BACKEND == "vision" else "disabled",
+            "upload_dir": os.path.exists(UPLOAD_DIR),
+            "admission": get_admission().snapshot(),
+            "ocr_resilience": get_ocr_resilience().snapshot(),
+            "rate_limit": await get_rate_limiter().snapshot(),
+            "template_detection": get_template_detector().snapshot()
         }
     except Exception as e:
         return JSONResponse(
@@ -503,7 +1905,9 @@ async def health_check():
 @app.post("/extract-text", response_model=TextExtractionResponse)
 async def extract_text_from_pdf(
     file: UploadFile = File(..., description="Arquivo PDF para extração de texto"),
-    extract_pages: Optional[str] = Form(None, description="Páginas específicas para extrair (ex: '1,3,5' ou 'all')")
+    extract_pages: Optional[str] = Form(None, description="Páginas específicas para extrair (ex: '1,3,5' ou 'all')"),
+    ocr_mode: Optional[str] = Form(None, description="Modo de OCR: 'raster' (renderização local) ou 'native' (PDF enviado direto à Vision API)"),
+    encoding: Optional[str] = Form(None, description="Codificação das imagens enviadas: png, gray, bilevel, jpeg ou jpeg-gray (ex: 'jpeg,quality=70,max_pixels=4000000')")
 ):
     """
     Extrai texto de um arquivo PDF usando Google Cloud Vision OCR
@@ -511,6 +1915,8 @@ async def extract_text_from_pdf(
     Args:
         file: Arquivo PDF a ser processado
         extract_pages: Páginas específicas para extrair (opcional, padrão: todas)
+        ocr_mode: Modo de OCR (opcional, padrão: OCR_DEFAULT_MODE)
+        encoding: Codificação das imagens enviadas à Vision API (opcional, padrão: VISION_ENCODING_TEXT)
     
     Returns:
         TextExtractionResponse com o texto extraído
@@ -527,71 +1933,17 @@ async def extract_text_from_pdf(
             detail="Apenas arquivos PDF são suportados"
         )
     
+    mode = resolve_ocr_mode(ocr_mode)
+    resolve_encoding(encoding, settings.VISION_ENCODING_TEXT)
+    
+    # Gravar o arquivo em disco (uma única vez, em blocos)
+    logger.info(f"📖 Gravando arquivo PDF...")
+    upload = await spool_file(file)
+    
     try:
-        # Ler conteúdo do arquivo
-        logger.info(f"📖 Lendo conteúdo do arquivo PDF...")
-        pdf_content = await file.read()
-        logger.info(f"✅ Arquivo lido com sucesso: {len(pdf_content)} bytes")
-        
-        # Converter PDF para imagens
-        logger.info(f"🖼️ Convertendo PDF para imagens...")
-        images = pdf_to_images(pdf_content)
-        total_pages = len(images)
-        logger.info(f"✅ PDF convertido: {total_pages} página(s)")
-        
-        # Determinar quais páginas processar
-        pages_to_process = list(range(total_pages))
-        if extract_pages and extract_pages.lower() != "all":
-            try:
-                specified_pages = [int(p.strip()) - 1 for p in extract_pages.split(",")]
-                pages_to_process = [p for p in specified_pages if 0 <= p < total_pages]
-                logger.info(f"🎯 Páginas específicas selecionadas: {[p+1 for p in pages_to_process]}")
-            except ValueError:
-                logger.error(f"❌ Formato inválido de páginas: {extract_pages}")
-                raise HTTPException(
-                    status_code=400,
-                    detail="Formato inválido para páginas. Use números separados por vírgula (ex: '1,3,5')"
-                )
-        else:
-            logger.info(f"📄 Processando todas as páginas: {total_pages}")
-        
-        # Extrair texto de cada página
-        extracted_pages = []
-        logger.info(f"🔍 Iniciando extração OCR...")
-        
-        for i, page_num in enumerate(pages_to_process):
-            page_start = datetime.datetime.now()
-            logger.info(f"  📃 Processando página {page_num + 1}/{total_pages}...")
-            
-            image = images[page_num]
-            page_result = extract_text_from_image(image)
-            
-            page_elapsed = (datetime.datetime.now() - page_start).total_seconds()
-            words_count = page_result["words_count"]
-            
-            page_data = {
-                "page_number": page_num + 1,
-                "text": page_result["text"],
-                "confidence": page_result["confidence"],
-                "words_count": words_count
-            }
-            
-            logger.info(f"  ✅ Página {page_num + 1} processada - {words_count} palavras em {page_elapsed:.2f}s")
-            extracted_pages.append(page_data)
-        
-        total_elapsed = (datetime.datetime.now() - start_time).total_seconds()
-        total_words = sum(page["words_count"] for page in extracted_pages)
-        
-        logger.info(f"🎉 EXTRAÇÃO CONCLUÍDA - {len(pages_to_process)} páginas, {total_words} palavras em {total_elapsed:.2f}s")
+        return await run_extract_text(upload, extract_pages, mode, encoding)
         
-        return TextExtractionResponse(
-            pages=extracted_pages,
-            total_pages=len(pages_to_process),
-            success=True,
-            message=f"Texto extraído com sucesso de {len(pages_to_process)} página(s)"
-        )
-        
-    except HTTPException:
+    except HTTPException as e:
         logger.error(f"❌ HTTPException: {str(e)}")
         raise
     except Exception as e:
@@ -601,11 +1953,15 @@ async def extract_text_from_pdf(
             status_code=500,
             detail=f"Erro interno do servidor: {str(e)}"
         )
+    finally:
+        upload.remove()
 
 @app.post("/extract-text-simple", response_model=SimpleTextResponse)
 async def extract_text_simple(
     file: UploadFile = File(..., description="Arquivo PDF para extração de texto limpo"),
-    extract_pages: Optional[str] = Form(None, description="Páginas específicas para extrair (ex: '1,3,5' ou 'all')")
+    extract_pages: Optional[str] = Form(None, description="Páginas específicas para extrair (ex: '1,3,5' ou 'all')"),
+    ocr_mode: Optional[str] = Form(None, description="Modo de OCR: 'raster' (renderização local) ou 'native' (PDF enviado direto à Vision API)"),
+    encoding: Optional[str] = Form(None, description="Codificação das imagens enviadas: png, gray, bilevel, jpeg ou jpeg-gray (ex: 'jpeg,quality=70,max_pixels=4000000')")
 ):
     """
     Extrai texto LIMPO de um arquivo PDF - Resposta simplificada
@@ -613,6 +1969,8 @@ async def extract_text_simple(
     Args:
         file: Arquivo PDF a ser processado
         extract_pages: Páginas específicas para extrair (opcional, padrão: todas)
+        ocr_mode: Modo de OCR (opcional, padrão: OCR_DEFAULT_MODE)
+        encoding: Codificação das imagens enviadas à Vision API (opcional, padrão: VISION_ENCODING_TEXT)
     
     Returns:
         SimpleTextResponse com texto limpo por páginas
@@ -625,44 +1983,14 @@ async def extract_text_simple(
             detail="Apenas arquivos PDF são suportados"
         )
     
+    mode = resolve_ocr_mode(ocr_mode)
+    resolve_encoding(encoding, settings.VISION_ENCODING_TEXT)
+    
+    # Gravar o arquivo em disco (uma única vez, em blocos)
+    upload = await spool_file(file)
+    
     try:
-        # Ler conteúdo do arquivo
-        pdf_content = await file.read()
-        
-        # Converter PDF para imagens
-        images = pdf_to_images(pdf_content)
-        total_pages = len(images)
-        
-        # Determinar quais páginas processar
-        pages_to_process = list(range(total_pages))
-        if extract_pages and extract_pages.lower() != "all":
-            try:
-                specified_pages = [int(p.strip()) - 1 for p in extract_pages.split(",")]
-                pages_to_process = [p for p in specified_pages if 0 <= p < total_pages]
-            except ValueError:
-                raise HTTPException(
-                    status_code=400,
-                    detail="Formato inválido para páginas. Use números separados por vírgula (ex: '1,3,5')"
-                )
-        
-        # Extrair texto limpo de cada página
-        clean_pages = []
-        
-        for page_num in pages_to_process:
-            image = images[page_num]
-            page_result = extract_text_from_image(image)
-            
-            # Adicionar apenas o texto limpo
-            if page_result["text"]:
-                clean_pages.append(page_result["text"])
-            else:
-                clean_pages.append("")
-        
-        return SimpleTextResponse(
-            pages=clean_pages,
-            total_pages=len(clean_pages),
-            success=True
-        )
+        return await run_extract_text_simple(upload, extract_pages, mode, encoding)
         
     except HTTPException:
         raise
@@ -671,11 +1999,14 @@ async def extract_text_simple(
             status_code=500,
             detail=f"Erro interno do servidor: {str(e)}"
         )
+    finally:
+        upload.remove()
 
 @app.post("/extract-text-agibank", response_model=AgibankResponse)
 async def extract_text_agibank_demonstrativo(
     file: UploadFile = File(..., description="Fatura PDF do Agibank para extração da área do demonstrativo"),
-    extract_pages: Optional[str] = Form(None, description="Páginas específicas para extrair (ex: '1,3,5' ou 'all')")
+    extract_pages: Optional[str] = Form(None, description="Páginas específicas para extrair (ex: '1,3,5' ou 'all')"),
+    encoding: Optional[str] = Form(None, description="Codificação das imagens enviadas: png, gray, bilevel, jpeg ou jpeg-gray (ex: 'jpeg,quality=70,max_pixels=4000000')")
 ):
     """
     Extrai texto APENAS da área do DEMONSTRATIVO de faturas Agibank
@@ -686,12 +2017,12 @@ async def extract_text_agibank_demonstrativo(
     Args:
         file: Arquivo PDF da fatura Agibank
         extract_pages: Páginas específicas para extrair (opcional, padrão: todas)
+        encoding: Codificação das imagens enviadas à Vision API (opcional, padrão: a do template agibank)
     
     Returns:
         AgibankResponse com texto da área do demonstrativo
     """
     
-    start_time = datetime.datetime.now()
     logger.info(f"🏦 AGIBANK - INICIANDO extração de demonstrativo - Arquivo: {file.filename}")
     
     # Validar tipo de arquivo
@@ -702,159 +2033,14 @@ async def extract_text_agibank_demonstrativo(
             detail="Apenas arquivos PDF são suportados"
         )
     
+    resolve_encoding(encoding, template_encoding(resolve_template("agibank")))
+    
+    # Gravar o arquivo em disco (uma única vez, em blocos)
+    logger.info(f"🏦 AGIBANK - Gravando PDF...")
+    upload = await spool_file(file)
+    
     try:
-        # Ler conteúdo do arquivo
-        logger.info(f"🏦 AGIBANK - Lendo conteúdo do PDF...")
-        pdf_content = await file.read()
-        
-        # Descobrir número total de páginas sem carregar todas na memória
-        logger.info(f"🏦 AGIBANK - Analisando PDF (modo economia de memória)...")
-        try:
-            # Tentar descobrir o número de páginas de forma eficiente
-            test_images = convert_from_bytes(
-                pdf_content,
-                dpi=72,  # DPI muito baixo só para contar
-                fmt='PNG',
-                thread_count=1
-            )
-            total_pages = len(test_images)
-            # Liberar imagens de teste imediatamente
-            for img in test_images:
-                if hasattr(img, 'close'):
-                    img.close()
-            del test_images
-            gc.collect()
-        except Exception as e:
-            logger.error(f"❌ AGIBANK - Erro ao analisar PDF: {str(e)}")
-            raise HTTPException(status_code=400, detail="PDF inválido ou corrompido")
-        
-        logger.info(f"🏦 AGIBANK - PDF contém {total_pages} página(s)")
-        
-        # Determinar quais páginas processar
-        pages_to_process = list(range(total_pages))
-        if extract_pages and extract_pages.lower() != "all":
-            try:
-                specified_pages = [int(p.strip()) - 1 for p in extract_pages.split(",")]
-                pages_to_process = [p for p in specified_pages if 0 <= p < total_pages]
-            except ValueError:
-                raise HTTPException(
-                    status_code=400,
-                    detail="Formato inválido para páginas. Use números separados por vírgula (ex: '1,3,5')"
-                )
-        
-        # Log de informação sobre o processamento
-        logger.info(f"🏦 AGIBANK - Processando {len(pages_to_process)} páginas (uma por vez)")
-        
-        # Estimar tempo de processamento
-        estimated_time = len(pages_to_process) * 12  # ~12 segundos por página no modo economia
-        if estimated_time > 300:  # 5 minutos
-            logger.warning(f"⚠️ AGIBANK - Tempo estimado alto: {estimated_time}s - Considere usar 'extract_pages' para páginas específicas")
-        
-        logger.info(f"🏦 AGIBANK - Tempo estimado: {estimated_time}s para {len(pages_to_process)} páginas")
-        
-        # Processamento página por página (modo economia de memória)
-        logger.info(f"🏦 AGIBANK - Modo economia de memória ativado")
-        logger.info(f"🏦 AGIBANK - Iniciando processamento página por página")
-        demonstrativo_texts = []
-        total_processing_time = 0
-        
-        for i, page_index in enumerate(pages_to_process):
-            page_num = page_index + 1
-            
-            try:
-                logger.info(f"🏦 AGIBANK - Carregando página {page_num}/{total_pages}...")
-                
-                # Carregar APENAS esta página do PDF
-                page_images = convert_from_bytes(
-                    pdf_content,
-                    dpi=200,  # DPI adequado para OCR
-                    first_page=page_num,
-                    last_page=page_num,
-                    fmt='PNG',
-                    thread_count=1
-                )
-                
-                if not page_images:
-                    logger.error(f"❌ AGIBANK - Não foi possível carregar página {page_num}")
-                    demonstrativo_texts.append("")
-                    continue
-                
-                image = page_images[0]
-                
-                # Otimizar tamanho se necessário
-                if image.size[0] > 2000 or image.size[1] > 3000:
-                    ratio = min(2000 / image.size[0], 3000 / image.size[1])
-                    new_size = (int(image.size[0] * ratio), int(image.size[1] * ratio))
-                    optimized_image = image.resize(new_size, Image.Resampling.LANCZOS)
-                    logger.info(f"📏 AGIBANK - Página {page_num} redimensionada: {image.size} → {new_size}")
-                    
-                    # Liberar imagem original
-                    image.close()
-                    image = optimized_image
-                
-                logger.info(f"🏦 AGIBANK - Processando página {page_num}/{total_pages}...")
-                
-                # Processar uma página por vez
-                page_num_result, text, process_time, error = process_single_agibank_page(image, page_num)
-                
-                if error:
-                    logger.error(f"❌ AGIBANK - Página {page_num} teve erro: {error}")
-                    demonstrativo_texts.append("")
-                else:
-                    logger.info(f"✅ AGIBANK - Página {page_num} processada em {process_time:.2f}s")
-                    demonstrativo_texts.append(text)
-                
-                total_processing_time += process_time
-                
-                # Liberar toda a memória da página atual
-                image.close()
-                for img in page_images:
-                    if hasattr(img, 'close'):
-                        img.close()
-                del page_images
-                del image
-                
-                # Forçar limpeza de memória após cada página
-                gc.collect()
-                
-                # Pequena pausa para estabilizar memória
-                await asyncio.sleep(0.2)
-                
-                logger.info(f"🧹 AGIBANK - Página {page_num} liberada da memória")
-                
-            except Exception as e:
-                logger.error(f"❌ AGIBANK - Erro inesperado na página {page_num}: {str(e)}")
-                demonstrativo_texts.append("")
-                
-                # Forçar limpeza mesmo em erro
-                try:
-                    if 'image' in locals() and hasattr(image, 'close'):
-                        image.close()
-                    if 'page_images' in locals():
-                        for img in page_images:
-                            if hasattr(img, 'close'):
-                                img.close()
-                        del page_images
-                except:
-                    pass
-                gc.collect()
-        
-        # Liberação final de memória (limpeza geral)
-        gc.collect()
-        logger.info(f"🧹 AGIBANK - Limpeza final de memória concluída")
-        
-        # Calcular tempo total
-        total_elapsed = (datetime.datetime.now() - start_time).total_seconds()
-        pages_processed = len([t for t in demonstrativo_texts if t.strip()])  # Páginas com conteúdo
-        
-        logger.info(f"🎉 AGIBANK - CONCLUÍDO: {pages_processed}/{len(demonstrativo_texts)} páginas em {total_elapsed:.2f}s (tempo processamento: {total_processing_time:.2f}s)")
-        
-        return AgibankResponse(
-            demonstrativo_pages=demonstrativo_texts,
-            total_pages=len(demonstrativo_texts),
-            success=True,
-            message=f"Área do demonstrativo extraída de {pages_processed}/{len(demonstrativo_texts)} página(s) em {total_elapsed:.1f}s (modo economia de memória)"
-        )
+        return await run_extract_agibank(upload, extract_pages, encoding)
         
     except HTTPException:
         raise
@@ -863,11 +2049,14 @@ async def extract_text_agibank_demonstrativo(
             status_code=500,
             detail=f"Erro interno do servidor: {str(e)}"
         )
+    finally:
+        upload.remove()
 
 @app.post("/extract-text-bmg", response_model=BmgResponse)
 async def extract_text_bmg_transacoes(
     file: UploadFile = File(..., description="Fatura PDF do BMG para extração da área das transações"),
-    extract_pages: Optional[str] = Form(None, description="Páginas específicas para extrair (ex: '1,3,5' ou 'all')")
+    extract_pages: Optional[str] = Form(None, description="Páginas específicas para extrair (ex: '1,3,5' ou 'all')"),
+    encoding: Optional[str] = Form(None, description="Codificação das imagens enviadas: png, gray, bilevel, jpeg ou jpeg-gray (ex: 'jpeg,quality=70,max_pixels=4000000')")
 ):
     """
     Extrai texto APENAS da área das TRANSAÇÕES de faturas BMG
@@ -878,12 +2067,12 @@ async def extract_text_bmg_transacoes(
     Args:
         file: Arquivo PDF da fatura BMG
         extract_pages: Páginas específicas para extrair (opcional, padrão: todas)
+        encoding: Codificação das imagens enviadas à Vision API (opcional, padrão: a do template bmg)
     
     Returns:
         BmgResponse com texto da área das transações
     """
     
-    start_time = datetime.datetime.now()
     logger.info(f"🏧 BMG - INICIANDO extração de transações - Arquivo: {file.filename}")
     
     # Validar tipo de arquivo
@@ -894,183 +2083,343 @@ async def extract_text_bmg_transacoes(
             detail="Apenas arquivos PDF são suportados"
         )
     
+    resolve_encoding(encoding, template_encoding(resolve_template("bmg")))
+    
+    # Gravar o arquivo em disco (uma única vez, em blocos)
+    logger.info(f"🏧 BMG - Gravando PDF...")
+    upload = await spool_file(file)
+    
     try:
-        # Ler conteúdo do arquivo
-        logger.info(f"🏧 BMG - Lendo conteúdo do PDF...")
-        pdf_content = await file.read()
-        
-        # Descobrir número total de páginas sem carregar todas na memória
-        logger.info(f"🏧 BMG - Analisando PDF (modo economia de memória)...")
-        try:
-            # Tentar descobrir o número de páginas de forma eficiente
-            test_images = convert_from_bytes(
-                pdf_content,
-                dpi=72,  # DPI muito baixo só para contar
-                fmt='PNG',
-                thread_count=1
-            )
-            total_pages = len(test_images)
-            # Liberar imagens de teste imediatamente
-            for img in test_images:
-                if hasattr(img, 'close'):
-                    img.close()
-            del test_images
-            gc.collect()
-        except Exception as e:
-            logger.error(f"❌ BMG - Erro ao analisar PDF: {str(e)}")
-            raise HTTPException(status_code=400, detail="PDF inválido ou corrompido")
-        
-        logger.info(f"🏧 BMG - PDF contém {total_pages} página(s)")
-        
-        # Determinar quais páginas processar
-        pages_to_process = list(range(total_pages))
-        if extract_pages and extract_pages.lower() != "all":
-            try:
-                specified_pages = [int(p.strip()) - 1 for p in extract_pages.split(",")]
-                pages_to_process = [p for p in specified_pages if 0 <= p < total_pages]
-            except ValueError:
-                raise HTTPException(
-                    status_code=400,
-                    detail="Formato inválido para páginas. Use números separados por vírgula (ex: '1,3,5')"
-                )
-        
-        # Log de informação sobre o processamento
-        logger.info(f"🏧 BMG - Processando {len(pages_to_process)} páginas (uma por vez)")
-        
-        # Estimar tempo de processamento
-        estimated_time = len(pages_to_process) * 15  # ~15 segundos por página no modo economia
-        if estimated_time > 300:  # 5 minutos
-            logger.warning(f"⚠️ BMG - Tempo estimado alto: {estimated_time}s - Considere usar 'extract_pages' para páginas específicas")
-        
-        logger.info(f"🏧 BMG - Tempo estimado: {estimated_time}s para {len(pages_to_process)} páginas")
-        
-        # Extrair texto da área das transações de cada página
-        transacoes_texts = []
-        
-        logger.info(f"🏧 BMG - Modo economia de memória ativado")
+        return await run_extract_bmg(upload, extract_pages, encoding)
         
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Erro interno do servidor: {str(e)}"
+        )
+    finally:
+        upload.remove()
 
+@app.post("/extract-region/{template}", response_model=RegionExtractionResponse)
+async def extract_region_from_pdf(
+    template: str,
+    file: UploadFile = File(..., description="Arquivo PDF no layout do template"),
+    extract_pages: Optional[str] = Form(None, description="Páginas específicas para extrair (ex: '1,3,5' ou 'all')"),
+    encoding: Optional[str] = Form(None, description="Codificação das imagens enviadas: png, gray, bilevel, jpeg ou jpeg-gray (ex: 'jpeg,quality=70,max_pixels=4000000')")
+):
+    """
+    Extrai o texto das áreas definidas por um template de layout (GET /templates)
+    
+    Cada página passa por um único OCR da região que contém as áreas; o texto de cada área
+    sai das caixas das palavras e passa pelo pós-processador do template.
+    
+    Args:
+        template: Nome do template (arquivo JSON em TEMPLATES_DIR)
+        file: Arquivo PDF a ser processado
+        extract_pages: Páginas específicas para extrair (opcional, padrão: todas)
+        encoding: Codificação das imagens enviadas à Vision API (opcional, padrão: a do template)
+    
+    Returns:
+        RegionExtractionResponse com o texto de cada área, por página
+    """
+    layout_template = resolve_template(template)
+    logger.info(f"{layout_template.icon} {layout_template.label} - INICIANDO extração ({layout_template.title}) - Arquivo: {file.filename}")
+    
+    # Validar tipo de arquivo
+    if not file.filename.lower().endswith('.pdf'):
+        logger.error(f"❌ {layout_template.label} - Tipo de arquivo inválido: {file.filename}")
+        raise HTTPException(
+            status_code=400,
+            detail="Apenas arquivos PDF são suportados"
+        )
+    
+    resolve_encoding(encoding, template_encoding(layout_template))
+    upload = await spool_file(file)
+    
+    try:
+        return await run_extract_region(upload, layout_template.name, extract_pages, encoding)
         
-        # Processamento página por página (modo economia de memória)
-        logger.info(f"🏧 BMG - Iniciando processamento página por página")
-        transacoes_texts = []
-        total_processing_time = 0
-        
-        for i, page_index in enumerate(pages_to_process):
-            page_num = page_index + 1
-            
-            try:
-                logger.info(f"🏧 BMG - Carregando página {page_num}/{total_pages}...")
-                
-                # Carregar APENAS esta página do PDF
-                page_images = convert_from_bytes(
-                    pdf_content,
-                    dpi=200,  # DPI adequado para OCR
-                    first_page=page_num,
-                    last_page=page_num,
-                    fmt='PNG',
-                    thread_count=1
-                )
-                
-                if not page_images:
-                    logger.error(f"❌ BMG - Não foi possível carregar página {page_num}")
-                    transacoes_texts.append("")
-                    continue
-                
-                image = page_images[0]
-                
-                # Otimizar tamanho se necessário
-                if image.size[0] > 2000 or image.size[1] > 3000:
-                    ratio = min(2000 / image.size[0], 3000 / image.size[1])
-                    new_size = (int(image.size[0] * ratio), int(image.size[1] * ratio))
-                    optimized_image = image.resize(new_size, Image.Resampling.LANCZOS)
-                    logger.info(f"📏 BMG - Página {page_num} redimensionada: {image.size} → {new_size}")
-                    
-                    # Liberar imagem original
-                    image.close()
-                    image = optimized_image
-                
-                logger.info(f"🏧 BMG - Processando página {page_num}/{total_pages}...")
-                
-                # Processar uma página por vez
-                page_num_result, text, process_time, error = process_single_bmg_page(image, page_num)
-                
-                if error:
-                    logger.error(f"❌ BMG - Página {page_num} teve erro: {error}")
-                    transacoes_texts.append("")
-                else:
-                    logger.info(f"✅ BMG - Página {page_num} processada em {process_time:.2f}s")
-                    transacoes_texts.append(text)
-                
-                total_processing_time += process_time
-                
-                # Liberar toda a memória da página atual
-                image.close()
-                for img in page_images:
-                    if hasattr(img, 'close'):
-                        img.close()
-                del page_images
-                del image
-                
-                # Forçar limpeza de memória após cada página
-                gc.collect()
-                
-                # Pequena pausa para estabilizar memória
-                await asyncio.sleep(0.2)
-                
-                logger.info(f"🧹 BMG - Página {page_num} liberada da memória")
-                
-            except Exception as e:
-                logger.error(f"❌ BMG - Erro inesperado na página {page_num}: {str(e)}")
-                transacoes_texts.append("")
-                
-                # Forçar limpeza mesmo em erro
-                try:
-                    if 'image' in locals() and hasattr(image, 'close'):
-                        image.close()
-                    if 'page_images' in locals():
-                        for img in page_images:
-                            if hasattr(img, 'close'):
-                                img.close()
-                        del page_images
-                except:
-                    pass
-                gc.collect()
-        
-        # Liberação final de memória (limpeza geral)
-        gc.collect()
-        logger.info(f"🧹 BMG - Limpeza final de memória concluída")
-        
-        # Calcular tempo total
-        total_elapsed = (datetime.datetime.now() - start_time).total_seconds()
-        pages_processed = len([t for t in transacoes_texts if t.strip()])  # Páginas com conteúdo
-        
-        logger.info(f"🎉 BMG - CONCLUÍDO: {pages_processed}/{len(transacoes_texts)} páginas em {total_elapsed:.2f}s (tempo processamento: {total_processing_time:.2f}s)")
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Erro interno do servidor: {str(e)}"
+        )
+    finally:
+        upload.remove()
+
+@app.post("/extract-auto", response_model=AutoExtractionResponse)
+async def extract_auto_from_pdf(
+    file: UploadFile = File(..., description="Fatura PDF de qualquer template com detecção automática"),
+    extract_pages: Optional[str] = Form(None, description="Páginas específicas para extrair (ex: '1,3,5' ou 'all')"),
+    encoding: Optional[str] = Form(None, description="Codificação das imagens enviadas: png, gray, bilevel, jpeg ou jpeg-gray (ex: 'jpeg,quality=70,max_pixels=4000000')")
+):
+    """
+    Identifica o tipo de documento e extrai as áreas do template correspondente
+    
+    A identificação usa sinais baratos da primeira página selecionada (camada
+    de texto, miniatura ou OCR do cabeçalho em baixa resolução) antes da
+    passagem em resolução completa. Documentos não reconhecidos recebem 422.
+    
+    Args:
+        file: Arquivo PDF a ser processado
+        extract_pages: Páginas específicas para extrair (opcional, padrão: todas)
+        encoding: Codificação das imagens enviadas à Vision API (opcional, padrão: a do template detectado)
+    
+    Returns:
+        AutoExtractionResponse com o template detectado e o texto de cada área, por página
+    """
+    logger.info(f"🔎 DETECÇÃO - INICIANDO extração automática - Arquivo: {file.filename}")
+    
+    # Validar tipo de arquivo
+    if not file.filename.lower().endswith('.pdf'):
+        logger.error(f"❌ DETECÇÃO - Tipo de arquivo inválido: {file.filename}")
+        raise HTTPException(
+            status_code=400,
+            detail="Apenas arquivos PDF são suportados"
+        )
+    
+    resolve_encoding(encoding, settings.VISION_ENCODING)
+    upload = await spool_file(file)
+    
+    try:
+        return await run_extract_auto(upload, extract_pages, encoding)
         
-        return BmgResponse(
-            transacoes_pages=transacoes_texts,
-            total_pages=len(transacoes_texts),
-            success=True,
-            message=f"Área das transações extraída de {pages_processed}/{len(transacoes_texts)} página(s) em {total_elapsed:.1f}s (modo economia de memória)"
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Erro interno do servidor: {str(e)}"
+        )
+    finally:
+        upload.remove()
+
+@app.get("/templates")
+async def list_templates():
+    """Templates de layout disponíveis em /extract-region/{template}, com as áreas e o pós-processamento"""
+    return {"templates": [template.describe() for template in get_template_registry()]}
+
+@app.post("/extract-text/stream")
+async def extract_text_from_pdf_stream(
+    file: UploadFile = File(..., description="Arquivo PDF para extração de texto"),
+    extract_pages: Optional[str] = Form(None, description="Páginas específicas para extrair (ex: '1,3,5' ou 'all')"),
+    ocr_mode: Optional[str] = Form(None, description="Modo de OCR: 'raster' (renderização local) ou 'native' (PDF enviado direto à Vision API)"),
+    encoding: Optional[str] = Form(None, description="Codificação das imagens enviadas: png, gray, bilevel, jpeg ou jpeg-gray (ex: 'jpeg,quality=70,max_pixels=4000000')"),
+    stream_format: Optional[str] = Form(None, description="Formato do streaming: 'ndjson' (padrão) ou 'sse'")
+):
+    """
+    Versão em streaming de /extract-text: cada página é enviada assim que termina
+    
+    Returns:
+        Registros {"type": "page"} por página e um {"type": "summary"} final
+    """
+    mode = resolve_ocr_mode(ocr_mode)
+    resolve_encoding(encoding, settings.VISION_ENCODING_TEXT)
+    return await stream_response(run_extract_text, file, extract_pages, stream_format, "EXTRAÇÃO", ocr_mode=mode, encoding=encoding)
+
+@app.post("/extract-text-agibank/stream")
+async def extract_text_agibank_demonstrativo_stream(
+    file: UploadFile = File(..., description="Fatura PDF do Agibank para extração da área do demonstrativo"),
+    extract_pages: Optional[str] = Form(None, description="Páginas específicas para extrair (ex: '1,3,5' ou 'all')"),
+    encoding: Optional[str] = Form(None, description="Codificação das imagens enviadas: png, gray, bilevel, jpeg ou jpeg-gray (ex: 'jpeg,quality=70,max_pixels=4000000')"),
+    stream_format: Optional[str] = Form(None, description="Formato do streaming: 'ndjson' (padrão) ou 'sse'")
+):
+    """
+    Versão em streaming de /extract-text-agibank: cada página é enviada assim que termina
+    
+    Returns:
+        Registros {"type": "page"} por página e um {"type": "summary"} final
+    """
+    resolve_encoding(encoding, template_encoding(resolve_template("agibank")))
+    return await stream_response(run_extract_agibank, file, extract_pages, stream_format, "AGIBANK", encoding=encoding)
+
+@app.post("/extract-text-bmg/stream")
+async def extract_text_bmg_transacoes_stream(
+    file: UploadFile = File(..., description="Fatura PDF do BMG para extração da área das transações"),
+    extract_pages: Optional[str] = Form(None, description="Páginas específicas para extrair (ex: '1,3,5' ou 'all')"),
+    encoding: Optional[str] = Form(None, description="Codificação das imagens enviadas: png, gray, bilevel, jpeg ou jpeg-gray (ex: 'jpeg,quality=70,max_pixels=4000000')"),
+    stream_format: Optional[str] = Form(None, description="Formato do streaming: 'ndjson' (padrão) ou 'sse'")
+):
+    """
+    Versão em streaming de /extract-text-bmg: cada página é enviada assim que termina
+    
+    Returns:
+        Registros {"type": "page"} por página e um {"type": "summary"} final
+    """
+    resolve_encoding(encoding, template_encoding(resolve_template("bmg")))
+    return await stream_response(run_extract_bmg, file, extract_pages, stream_format, "BMG", encoding=encoding)
+
+@app.post("/extract-region/{template}/stream")
+async def extract_region_from_pdf_stream(
+    template: str,
+    file: UploadFile = File(..., description="Arquivo PDF no layout do template"),
+    extract_pages: Optional[str] = Form(None, description="Páginas específicas para extrair (ex: '1,3,5' ou 'all')"),
+    encoding: Optional[str] = Form(None, description="Codificação das imagens enviadas: png, gray, bilevel, jpeg ou jpeg-gray (ex: 'jpeg,quality=70,max_pixels=4000000')"),
+    stream_format: Optional[str] = Form(None, description="Formato do streaming: 'ndjson' (padrão) ou 'sse'")
+):
+    """
+    Versão em streaming de /extract-region/{template}: cada página é enviada assim que termina
+    
+    Returns:
+        Registros {"type": "page"} por página (com o texto de cada área em "regions") e um {"type": "summary"} final
+    """
+    layout_template = resolve_template(template)
+    resolve_encoding(encoding, template_encoding(layout_template))
+    return await stream_response(
+        run_extract_region, file, extract_pages, stream_format, layout_template.label,
+        template=layout_template.name, encoding=encoding
+    )
+
+@app.post("/extract-auto/stream")
+async def extract_auto_from_pdf_stream(
+    file: UploadFile = File(..., description="Fatura PDF de qualquer template com detecção automática"),
+    extract_pages: Optional[str] = Form(None, description="Páginas específicas para extrair (ex: '1,3,5' ou 'all')"),
+    encoding: Optional[str] = Form(None, description="Codificação das imagens enviadas: png, gray, bilevel, jpeg ou jpeg-gray (ex: 'jpeg,quality=70,max_pixels=4000000')"),
+    stream_format: Optional[str] = Form(None, description="Formato do streaming: 'ndjson' (padrão) ou 'sse'")
+):
+    """
+    Versão em streaming de /extract-auto: cada página é enviada assim que termina
+    
+    Returns:
+        Registros {"type": "page"} por página e um {"type": "summary"} final (com o template detectado)
+    """
+    resolve_encoding(encoding, settings.VISION_ENCODING)
+    return await stream_response(run_extract_auto, file, extract_pages, stream_format, "DETECÇÃO", encoding=encoding)
+
+def job_to_response(job: Job) -> JobResponse:
+    """Converte o job da fila no modelo de resposta de status"""
+    def iso(timestamp: Optional[float]) -> Optional[str]:
+        return datetime.datetime.fromtimestamp(timestamp).isoformat() if timestamp else None
+    
+    return JobResponse(
+        job_id=job.id,
+        mode=job.mode,
+        status=job.status,
+        filename=job.filename,
+        pages_total=job.pages_total,
+        pages_done=job.pages_done,
+        pages={int(page): job.pages[page] for page in sorted(job.pages, key=int)},
+        created_at=iso(job.created_at),
+        started_at=iso(job.started_at),
+        finished_at=iso(job.finished_at),
+        error=job.error
+    )
+
+async def get_job_or_404(job_id: str) -> Job:
+    # Consulta ao SQLite (pode esperar o lock do banco) fora do event loop
+    job = await asyncio.to_thread(get_job_queue().store.get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job não encontrado: {job_id}")
+    return job
+
+@app.post("/jobs", response_model=JobResponse, status_code=202)
+async def create_job(
+    file: UploadFile = File(..., description="Arquivo PDF para processamento em segundo plano"),
+    mode: str = Form("text", description=f"Tipo de extração: {', '.join(JOB_MODES)}"),
+    extract_pages: Optional[str] = Form(None, description="Páginas específicas para extrair (ex: '1,3,5' ou 'all')"),
+    ocr_mode: Optional[str] = Form(None, description="Modo de OCR para 'text' e 'simple': 'raster' ou 'native'"),
+    encoding: Optional[str] = Form(None, description="Codificação das imagens enviadas: png, gray, bilevel, jpeg ou jpeg-gray (ex: 'jpeg,quality=70,max_pixels=4000000')"),
+    template: Optional[str] = Form(None, description="Template de layout para 'region' (GET /templates)")
+):
+    """
+    Enfileira um PDF para extração em segundo plano e retorna o id do job
+    
+    A resposta é imediata, independente do tamanho do documento. Acompanhe o
+    progresso em GET /jobs/{job_id} e busque o resultado em GET /jobs/{job_id}/result
+    (mesmo formato de resposta do endpoint síncrono correspondente).
+    
+    Args:
+        file: Arquivo PDF a ser processado
+        mode: text (/extract-text), simple (/extract-text-simple), agibank, bmg, region (/extract-region/{template}) ou auto (/extract-auto)
+        extract_pages: Páginas específicas para extrair (opcional, padrão: todas)
+        ocr_mode: Modo de OCR (opcional, apenas para text e simple)
+        encoding: Codificação das imagens enviadas à Vision API (opcional, padrão do endpoint correspondente)
+        template: Nome do template de layout (obrigatório para region)
+    
+    Returns:
+        JobResponse com o id e o status do job
+    """
+    
+    # Validar tipo de arquivo
+    if not file.filename.lower().endswith('.pdf'):
+        raise HTTPException(
+            status_code=400,
+            detail="Apenas arquivos PDF são suportados"
+        )
+    
+    mode = mode.strip().lower()
+    if mode not in JOB_MODES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Modo de job inválido: '{mode}'. Use: {', '.join(JOB_MODES)}"
         )
+    
+    # Validar os parâmetros agora, e não só quando o job for executado
+    if mode in ("text", "simple"):
+        ocr_mode = resolve_ocr_mode(ocr_mode)
+    if mode == "region":
+        if not template:
+            raise HTTPException(status_code=400, detail="Informe o template para o modo 'region' (GET /templates)")
+        template = resolve_template(template).name
+    resolve_encoding(encoding, "png")
+    select_pages(extract_pages, 0)
+    
+    upload = await spool_file(file)
+    
+    try:
+        params = {"extract_pages": extract_pages, "ocr_mode": ocr_mode, "encoding": encoding, "template": template}
+        job = await get_job_queue().submit(mode, params, upload.path, file.filename)
+        return job_to_response(job)
         
     except HTTPException:
+        upload.remove()
         raise
     except Exception as e:
+        upload.remove()
         raise HTTPException(
             status_code=500,
             detail=f"Erro interno do servidor: {str(e)}"
         )
 
+@app.get("/jobs/{job_id}", response_model=JobResponse)
+async def get_job_status(job_id: str):
+    """Retorna o status e o progresso por página de um job"""
+    return job_to_response(await get_job_or_404(job_id))
+
+@app.get("/jobs/{job_id}/result")
+async def get_job_result(job_id: str):
+    """
+    Retorna o resultado de um job concluído
+    
+    Responde 409 enquanto o job está na fila ou em execução e 500 se o job falhou.
+    """
+    job = await get_job_or_404(job_id)
+    
+    if job.status == JOB_FAILED:
+        raise HTTPException(status_code=500, detail=job.error or "Falha no processamento do job")
+    if job.status != JOB_DONE:
+        raise HTTPException(
+            status_code=409,
+            detail=f"Job ainda não concluído (status: {job.status}, {job.pages_done}/{job.pages_total if job.pages_total is not None else '?'} páginas)"
+        )
+    
+    return JSONResponse(content=job.result)
+
 @app.post("/extract-text-image", response_model=dict)
 async def extract_text_from_image_endpoint(
-    file: UploadFile = File(..., description="Arquivo de imagem para extração de texto")
+    file: UploadFile = File(..., description="Arquivo de imagem para extração de texto"),
+    encoding: Optional[str] = Form(None, description="Codificação das imagens enviadas: png, gray, bilevel, jpeg ou jpeg-gray (ex: 'jpeg,quality=70,max_pixels=4000000')")
 ):
     """
     Extrai texto de uma imagem usando Google Cloud Vision OCR
     
     Args:
         file: Arquivo de imagem a ser processado
+        encoding: Codificação da imagem enviada à Vision API (opcional, padrão: VISION_ENCODING_IMAGE)
     
     Returns:
         Dicionário com o texto extraído
@@ -1084,20 +2433,29 @@ async def extract_text_from_image_endpoint(
             detail=f"Tipos de arquivo suportados: {', '.join(allowed_types)}"
         )
     
+    preset = resolve_encoding(encoding, settings.VISION_ENCODING_IMAGE)
+    stats = EncodingStats()
+    
+    # Gravar o arquivo em disco (uma única vez, em blocos)
+    upload = await spool_file(file, suffix=os.path.splitext(file.filename)[1].lower())
+    
     try:
-        # Ler conteúdo do arquivo
-        image_content = await file.read()
-        
-        # Abrir imagem com PIL
-        image = Image.open(io.BytesIO(image_content))
-        
-        # Extrair texto
-        result = extract_text_from_image(image)
+        with track_request("extract-text-image"):
+            # Abrir imagem com PIL
+            with Image.open(upload.path) as image:
+                # Reservar a imagem decodificada no controle de admissão
+                async with admitted(1, image.width * image.height * len(image.getbands())):
+                    # Extrair texto
+                    result = await extract_text_from_image(image, preset, stats)
+            record_extraction([PAGE_SOURCE_OCR], 0, stats.bytes)
         
         return {
             "text": result["text"],
             "confidence": result["confidence"],
             "words_count": result["words_count"],
+            "encoding": preset.key,
+            "upload_bytes": stats.bytes,
+            "encode_time": round(stats.seconds, 3),
             "success": True,
             "message": "Texto extraído com sucesso da imagem"
         }
@@ -1109,6 +2467,8 @@ async def extract_text_from_image_endpoint(
             status_code=500,
             detail=f"Erro interno do servidor: {str(e)}"
         )
+    finally:
+        upload.remove()
 
 if __name__ == "__main__":
     # Configurações do servidor
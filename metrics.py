@@ -0,0 +1,238 @@
+import functools
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterable, Iterator, Tuple
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+
+from stage_timing import add_observer
+
+# Rótulos usados fora de uma requisição (ex: inspeção antes de enfileirar um job)
+NO_ENDPOINT = "other"
+NO_TEMPLATE = "none"
+
+# Etapas de uma página: de milissegundos (recorte/parsing) a dezenas de segundos (OCR com filas)
+STAGE_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+REQUEST_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+STAGE_SECONDS = Histogram(
+    "pdf_ocr_stage_seconds",
+    "Tempo de cada etapa do pipeline (inspect, text_layer, render, crop, encode, ocr, postprocess)",
+    ["stage", "endpoint", "template"],
+    buckets=STAGE_BUCKETS
+)
+PAGE_SECONDS = Histogram(
+    "pdf_ocr_page_seconds",
+    "Tempo de processamento de uma página (OCR e pós-processamento)",
+    ["endpoint", "template"],
+    buckets=STAGE_BUCKETS
+)
+REQUEST_SECONDS = Histogram(
+    "pdf_ocr_request_seconds",
+    "Duração total de uma extração",
+    ["endpoint", "template"],
+    buckets=REQUEST_BUCKETS
+)
+PAGES = Counter(
+    "pdf_ocr_pages",
+    "Páginas extraídas, por origem do texto (ocr, text_layer, cache)",
+    ["endpoint", "template", "source"]
+)
+UPLOAD_BYTES = Counter(
+    "pdf_ocr_upload_bytes",
+    "Bytes enviados ao backend de OCR",
+    ["endpoint", "template"]
+)
+CACHE_HITS = Counter(
+    "pdf_ocr_cache_hits",
+    "Páginas atendidas pelo cache de OCR",
+    ["endpoint", "template"]
+)
+ERRORS = Counter(
+    "pdf_ocr_errors",
+    "Erros por tipo (request: extração inteira; page: uma página)",
+    ["endpoint", "template", "kind"]
+)
+REQUESTS_IN_FLIGHT = Gauge(
+    "pdf_ocr_requests_in_flight",
+    "Extrações em andamento",
+    ["endpoint", "template"],
+    multiprocess_mode="livesum"
+)
+PAGES_IN_FLIGHT = Gauge(
+    "pdf_ocr_pages_in_flight",
+    "Páginas em processamento (OCR e pós-processamento)",
+    ["endpoint", "template"],
+    multiprocess_mode="livesum"
+)
+
+ADMISSION_WAIT_SECONDS = Histogram(
+    "pdf_ocr_admission_wait_seconds",
+    "Espera por vaga no controle de admissão (páginas e memória)",
+    ["endpoint", "template"],
+    buckets=STAGE_BUCKETS
+)
+ADMISSION_REJECTED = Counter(
+    "pdf_ocr_admission_rejected",
+    "Requisições recusadas (503) por falta de vaga no controle de admissão",
+    ["endpoint", "template"]
+)
+OCR_RETRIES = Counter(
+    "pdf_ocr_ocr_retries",
+    "Novas tentativas de chamadas ao backend de OCR após falha transitória ou tempo esgotado",
+    ["endpoint", "template"]
+)
+OCR_HEDGES = Counter(
+    "pdf_ocr_ocr_hedges",
+    "Chamadas duplicadas ao backend de OCR por latência acima do percentil (hedging)",
+    ["endpoint", "template"]
+)
+OCR_TIMEOUTS = Counter(
+    "pdf_ocr_ocr_timeouts",
+    "Tentativas de chamadas ao backend de OCR que estouraram o tempo limite",
+    ["endpoint", "template"]
+)
+RATE_LIMIT_WAIT_SECONDS = Histogram(
+    "pdf_ocr_rate_limit_wait_seconds",
+    "Espera das chamadas ao backend de OCR pela cota (token bucket)",
+    ["endpoint", "template"],
+    buckets=STAGE_BUCKETS
+)
+
+# (endpoint, template) da extração em andamento; propagado às threads pelo OCREngine
+_labels: ContextVar[Tuple[str, str]] = ContextVar("metrics_labels", default=(NO_ENDPOINT, NO_TEMPLATE))
+
+
+def _observe_stage(stage: str, seconds: float):
+    STAGE_SECONDS.labels(stage, *_labels.get()).observe(seconds)
+
+
+# Toda medição de etapa (stage_timing.timed) também alimenta o histograma
+add_observer(_observe_stage)
+
+
+@contextmanager
+def labeled(endpoint: str, template: str = NO_TEMPLATE) -> Iterator[None]:
+    """Rotula as etapas executadas dentro do bloco, sem contar uma extração (ex: detecção do template)"""
+    token = _labels.set((endpoint, template))
+    try:
+        yield
+    finally:
+        _labels.reset(token)
+
+
+@contextmanager
+def track_request(endpoint: str, template: str = NO_TEMPLATE) -> Iterator[None]:
+    """
+    Mede uma extração: duração, extrações em andamento e erros
+
+    As etapas executadas dentro do bloco (inclusive nas threads do motor de
+    OCR) recebem os rótulos `endpoint` e `template`.
+    """
+    token = _labels.set((endpoint, template))
+    in_flight = REQUESTS_IN_FLIGHT.labels(endpoint, template)
+    in_flight.inc()
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        ERRORS.labels(endpoint, template, "request").inc()
+        raise
+    finally:
+        REQUEST_SECONDS.labels(endpoint, template).observe(time.perf_counter() - start)
+        in_flight.dec()
+        _labels.reset(token)
+
+
+def tracked(endpoint: str, template: str = NO_TEMPLATE):
+    """Decorador de `track_request` para funções assíncronas de extração"""
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            with track_request(endpoint, template):
+                return await func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+@contextmanager
+def track_pages(count: int = 1) -> Iterator[None]:
+    """Conta `count` páginas em processamento enquanto o bloco executa"""
+    in_flight = PAGES_IN_FLIGHT.labels(*_labels.get())
+    in_flight.inc(count)
+    try:
+        yield
+    finally:
+        in_flight.dec(count)
+
+
+def observe_page(seconds: float, error: bool = False):
+    """Registra o tempo de uma página (e o erro, se houver)"""
+    PAGE_SECONDS.labels(*_labels.get()).observe(seconds)
+    if error:
+        record_page_error()
+
+
+def record_page_error():
+    ERRORS.labels(*_labels.get(), "page").inc()
+
+
+def observe_admission(seconds: float, rejected: bool = False):
+    """Registra a espera por vaga no controle de admissão (e a recusa, se houver)"""
+    labels = _labels.get()
+    ADMISSION_WAIT_SECONDS.labels(*labels).observe(seconds)
+    if rejected:
+        ADMISSION_REJECTED.labels(*labels).inc()
+
+
+def observe_rate_limit(seconds: float):
+    """Registra a espera de uma chamada de OCR pela cota"""
+    RATE_LIMIT_WAIT_SECONDS.labels(*_labels.get()).observe(seconds)
+
+
+def record_ocr_calls(retries: int, hedges: int, timeouts: int):
+    """Registra as retentativas, duplicatas e tempos esgotados das chamadas de OCR de uma extração"""
+    labels = _labels.get()
+    if retries:
+        OCR_RETRIES.labels(*labels).inc(retries)
+    if hedges:
+        OCR_HEDGES.labels(*labels).inc(hedges)
+    if timeouts:
+        OCR_TIMEOUTS.labels(*labels).inc(timeouts)
+
+
+def record_extraction(sources: Iterable[str], cache_hits: int, upload_bytes: int):
+    """Registra os totais de uma extração concluída"""
+    labels = _labels.get()
+    for source in sources:
+        PAGES.labels(*labels, source).inc()
+    if cache_hits:
+        CACHE_HITS.labels(*labels).inc(cache_hits)
+    if upload_bytes:
+        UPLOAD_BYTES.labels(*labels).inc(upload_bytes)
+
+
+def render_metrics() -> Tuple[bytes, str]:
+    """
+    Métricas no formato texto do Prometheus
+
+    Com vários processos (uvicorn --workers), defina PROMETHEUS_MULTIPROC_DIR
+    para que cada processo grave suas métricas lá e a resposta some todos.
+    """
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
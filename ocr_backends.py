@@ -0,0 +1,271 @@
+import asyncio
+import hashlib
+import logging
+import random
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+from google.cloud import vision
+
+from ocr_layout import Box, LayoutBlock, LayoutWord, PageLayout, union_box
+from vision_files import VisionFileError, annotate_pdf_pages
+from vision_pool import VisionClientPool
+
+logger = logging.getLogger("PDF_OCR_API")
+
+OCR_BACKENDS = ("vision", "fake")
+
+# Texto padrão do backend simulado (formato parecido com as faturas Agibank/BMG)
+FAKE_OCR_DEFAULT_TEXT = (
+    "DEMONSTRATIVO {hash}\n"
+    "01/02/2024 COMPRA LOJA EXEMPLO\n"
+    "03/02/2024 PAGAMENTO FATURA\n"
+    "05/02/2024 TARIFA ANUIDADE\n"
+    "123,45\n-1.000,00\n12,90"
+)
+
+# Códigos de status gRPC de falhas transitórias (DEADLINE_EXCEEDED, RESOURCE_EXHAUSTED,
+# ABORTED, INTERNAL, UNAVAILABLE): a mesma chamada pode dar certo numa nova tentativa
+RETRYABLE_STATUS_CODES = frozenset({4, 8, 10, 13, 14})
+
+# Separador depois de cada palavra conforme a quebra detectada no último símbolo
+# (TextAnnotation.DetectedBreak.BreakType: SPACE, SURE_SPACE, EOL_SURE_SPACE, HYPHEN, LINE_BREAK)
+BREAK_SEPARATORS = {1: " ", 2: " ", 3: "\n", 4: "-\n", 5: "\n"}
+
+# Região da página onde o backend simulado distribui o texto (dentro das áreas Agibank e BMG)
+FAKE_OCR_LAYOUT_BOX = (0.5, 0.2, 0.9, 0.5)
+
+
+@dataclass
+class OCRPageResult:
+    """Resultado do OCR de uma imagem ou página, no formato comum a todos os backends"""
+    text: str  # Texto bruto, antes da limpeza
+    error: Optional[str] = None
+    retryable: bool = False  # Erro transitório: vale tentar de novo
+    layout: Optional[PageLayout] = None  # Blocos e palavras com as caixas, para extrair regiões depois do OCR
+
+
+class OCRCallError(Exception):
+    """Falha de uma chamada inteira ao backend; `retryable` indica falha transitória"""
+
+    def __init__(self, message: str, retryable: bool = False):
+        super().__init__(message)
+        self.retryable = retryable
+
+
+class OCRBackend:
+    """
+    Interface dos backends de OCR
+
+    Os métodos são corrotinas executadas no event loop (as chamadas de rede
+    são aguardadas, sem ocupar threads). Erros de uma imagem específica voltam
+    em `OCRPageResult.error`; exceções indicam falha da chamada inteira.
+    Backends com `queued` podem esperar (fila, cota) antes de enviar a chamada
+    e sinalizam o envio com `ocr_resilience.mark_dispatched`.
+    """
+    name = "base"
+    queued = False
+    max_images_per_batch = 16
+    max_pages_per_pdf_request = 5
+
+    async def annotate_images(self, contents: List[bytes]) -> List[OCRPageResult]:
+        """OCR de um lote de imagens codificadas, na mesma ordem da entrada"""
+        raise NotImplementedError
+
+    async def annotate_pdf(self, pdf_content: bytes, page_numbers: List[int]) -> Dict[int, OCRPageResult]:
+        """OCR das páginas (base 1) de um PDF enviado diretamente, sem rasterização local"""
+        raise NotImplementedError
+
+    def open(self):
+        """Prepara as conexões do backend (chamado no lifespan, dentro do event loop)"""
+
+    async def close(self):
+        """Libera os recursos do backend"""
+
+
+def _vision_box(bounding_box, width: float, height: float) -> Box:
+    """Caixa da Vision (vértices em pixels ou normalizados, nos PDFs) em frações da página"""
+    if bounding_box.normalized_vertices:
+        points = [(vertex.x, vertex.y) for vertex in bounding_box.normalized_vertices]
+    else:
+        points = [(vertex.x / width, vertex.y / height) for vertex in bounding_box.vertices]
+    if not points:
+        return (0.0, 0.0, 0.0, 0.0)
+    xs = [min(max(x, 0.0), 1.0) for x, _ in points]
+    ys = [min(max(y, 0.0), 1.0) for _, y in points]
+    return (min(xs), min(ys), max(xs), max(ys))
+
+
+def vision_layout(annotation) -> PageLayout:
+    """Blocos e palavras do `full_text_annotation` da Vision, com as caixas em frações da página"""
+    blocks = []
+    for page in annotation.pages:
+        width, height = page.width or 1, page.height or 1
+        for block in page.blocks:
+            words = []
+            for paragraph in block.paragraphs:
+                for word in paragraph.words:
+                    if not word.symbols:
+                        continue
+                    break_type = int(word.symbols[-1].property.detected_break.type_)
+                    words.append(LayoutWord(
+                        "".join(symbol.text for symbol in word.symbols),
+                        _vision_box(word.bounding_box, width, height),
+                        BREAK_SEPARATORS.get(break_type, "")
+                    ))
+            blocks.append(LayoutBlock(_vision_box(block.bounding_box, width, height), words))
+    return PageLayout(blocks)
+
+
+class VisionBackend(OCRBackend):
+    """OCR pelo Google Cloud Vision (TEXT_DETECTION), com o pool de clientes assíncronos"""
+    name = "vision"
+
+    def __init__(self, pool: VisionClientPool):
+        self.pool = pool
+
+    @staticmethod
+    def _to_result(response) -> OCRPageResult:
+        if response.error.message:
+            return OCRPageResult(
+                text="",
+                error=f"Erro na Vision API: {response.error.message}",
+                retryable=response.error.code in RETRYABLE_STATUS_CODES
+            )
+        # Respostas de arquivos PDF podem trazer o texto apenas em full_text_annotation
+        texts = response.text_annotations
+        return OCRPageResult(
+            text=texts[0].description if texts else response.full_text_annotation.text,
+            layout=vision_layout(response.full_text_annotation)
+        )
+
+    async def annotate_images(self, contents: List[bytes]) -> List[OCRPageResult]:
+        requests = [
+            vision.AnnotateImageRequest(
+                image=vision.Image(content=content),
+                features=[vision.Feature(type_=vision.Feature.Type.TEXT_DETECTION)]
+            )
+            for content in contents
+        ]
+        async with self.pool.client() as client:
+            response = await client.batch_annotate_images(requests=requests)
+        responses = list(response.responses)
+
+        if len(responses) != len(contents):
+            raise Exception(f"Vision API retornou {len(responses)} respostas para {len(contents)} imagens")
+
+        logger.info(f"📦 Vision API - Lote com {len(contents)} imagem(ns), {sum(len(c) for c in contents)} bytes")
+        return [self._to_result(r) for r in responses]
+
+    async def annotate_pdf(self, pdf_content: bytes, page_numbers: List[int]) -> Dict[int, OCRPageResult]:
+        try:
+            async with self.pool.client() as client:
+                responses = await annotate_pdf_pages(client, pdf_content, page_numbers)
+        except VisionFileError as e:
+            raise OCRCallError(str(e), retryable=e.code in RETRYABLE_STATUS_CODES)
+        return {page_number: self._to_result(r) for page_number, r in responses.items()}
+
+    def open(self):
+        self.pool.open()
+
+    async def close(self):
+        await self.pool.close()
+
+
+class FakeBackend(OCRBackend):
+    """
+    Backend simulado e determinístico, sem rede nem credenciais
+
+    Serve para testes de carga e profiling do pipeline real (renderização,
+    recorte, codificação e parsing). O texto e a ocorrência de erros dependem
+    apenas do conteúdo enviado, então a mesma entrada sempre gera a mesma saída.
+    Já os erros transitórios e as chamadas lentas (cauda de latência) são
+    sorteados a cada chamada, para exercitar as retentativas e o hedging.
+    O texto aceita os marcadores {hash}, {bytes} e {page} (página, só no modo nativo)
+    e é distribuído, uma linha por bloco, em FAKE_OCR_LAYOUT_BOX.
+    """
+    name = "fake"
+
+    def __init__(
+        self,
+        latency_ms: float = 200,
+        latency_per_image_ms: float = 0,
+        error_rate: float = 0.0,
+        text: Optional[str] = None,
+        seed: int = 0,
+        transient_error_rate: float = 0.0,
+        slow_rate: float = 0.0,
+        slow_ms: float = 0
+    ):
+        self.latency = max(0.0, latency_ms / 1000)
+        self.latency_per_image = max(0.0, latency_per_image_ms / 1000)
+        self.error_rate = min(max(error_rate, 0.0), 1.0)
+        self.text = text or FAKE_OCR_DEFAULT_TEXT
+        self.seed = seed
+        self.transient_error_rate = min(max(transient_error_rate, 0.0), 1.0)
+        self.slow_rate = min(max(slow_rate, 0.0), 1.0)
+        self.slow = max(0.0, slow_ms / 1000)
+        self._random = random.Random(seed)
+
+    async def _sleep(self, images: int):
+        latency = self.latency + self.latency_per_image * images
+        if self.slow_rate and self._random.random() < self.slow_rate:
+            latency += self.slow
+        await asyncio.sleep(latency)
+
+    def _result(self, content: bytes, page_number: int = 0) -> OCRPageResult:
+        if self.transient_error_rate and self._random.random() < self.transient_error_rate:
+            return OCRPageResult(text="", error="Erro transitório simulado pelo backend de OCR", retryable=True)
+        digest = hashlib.sha256(self.seed.to_bytes(8, "big") + content + page_number.to_bytes(4, "big")).hexdigest()
+        if int(digest[:8], 16) / 0xFFFFFFFF < self.error_rate:
+            return OCRPageResult(text="", error="Erro simulado pelo backend de OCR")
+        text = self.text.replace("{hash}", digest[:12]).replace("{bytes}", str(len(content))).replace("{page}", str(page_number))
+        return OCRPageResult(text=text, layout=self._layout(text))
+
+    @staticmethod
+    def _layout(text: str) -> PageLayout:
+        left, top, right, bottom = FAKE_OCR_LAYOUT_BOX
+        lines = [line.split() for line in text.splitlines() if line.strip()]
+        if not lines:
+            return PageLayout()
+        longest = max(len(" ".join(words)) for words in lines)
+        char_width = min(0.012, (right - left) / max(1, longest))
+        line_height = (bottom - top) / len(lines)
+        blocks = []
+        for index, words in enumerate(lines):
+            y_min, x = top + index * line_height, left
+            layout_words = []
+            for position, word in enumerate(words):
+                x_max = x + len(word) * char_width
+                separator = "\n" if position == len(words) - 1 else " "
+                layout_words.append(LayoutWord(word, (x, y_min, x_max, y_min + line_height * 0.8), separator))
+                x = x_max + char_width
+            blocks.append(LayoutBlock(union_box([word.box for word in layout_words]), layout_words))
+        return PageLayout(blocks)
+
+    async def annotate_images(self, contents: List[bytes]) -> List[OCRPageResult]:
+        await self._sleep(len(contents))
+        return [self._result(content) for content in contents]
+
+    async def annotate_pdf(self, pdf_content: bytes, page_numbers: List[int]) -> Dict[int, OCRPageResult]:
+        await self._sleep(len(page_numbers))
+        return {page_number: self._result(pdf_content, page_number) for page_number in page_numbers}
+
+
+def create_ocr_backend(name: str, settings, pool: Optional[VisionClientPool] = None) -> OCRBackend:
+    """Cria o backend de OCR configurado (`OCR_BACKEND`)"""
+    name = (name or "vision").strip().lower()
+    if name == "vision":
+        return VisionBackend(pool or VisionClientPool(settings.VISION_POOL_SIZE, settings.VISION_CHANNEL_MAX_CONCURRENT))
+    if name == "fake":
+        return FakeBackend(
+            latency_ms=settings.FAKE_OCR_LATENCY_MS,
+            latency_per_image_ms=settings.FAKE_OCR_LATENCY_PER_IMAGE_MS,
+            error_rate=settings.FAKE_OCR_ERROR_RATE,
+            text=settings.FAKE_OCR_TEXT,
+            seed=settings.FAKE_OCR_SEED,
+            transient_error_rate=settings.FAKE_OCR_TRANSIENT_ERROR_RATE,
+            slow_rate=settings.FAKE_OCR_SLOW_RATE,
+            slow_ms=settings.FAKE_OCR_SLOW_MS
+        )
+    raise ValueError(f"Backend de OCR inválido: '{name}'. Use: {', '.join(OCR_BACKENDS)}")
@@ -0,0 +1,187 @@
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Iterable, Optional, Sequence, Tuple
+
+logger = logging.getLogger("PDF_OCR_API")
+
+# Chaves por consulta `IN (...)` (limite de parâmetros das versões antigas do SQLite)
+SQLITE_MAX_PARAMS = 900
+
+
+class OCRCache:
+    """
+    Cache de resultados de OCR endereçado pelo conteúdo do documento
+
+    A chave combina o hash SHA-256 do PDF com a página, a região recortada,
+    o DPI, o modo de processamento, a codificação da imagem enviada e o backend de OCR. Há duas camadas:
+    - memória: LRU limitada pelo tamanho total (em bytes) dos valores
+    - disco: SQLite com expiração por TTL, que sobrevive a reinícios
+    Os valores devem ser serializáveis em JSON.
+
+    As operações podem esperar o disco e o lock do SQLite: no event loop,
+    devem ser chamadas numa thread (ex: `OCREngine.run`), de preferência
+    agrupadas por documento ou bloco (`get_many`, `set_many`).
+    """
+
+    def __init__(
+        self,
+        enabled: bool = True,
+        memory_max_bytes: int = 64 * 1024 * 1024,
+        disk_path: Optional[str] = None,
+        ttl_seconds: float = 7 * 24 * 3600
+    ):
+        self.enabled = enabled
+        self.memory_max_bytes = memory_max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._memory: "OrderedDict[str, Tuple[str, int]]" = OrderedDict()
+        self._memory_bytes = 0
+        self._lock = threading.Lock()
+        self._writes = 0
+        self._db: Optional[sqlite3.Connection] = None
+
+        if enabled and disk_path:
+            try:
+                Path(disk_path).parent.mkdir(parents=True, exist_ok=True)
+                self._db = sqlite3.connect(disk_path, check_same_thread=False, isolation_level=None)
+                self._db.execute("PRAGMA journal_mode=WAL")
+                self._db.execute(
+                    "CREATE TABLE IF NOT EXISTS ocr_cache ("
+                    "key TEXT PRIMARY KEY, value TEXT NOT NULL, created_at REAL NOT NULL)"
+                )
+                self._purge_expired()
+            except Exception as e:
+                logger.warning(f"⚠️ Cache em disco indisponível ({disk_path}): {e}")
+                self._db = None
+
+    @staticmethod
+    def document_hash(content: bytes) -> str:
+        """Hash do conteúdo do documento"""
+        return hashlib.sha256(content).hexdigest()
+
+    @staticmethod
+    def make_key(
+        doc_hash: str,
+        page_number: int,
+        mode: str,
+        region: Optional[Sequence[float]] = None,
+        dpi: Optional[int] = None,
+        encoding: Optional[str] = None,
+        backend: str = "vision"
+    ) -> str:
+        """Monta a chave de cache de uma página"""
+        region_key = ",".join(f"{v:.4f}" for v in region) if region else "full"
+        return f"{doc_hash}:p{page_number}:r{region_key}:d{dpi or 0}:m{mode}:e{encoding or 'none'}:b{backend}"
+
+    def get(self, key: str) -> Optional[dict]:
+        """Busca um resultado (memória e depois disco). Retorna None se não encontrado"""
+        return self.get_many([key]).get(key)
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, dict]:
+        """Busca vários resultados de uma vez (memória e depois uma consulta ao disco); só as chaves encontradas voltam"""
+        if not self.enabled:
+            return {}
+
+        found = {}
+        with self._lock:
+            missing = []
+            for key in dict.fromkeys(keys):
+                entry = self._memory.get(key)
+                if entry is not None:
+                    self._memory.move_to_end(key)
+                    found[key] = json.loads(entry[0])
+                else:
+                    missing.append(key)
+
+            if self._db is None or not missing:
+                return found
+
+            now = time.time()
+            expired = []
+            try:
+                for start in range(0, len(missing), SQLITE_MAX_PARAMS):
+                    chunk = missing[start:start + SQLITE_MAX_PARAMS]
+                    rows = self._db.execute(
+                        f"SELECT key, value, created_at FROM ocr_cache WHERE key IN ({','.join('?' * len(chunk))})", chunk
+                    ).fetchall()
+                    for key, raw, created_at in rows:
+                        if now - created_at > self.ttl_seconds:
+                            expired.append(key)
+                            continue
+                        # Promover para a camada em memória
+                        self._memory_put(key, raw)
+                        found[key] = json.loads(raw)
+                if expired:
+                    self._db.executemany("DELETE FROM ocr_cache WHERE key = ?", [(key,) for key in expired])
+            except Exception as e:
+                logger.warning(f"⚠️ Erro ao ler o cache em disco: {e}")
+        return found
+
+    def set(self, key: str, value: dict):
+        """Armazena um resultado nas duas camadas"""
+        self.set_many({key: value})
+
+    def set_many(self, values: Dict[str, dict]):
+        """Armazena vários resultados nas duas camadas (uma única transação no disco)"""
+        if not self.enabled or not values:
+            return
+
+        now = time.time()
+        rows = [(key, json.dumps(value, ensure_ascii=False), now) for key, value in values.items()]
+        with self._lock:
+            for key, raw, _ in rows:
+                self._memory_put(key, raw)
+
+            if self._db is None:
+                return
+            try:
+                self._db.execute("BEGIN")
+                try:
+                    self._db.executemany(
+                        "INSERT OR REPLACE INTO ocr_cache (key, value, created_at) VALUES (?, ?, ?)", rows
+                    )
+                    self._db.execute("COMMIT")
+                except Exception:
+                    self._db.execute("ROLLBACK")
+                    raise
+                previous = self._writes
+                self._writes += len(rows)
+                if self._writes // 500 != previous // 500:
+                    self._purge_expired()
+            except Exception as e:
+                logger.warning(f"⚠️ Erro ao gravar no cache em disco: {e}")
+
+    def _memory_put(self, key: str, raw: str):
+        size = len(raw.encode("utf-8"))
+        if size > self.memory_max_bytes:
+            return
+
+        previous = self._memory.pop(key, None)
+        if previous is not None:
+            self._memory_bytes -= previous[1]
+
+        self._memory[key] = (raw, size)
+        self._memory_bytes += size
+
+        # Remover os itens menos usados até caber no limite
+        while self._memory_bytes > self.memory_max_bytes:
+            _, (_, evicted_size) = self._memory.popitem(last=False)
+            self._memory_bytes -= evicted_size
+
+    def _purge_expired(self):
+        if self._db is not None:
+            self._db.execute(
+                "DELETE FROM ocr_cache WHERE created_at < ?", (time.time() - self.ttl_seconds,)
+            )
+
+    def close(self):
+        """Fecha a conexão com o cache em disco"""
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
@@ -0,0 +1,34 @@
+import asyncio
+import contextvars
+import functools
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable
+
+logger = logging.getLogger("PDF_OCR_API")
+
+
+class OCREngine:
+    """
+    Pool de threads para o trabalho bloqueante do processamento de páginas
+
+    Executa funções bloqueantes (análise do PDF, camada de texto, codificação,
+    renderização sem o pool de processos) fora do event loop. O limite de páginas em
+    processamento no processo é do controle de admissão (`ADMISSION_MAX_PAGES`).
+    """
+
+    def __init__(self, max_workers: int):
+        self.max_workers = max_workers
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ocr-worker")
+
+    async def run(self, func: Callable, *args, **kwargs) -> Any:
+        """Executa uma função bloqueante no pool"""
+        loop = asyncio.get_running_loop()
+        # Copiar o contexto (como asyncio.to_thread) para as métricas saberem a qual requisição a chamada pertence
+        context = contextvars.copy_context()
+        return await loop.run_in_executor(self.executor, functools.partial(context.run, func, *args, **kwargs))
+
+    def shutdown(self):
+        """Encerra o pool de threads"""
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        logger.info("🧹 Motor de OCR encerrado")
@@ -0,0 +1,118 @@
+from dataclasses import dataclass, field
+from typing import Iterator, List, Optional, Sequence, Tuple
+
+# Caixa em frações da página: (left, top, right, bottom)
+Box = Tuple[float, float, float, float]
+
+
+@dataclass
+class LayoutWord:
+    """Palavra reconhecida pelo OCR, com a caixa em frações da página"""
+    text: str
+    box: Box
+    separator: str = " "  # O que vem depois da palavra: "", " ", "\n" ou "-\n" (hifenização)
+
+
+@dataclass
+class LayoutBlock:
+    """Bloco de texto do OCR (coluna, parágrafo de tabela...), com as palavras na ordem de leitura"""
+    box: Box
+    words: List[LayoutWord] = field(default_factory=list)
+
+
+def _inside(word: LayoutWord, box: Sequence[float]) -> bool:
+    center_x = (word.box[0] + word.box[2]) / 2
+    center_y = (word.box[1] + word.box[3]) / 2
+    return box[0] <= center_x <= box[2] and box[1] <= center_y <= box[3]
+
+
+@dataclass
+class PageLayout:
+    """
+    Geometria do OCR de uma página: blocos e palavras com as caixas
+
+    Guardada junto com o texto da página no cache, permite extrair o texto de
+    qualquer região depois do OCR, sem recortar a imagem nem chamar o OCR de
+    novo: uma única chamada por página atende a página inteira e todas as áreas.
+    """
+    blocks: List[LayoutBlock] = field(default_factory=list)
+
+    def words(self) -> Iterator[LayoutWord]:
+        for block in self.blocks:
+            yield from block.words
+
+    def text(self, box: Optional[Sequence[float]] = None) -> str:
+        """
+        Texto da página na ordem de leitura do OCR
+
+        Com `box` (frações da página: left, top, right, bottom), apenas as
+        palavras cujo centro está dentro da região são incluídas, como no
+        recorte feito antes do OCR.
+        """
+        parts = []
+        for block in self.blocks:
+            if box is not None and (
+                block.box[2] < box[0] or block.box[0] > box[2] or block.box[3] < box[1] or block.box[1] > box[3]
+            ):
+                continue  # Bloco inteiro fora da região
+            for word in block.words:
+                if box is None or _inside(word, box):
+                    parts.append(word.text)
+                    parts.append(word.separator)
+            if parts and not parts[-1].endswith("\n"):
+                parts[-1] = "\n"  # Fim do bloco
+        return "".join(parts).strip()
+
+    def to_page(self, region: Sequence[float]) -> "PageLayout":
+        """
+        Layout do OCR de uma região (caixas em frações da região) com as caixas
+        em frações da página inteira, para extrair as áreas como de uma página
+        """
+        left, top, right, bottom = region
+
+        def convert(box: Sequence[float]) -> Box:
+            return (
+                left + box[0] * (right - left),
+                top + box[1] * (bottom - top),
+                left + box[2] * (right - left),
+                top + box[3] * (bottom - top)
+            )
+
+        return PageLayout([
+            LayoutBlock(convert(block.box), [LayoutWord(word.text, convert(word.box), word.separator) for word in block.words])
+            for block in self.blocks
+        ])
+
+    def to_dict(self) -> dict:
+        """Formato compacto, serializável em JSON, para o cache"""
+        return {
+            "blocks": [
+                [
+                    [round(v, 4) for v in block.box],
+                    [[word.text, *(round(v, 4) for v in word.box), word.separator] for word in block.words]
+                ]
+                for block in self.blocks
+            ]
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "PageLayout":
+        return cls([
+            LayoutBlock(
+                tuple(box),
+                [LayoutWord(text, (x_min, y_min, x_max, y_max), separator) for text, x_min, y_min, x_max, y_max, separator in words]
+            )
+            for box, words in data.get("blocks", [])
+        ])
+
+
+def union_box(boxes: Sequence[Box]) -> Box:
+    """Menor caixa que contém todas as caixas"""
+    if not boxes:
+        return (0.0, 0.0, 0.0, 0.0)
+    return (
+        min(box[0] for box in boxes),
+        min(box[1] for box in boxes),
+        max(box[2] for box in boxes),
+        max(box[3] for box in boxes)
+    )
@@ -0,0 +1,318 @@
+import asyncio
+import logging
+import random
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Deque, Iterator, List, Optional, TypeVar
+
+from google.api_core import exceptions as api_exceptions
+
+from ocr_backends import OCRCallError
+
+logger = logging.getLogger("PDF_OCR_API")
+
+T = TypeVar("T")
+
+# Exceções de chamada que indicam falha transitória (vale tentar de novo)
+RETRYABLE_EXCEPTIONS = (
+    api_exceptions.ServiceUnavailable,
+    api_exceptions.DeadlineExceeded,
+    api_exceptions.TooManyRequests,  # Inclui ResourceExhausted (cota)
+    api_exceptions.InternalServerError,
+    api_exceptions.Aborted,
+    api_exceptions.BadGateway,
+    api_exceptions.GatewayTimeout,
+    ConnectionError,
+    asyncio.TimeoutError,
+)
+
+
+def is_retryable_error(error: BaseException) -> bool:
+    """Indica se a falha da chamada é transitória"""
+    if isinstance(error, OCRCallError):
+        return error.retryable
+    return isinstance(error, RETRYABLE_EXCEPTIONS)
+
+
+class OCRDeadlineExceeded(Exception):
+    """Prazo da página ou da requisição esgotado antes de o OCR responder"""
+
+
+@dataclass
+class CallStats:
+    """Contadores das chamadas de OCR de uma requisição"""
+    retries: int = 0   # Novas tentativas após falha transitória ou tempo esgotado
+    hedges: int = 0    # Chamadas duplicadas enviadas por demora acima do percentil
+    timeouts: int = 0  # Tentativas que estouraram o tempo limite
+
+
+# Contadores e prazo (loop.time() absoluto) da requisição em andamento
+_stats: ContextVar[Optional[CallStats]] = ContextVar("ocr_call_stats", default=None)
+_deadline: ContextVar[Optional[float]] = ContextVar("ocr_request_deadline", default=None)
+_unbounded: ContextVar[bool] = ContextVar("ocr_request_unbounded", default=False)
+# Sinal de envio da tentativa em andamento (chamadas que passam por fila ou cota)
+_dispatch: ContextVar[Optional[asyncio.Future]] = ContextVar("ocr_attempt_dispatch", default=None)
+
+
+def current_call_stats() -> CallStats:
+    """Contadores da requisição em andamento (um objeto avulso fora de `OCRResilience.scope`)"""
+    return _stats.get() or CallStats()
+
+
+@contextmanager
+def without_request_deadline() -> Iterator[None]:
+    """Requisições iniciadas dentro do bloco não têm prazo total (ex: jobs); o prazo por página continua valendo"""
+    token = _unbounded.set(True)
+    try:
+        yield
+    finally:
+        _unbounded.reset(token)
+
+
+def dispatch_signal() -> Optional[asyncio.Future]:
+    """Sinal de envio da tentativa em andamento (None fora de uma tentativa com `queued`)"""
+    return _dispatch.get()
+
+
+def mark_dispatched(signal: Optional[asyncio.Future] = None):
+    """
+    Marca o envio da chamada: a partir daqui o tempo conta para a tentativa
+
+    Sem `signal`, marca a tentativa em andamento. A espera na fila e na cota
+    antes do envio não conta no `call_timeout` nem na latência registrada.
+    """
+    signal = signal if signal is not None else _dispatch.get()
+    if signal is not None and not signal.done():
+        signal.set_result(asyncio.get_running_loop().time())
+
+
+class LatencyWindow:
+    """Janela deslizante das últimas latências bem-sucedidas, para estimar percentis"""
+
+    def __init__(self, size: int = 200, min_samples: int = 20):
+        self.min_samples = max(1, min_samples)
+        self._samples: Deque[float] = deque(maxlen=max(self.min_samples, size))
+
+    def record(self, seconds: float):
+        self._samples.append(seconds)
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Percentil `q` (0 a 1) das latências, ou None com poucas amostras"""
+        if len(self._samples) < self.min_samples:
+            return None
+        ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class OCRResilience:
+    """
+    Retentativas, prazos e hedging das chamadas de OCR
+
+    Cada chamada (`call`) é uma página (ou bloco de páginas no modo nativo):
+    - falhas transitórias (exceção ou resultado marcado como `retryable`) são
+      tentadas de novo até `max_attempts` vezes, com espera exponencial e
+      jitter ("full jitter": sorteio entre 0 e `backoff` * 2^tentativa);
+    - cada tentativa tem no máximo `call_timeout` segundos, e todas as
+      tentativas de uma página cabem em `page_deadline` segundos e no prazo
+      total da requisição (`request_deadline`, definido em `scope`);
+    - com `queued`, a espera na fila e na cota antes do envio (`mark_dispatched`)
+      fica fora do `call_timeout` e só é limitada pelos prazos;
+    - com `hedge` ativo, uma tentativa que passa do percentil `hedge_quantile`
+      das latências recentes ganha uma chamada duplicada; vale a primeira
+      resposta e a outra é cancelada.
+    Prazos 0 desativam o respectivo limite.
+    """
+
+    def __init__(
+        self,
+        max_attempts: int = 3,
+        backoff_ms: float = 200,
+        backoff_max_ms: float = 5000,
+        call_timeout: float = 30.0,
+        page_deadline: float = 90.0,
+        request_deadline: float = 300.0,
+        hedge: bool = False,
+        hedge_quantile: float = 0.95,
+        hedge_min_samples: int = 20,
+        hedge_min_delay_ms: float = 50,
+        latency_window: int = 200
+    ):
+        self.max_attempts = max(1, max_attempts)
+        self.backoff = max(0.0, backoff_ms / 1000)
+        self.backoff_max = max(self.backoff, backoff_max_ms / 1000)
+        self.call_timeout = max(0.0, call_timeout)
+        self.page_deadline = max(0.0, page_deadline)
+        self.request_deadline = max(0.0, request_deadline)
+        self.hedge = hedge
+        self.hedge_quantile = min(max(hedge_quantile, 0.5), 0.999)
+        self.hedge_min_delay = max(0.0, hedge_min_delay_ms / 1000)
+        self.latency = LatencyWindow(latency_window, hedge_min_samples)
+        self.totals = CallStats()
+
+    @contextmanager
+    def scope(self) -> Iterator[CallStats]:
+        """Zera os contadores e define o prazo total de uma requisição"""
+        deadline = None
+        if self.request_deadline and not _unbounded.get():
+            deadline = asyncio.get_running_loop().time() + self.request_deadline
+        stats = CallStats()
+        stats_token = _stats.set(stats)
+        deadline_token = _deadline.set(deadline)
+        try:
+            yield stats
+        finally:
+            _deadline.reset(deadline_token)
+            _stats.reset(stats_token)
+
+    def hedge_delay(self) -> Optional[float]:
+        """Espera antes de duplicar uma chamada, ou None (hedging desativado ou poucas amostras)"""
+        if not self.hedge:
+            return None
+        quantile = self.latency.quantile(self.hedge_quantile)
+        return None if quantile is None else max(quantile, self.hedge_min_delay)
+
+    def _backoff_delay(self, attempt: int) -> float:
+        return random.uniform(0, min(self.backoff_max, self.backoff * (2 ** (attempt - 1))))
+
+    def _count(self, field: str, stats: CallStats):
+        setattr(stats, field, getattr(stats, field) + 1)
+        setattr(self.totals, field, getattr(self.totals, field) + 1)
+
+    async def call(
+        self,
+        operation: Callable[[], Awaitable[T]],
+        retry_result: Optional[Callable[[T], bool]] = None,
+        label: str = "OCR",
+        queued: bool = False
+    ) -> T:
+        """
+        Executa `operation` (uma nova chamada a cada tentativa) com retentativas, prazos e hedging
+
+        `retry_result` indica se um resultado sem exceção ainda assim deve ser
+        tentado de novo (ex: erro transitório de uma imagem). Esgotadas as
+        tentativas, devolve o último resultado ou relança a última exceção;
+        sem tempo para terminar, lança `OCRDeadlineExceeded`. Com `queued`, a
+        operação sinaliza o envio com `mark_dispatched` e o tempo da tentativa
+        só começa a contar a partir dele.
+        """
+        loop = asyncio.get_running_loop()
+        stats = current_call_stats()
+        limits = [deadline for deadline in (
+            _deadline.get(),
+            loop.time() + self.page_deadline if self.page_deadline else None
+        ) if deadline is not None]
+        deadline = min(limits) if limits else None
+
+        attempt = 0
+        while True:
+            attempt += 1
+            if deadline is not None and deadline <= loop.time():
+                raise OCRDeadlineExceeded(f"Prazo esgotado após {attempt - 1} tentativa(s)")
+
+            try:
+                result = await self._attempt(operation, deadline, stats, queued)
+            except Exception as e:
+                if isinstance(e, asyncio.TimeoutError):
+                    self._count("timeouts", stats)
+                    if deadline is not None and loop.time() >= deadline:
+                        raise OCRDeadlineExceeded(f"Prazo esgotado após {attempt} tentativa(s)")
+                if not is_retryable_error(e) or attempt >= self.max_attempts:
+                    if isinstance(e, asyncio.TimeoutError):
+                        raise OCRDeadlineExceeded(f"Sem resposta após {attempt} tentativa(s)")
+                    raise
+                reason = "tempo esgotado" if isinstance(e, asyncio.TimeoutError) else str(e)
+                result = None
+            else:
+                if retry_result is None or not retry_result(result) or attempt >= self.max_attempts:
+                    return result
+                reason = "erro transitório no resultado"
+
+            delay = self._backoff_delay(attempt)
+            if deadline is not None and loop.time() + delay >= deadline:
+                # Não há tempo para outra tentativa: devolver o que houver
+                if result is not None:
+                    return result
+                raise OCRDeadlineExceeded(f"Prazo esgotado após {attempt} tentativa(s)")
+            self._count("retries", stats)
+            logger.warning(f"🔁 {label} - Tentativa {attempt}/{self.max_attempts} falhou ({reason}); nova tentativa em {delay:.2f}s")
+            await asyncio.sleep(delay)
+
+    async def _timed(self, operation: Callable[[], Awaitable[T]], signal: Optional[asyncio.Future]) -> T:
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        if signal is not None:
+            # Contexto próprio da tarefa: a operação encontra o sinal em `mark_dispatched`
+            _dispatch.set(signal)
+        result = await operation()
+        if signal is not None and signal.done():
+            start = signal.result()
+        self.latency.record(loop.time() - start)
+        return result
+
+    async def _attempt(
+        self,
+        operation: Callable[[], Awaitable[T]],
+        call_deadline: Optional[float],
+        stats: CallStats,
+        queued: bool = False
+    ) -> T:
+        """Uma tentativa, duplicada se passar do percentil de latência; vale a primeira resposta bem-sucedida"""
+        loop = asyncio.get_running_loop()
+        signal = loop.create_future() if queued else None
+        tasks: List[asyncio.Future] = [asyncio.ensure_future(self._timed(operation, signal))]
+        try:
+            if signal is not None:
+                # Fila e cota: só os prazos da página e da requisição limitam a espera pelo envio
+                wait = None if call_deadline is None else max(0.0, call_deadline - loop.time())
+                await asyncio.wait([signal, tasks[0]], timeout=wait, return_when=asyncio.FIRST_COMPLETED)
+                if not signal.done() and not tasks[0].done():
+                    raise asyncio.TimeoutError()
+
+            timeouts = [t for t in (
+                self.call_timeout or None,
+                None if call_deadline is None else call_deadline - loop.time()
+            ) if t is not None]
+            timeout = min(timeouts) if timeouts else None
+            deadline = None if timeout is None else loop.time() + timeout
+
+            delay = self.hedge_delay()
+            if delay is not None and (timeout is None or delay < timeout):
+                done, _ = await asyncio.wait(tasks, timeout=delay)
+                if not done:
+                    self._count("hedges", stats)
+                    tasks.append(asyncio.ensure_future(self._timed(operation, loop.create_future() if queued else None)))
+
+            pending = set(tasks)
+            error: Optional[BaseException] = None
+            while pending:
+                remaining = None if deadline is None else max(0.0, deadline - loop.time())
+                done, pending = await asyncio.wait(pending, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    raise asyncio.TimeoutError()
+                # Consultar todas as concluídas (evita exceções nunca recuperadas)
+                errors = [task.exception() for task in done]
+                for task, task_error in zip(done, errors):
+                    if task_error is None:
+                        return task.result()
+                error = errors[0]
+            raise error
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+    def snapshot(self) -> dict:
+        p95 = self.latency.quantile(0.95)
+        return {
+            "retries": self.totals.retries,
+            "hedges": self.totals.hedges,
+            "timeouts": self.totals.timeouts,
+            "latency_samples": len(self.latency),
+            "latency_p95": round(p95, 3) if p95 is not None else None,
+            "hedge_enabled": self.hedge
+        }
@@ -0,0 +1,123 @@
+import os
+import re
+import subprocess
+import tempfile
+from dataclasses import dataclass, field
+from typing import List, Optional, Tuple
+
+# Limite de páginas pedido ao pdfinfo (o pdfinfo limita ao total real do documento)
+PDFINFO_MAX_PAGES = 100000
+
+_PAGES_PATTERN = re.compile(r"^Pages:\s+(\d+)", re.MULTILINE)
+_PAGE_SIZE_PATTERN = re.compile(r"^Page\s+(\d+)\s+size:\s+([\d.]+)\s+x\s+([\d.]+)", re.MULTILINE)
+_PAGE_ROT_PATTERN = re.compile(r"^Page\s+(\d+)\s+rot:\s+(\d+)", re.MULTILINE)
+
+
+class PdfInspectionError(Exception):
+    """PDF inválido, corrompido ou protegido por senha"""
+
+
+class PdfSliceError(Exception):
+    """Falha ao separar páginas do PDF"""
+
+
+@dataclass
+class PdfInfo:
+    """Informações estruturais do PDF obtidas sem rasterização"""
+    page_count: int
+    page_sizes: List[Tuple[float, float]] = field(default_factory=list)  # (largura, altura) em pontos, já rotacionadas
+
+    def page_size(self, page_number: int) -> Optional[Tuple[float, float]]:
+        """Tamanho (em pontos) da página `page_number` (base 1), se conhecido"""
+        if 1 <= page_number <= len(self.page_sizes):
+            return self.page_sizes[page_number - 1]
+        return None
+
+
+def parse_pdfinfo_output(output: str) -> PdfInfo:
+    """Converte a saída de `pdfinfo -f 1 -l N` em PdfInfo"""
+    pages_match = _PAGES_PATTERN.search(output)
+    if not pages_match:
+        raise PdfInspectionError("Não foi possível obter o número de páginas do PDF")
+
+    page_count = int(pages_match.group(1))
+
+    rotations = {int(num): int(rot) for num, rot in _PAGE_ROT_PATTERN.findall(output)}
+
+    sizes = {}
+    for num, width, height in _PAGE_SIZE_PATTERN.findall(output):
+        page_number = int(num)
+        width, height = float(width), float(height)
+        # Páginas rotacionadas em 90/270 graus são renderizadas com largura e altura trocadas
+        if rotations.get(page_number, 0) % 180 == 90:
+            width, height = height, width
+        sizes[page_number] = (width, height)
+
+    page_sizes = [sizes[n] for n in range(1, page_count + 1) if n in sizes]
+    if len(page_sizes) != page_count:
+        page_sizes = []
+
+    return PdfInfo(page_count=page_count, page_sizes=page_sizes)
+
+
+def inspect_pdf_file(pdf_path: str, timeout: Optional[float] = 30) -> PdfInfo:
+    """
+    Lê número de páginas e tamanhos da estrutura do PDF (via pdfinfo)
+
+    PDFs com senha de abertura são recusados aqui (o pdfinfo não os abre); os
+    que só restringem permissões (senha do proprietário) são renderizados normalmente.
+    """
+    command = ["pdfinfo", "-f", "1", "-l", str(PDFINFO_MAX_PAGES), pdf_path]
+    try:
+        proc = subprocess.run(command, capture_output=True, timeout=timeout)
+    except FileNotFoundError:
+        raise PdfInspectionError("pdfinfo não encontrado. O Poppler está instalado e no PATH?")
+    except subprocess.TimeoutExpired:
+        raise PdfInspectionError("Tempo esgotado ao analisar o PDF")
+
+    if proc.returncode != 0:
+        error = proc.stderr.decode("utf8", "ignore").strip()
+        if "password" in error.lower():
+            raise PdfInspectionError("PDF protegido por senha")
+        raise PdfInspectionError(error or "PDF inválido ou corrompido")
+
+    info = parse_pdfinfo_output(proc.stdout.decode("utf8", "ignore"))
+    if info.page_count < 1:
+        raise PdfInspectionError("PDF sem páginas")
+    return info
+
+
+def _run_poppler(command: List[str], timeout: Optional[float]):
+    try:
+        proc = subprocess.run(command, capture_output=True, timeout=timeout)
+    except FileNotFoundError:
+        raise PdfSliceError(f"{command[0]} não encontrado. O Poppler está instalado e no PATH?")
+    except subprocess.TimeoutExpired:
+        raise PdfSliceError(f"Tempo esgotado no {command[0]}")
+    if proc.returncode != 0:
+        error = proc.stderr.decode("utf8", "ignore").strip()
+        raise PdfSliceError(error or f"{command[0]} terminou com código {proc.returncode}")
+
+
+def slice_pdf(pdf_path: str, page_numbers: List[int], timeout: Optional[float] = 60) -> bytes:
+    """
+    Novo PDF só com as páginas (base 1) pedidas, na ordem da lista (via pdfseparate/pdfunite)
+
+    A página `page_numbers[i]` passa a ser a página i + 1 do resultado.
+    """
+    if not page_numbers:
+        raise PdfSliceError("Nenhuma página para separar")
+    with tempfile.TemporaryDirectory(prefix="pdf_slice_") as directory:
+        pattern = os.path.join(directory, "page-%d.pdf")
+        _run_poppler(
+            ["pdfseparate", "-f", str(min(page_numbers)), "-l", str(max(page_numbers)), pdf_path, pattern],
+            timeout
+        )
+        pages = [pattern % page_number for page_number in page_numbers]
+        if len(pages) == 1:
+            output = pages[0]
+        else:
+            output = os.path.join(directory, "slice.pdf")
+            _run_poppler(["pdfunite", *pages, output], timeout)
+        with open(output, "rb") as f:
+            return f.read()
@@ -0,0 +1,228 @@
+import subprocess
+import tempfile
+from typing import BinaryIO, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from PIL import Image
+
+# Dimensões máximas (em pixels) de uma área renderizada para o OCR
+MAX_RENDER_WIDTH = 2000
+MAX_RENDER_HEIGHT = 3000
+
+# Modo PIL de cada formato PNM gerado pelo pdftoppm
+_PNM_MODES = {b"P4": "1", b"P5": "L", b"P6": "RGB"}
+
+
+class PdfRenderError(Exception):
+    """Falha ao rasterizar uma página do PDF"""
+
+
+def region_to_pixels(
+    page_size: Tuple[float, float],
+    box: Sequence[float],
+    dpi: float
+) -> Tuple[int, int, int, int]:
+    """
+    Converte uma região em frações da página (left, top, right, bottom)
+    no retângulo (x, y, largura, altura) em pixels usado pelo pdftoppm
+    """
+    page_width_px = page_size[0] * dpi / 72
+    page_height_px = page_size[1] * dpi / 72
+
+    left = int(page_width_px * box[0])
+    top = int(page_height_px * box[1])
+    right = int(page_width_px * box[2])
+    bottom = int(page_height_px * box[3])
+
+    return left, top, max(1, right - left), max(1, bottom - top)
+
+
+def region_dpi(
+    page_size: Tuple[float, float],
+    box: Sequence[float],
+    dpi: float,
+    max_width: int = MAX_RENDER_WIDTH,
+    max_height: int = MAX_RENDER_HEIGHT
+) -> float:
+    """Reduz o DPI se a região renderizada ultrapassar as dimensões máximas"""
+    width_px = page_size[0] * (box[2] - box[0]) * dpi / 72
+    height_px = page_size[1] * (box[3] - box[1]) * dpi / 72
+    ratio = min(1.0, max_width / max(width_px, 1), max_height / max(height_px, 1))
+    return dpi * ratio
+
+
+def estimate_render_bytes(
+    page_size: Tuple[float, float],
+    dpi: float,
+    box: Optional[Sequence[float]] = None,
+    bytes_per_pixel: int = 3
+) -> int:
+    """Memória (bytes) da imagem RGB da página, ou só da região `box`, renderizada em `dpi`"""
+    if box is None:
+        width, height = page_size
+    else:
+        dpi = region_dpi(page_size, box, dpi)
+        width = page_size[0] * (box[2] - box[0])
+        height = page_size[1] * (box[3] - box[1])
+    return int(width * dpi / 72) * int(height * dpi / 72) * bytes_per_pixel
+
+
+def _read_token(stream: BinaryIO) -> bytes:
+    """Lê um campo do cabeçalho PNM (consome exatamente um separador no final)"""
+    token = b""
+    while True:
+        char = stream.read(1)
+        if not char:
+            return token
+        if char == b"#" and not token:
+            stream.readline()
+            continue
+        if char.isspace():
+            if token:
+                return token
+            continue
+        token += char
+
+
+def _read_exact(stream: BinaryIO, size: int) -> bytes:
+    chunks = []
+    remaining = size
+    while remaining > 0:
+        chunk = stream.read(remaining)
+        if not chunk:
+            raise PdfRenderError("Saída do pdftoppm terminou no meio de uma página")
+        chunks.append(chunk)
+        remaining -= len(chunk)
+    return b"".join(chunks)
+
+
+def read_pnm_image(stream: BinaryIO) -> Optional[Image.Image]:
+    """Lê a próxima imagem PNM (P4/P5/P6) do fluxo. Retorna None no fim do fluxo"""
+    magic = _read_token(stream)
+    if not magic:
+        return None
+    if magic not in _PNM_MODES:
+        raise PdfRenderError(f"Formato de imagem inesperado na saída do pdftoppm: {magic!r}")
+
+    width = int(_read_token(stream))
+    height = int(_read_token(stream))
+
+    if magic == b"P4":
+        data = _read_exact(stream, (width + 7) // 8 * height)
+        # No PBM o bit 1 é preto; o decodificador "1;I" inverte para o padrão do PIL
+        return Image.frombytes("1", (width, height), data, "raw", "1;I")
+
+    if int(_read_token(stream)) > 255:
+        raise PdfRenderError("Imagens PNM de 16 bits não são suportadas")
+
+    channels = 3 if magic == b"P6" else 1
+    data = _read_exact(stream, width * height * channels)
+    return Image.frombytes(_PNM_MODES[magic], (width, height), data)
+
+
+def _render_args(
+    page_number: int,
+    dpi: float,
+    page_sizes: Optional[Dict[int, Tuple[float, float]]],
+    box: Optional[Sequence[float]]
+) -> Tuple:
+    """Parâmetros do pdftoppm para uma página: (dpi, x, y, largura, altura) ou apenas (dpi,)"""
+    page_size = page_sizes.get(page_number) if page_sizes else None
+    if box is None or page_size is None:
+        return (round(dpi, 2),)
+
+    page_dpi = round(region_dpi(page_size, box, dpi), 2)
+    return (page_dpi,) + region_to_pixels(page_size, box, page_dpi)
+
+
+def _group_runs(page_numbers: List[int], args: Dict[int, Tuple]) -> List[List[int]]:
+    """Agrupa páginas consecutivas com os mesmos parâmetros de renderização (um pdftoppm por bloco)"""
+    runs: List[List[int]] = []
+    for page_number in page_numbers:
+        if runs and page_number == runs[-1][-1] + 1 and args[page_number] == args[runs[-1][-1]]:
+            runs[-1].append(page_number)
+        else:
+            runs.append([page_number])
+    return runs
+
+
+def _stream_run(pdf_path: str, run: List[int], args: Tuple, timeout: Optional[float]) -> Iterator[Image.Image]:
+    """Executa um único pdftoppm para o bloco de páginas e entrega as imagens conforme são geradas"""
+    command = ["pdftoppm", "-f", str(run[0]), "-l", str(run[-1]), "-r", str(args[0])]
+    if len(args) > 1:
+        x, y, width, height = args[1:]
+        command += ["-x", str(x), "-y", str(y), "-W", str(width), "-H", str(height)]
+    command.append(pdf_path)
+
+    with tempfile.TemporaryFile() as stderr:
+        try:
+            proc = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=stderr)
+        except FileNotFoundError:
+            raise PdfRenderError("pdftoppm não encontrado. O Poppler está instalado e no PATH?")
+
+        try:
+            for _ in run:
+                image = read_pnm_image(proc.stdout)
+                if image is None:
+                    break
+                yield image
+
+            proc.stdout.close()
+            returncode = proc.wait(timeout=timeout)
+            if returncode != 0:
+                stderr.seek(0)
+                error = stderr.read().decode("utf8", "ignore").strip()
+                raise PdfRenderError(error or f"pdftoppm terminou com código {returncode}")
+        finally:
+            if proc.poll() is None:
+                proc.kill()
+                proc.wait()
+
+
+def stream_pages(
+    pdf_path: str,
+    page_numbers: List[int],
+    dpi: float,
+    page_sizes: Optional[Dict[int, Tuple[float, float]]] = None,
+    box: Optional[Sequence[float]] = None,
+    timeout: Optional[float] = 120
+) -> Iterator[Tuple[int, Optional[Image.Image]]]:
+    """
+    Rasteriza as páginas (base 1) como um gerador, uma de cada vez
+
+    O pdftoppm é executado uma única vez para cada bloco de páginas
+    consecutivas, e não uma vez por página. Cada página é entregue assim que
+    sai do processo. O pipe limita o quanto o renderizador pode se adiantar,
+    então a memória continua sendo a de uma página por vez.
+
+    Com `box` (frações da página), apenas a região de interesse é
+    rasterizada, com o DPI reduzido se passar de MAX_RENDER_WIDTH x
+    MAX_RENDER_HEIGHT. A região depende do tamanho da página: as páginas
+    ausentes de `page_sizes` são renderizadas inteiras.
+
+    Uma página que não pode ser renderizada é entregue como (página, None).
+    A renderização continua a partir da página seguinte.
+    """
+    page_numbers = sorted(set(page_numbers))
+    args = {n: _render_args(n, dpi, page_sizes, box) for n in page_numbers}
+
+    pending = _group_runs(page_numbers, args)
+    while pending:
+        run = pending.pop(0)
+        delivered = 0
+        run_images = _stream_run(pdf_path, run, args[run[0]], timeout)
+        try:
+            for image in run_images:
+                yield run[delivered], image
+                delivered += 1
+            if delivered < len(run):
+                raise PdfRenderError("pdftoppm gerou menos páginas que o esperado")
+        except PdfRenderError:
+            if delivered >= len(run):
+                continue
+            # Página com falha: entregar vazia e retomar a partir da próxima
+            yield run[delivered], None
+            if delivered + 1 < len(run):
+                pending.insert(0, run[delivered + 1:])
+        finally:
+            run_images.close()
+
@@ -0,0 +1,118 @@
+import html
+import re
+import subprocess
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence
+
+_PAGE_PATTERN = re.compile(r'<page width="([\d.]+)" height="([\d.]+)">(.*?)</page>', re.DOTALL)
+_WORD_PATTERN = re.compile(
+    r'<word xMin="([\d.-]+)" yMin="([\d.-]+)" xMax="([\d.-]+)" yMax="([\d.-]+)">(.*?)</word>',
+    re.DOTALL
+)
+
+
+class PdfTextError(Exception):
+    """Falha ao ler a camada de texto do PDF"""
+
+
+@dataclass
+class TextWord:
+    """Palavra da camada de texto, com a caixa em pontos"""
+    text: str
+    x_min: float
+    y_min: float
+    x_max: float
+    y_max: float
+
+
+@dataclass
+class PageTextLayer:
+    """Camada de texto embutida de uma página"""
+    page_number: int
+    width: float
+    height: float
+    words: List[TextWord] = field(default_factory=list)
+
+    def text(self, box: Optional[Sequence[float]] = None) -> str:
+        """
+        Texto da página na ordem de leitura do PDF
+
+        Com `box` (frações da página: left, top, right, bottom), apenas as
+        palavras cujo centro está dentro da região são incluídas, como no
+        recorte feito antes do OCR.
+        """
+        if box is None:
+            return " ".join(word.text for word in self.words)
+
+        left, top = box[0] * self.width, box[1] * self.height
+        right, bottom = box[2] * self.width, box[3] * self.height
+        return " ".join(
+            word.text for word in self.words
+            if left <= (word.x_min + word.x_max) / 2 <= right and top <= (word.y_min + word.y_max) / 2 <= bottom
+        )
+
+
+def is_usable_text(text: str, min_chars: int = 20, min_alnum_ratio: float = 0.5) -> bool:
+    """
+    Avalia se o texto extraído da camada de texto pode substituir o OCR
+
+    Páginas escaneadas não têm texto (ou têm só alguns caracteres soltos);
+    fontes sem mapeamento Unicode produzem caracteres de substituição ou
+    símbolos. Nesses casos a página segue para o OCR.
+    """
+    chars = [char for char in text if not char.isspace()]
+    if len(chars) < min_chars:
+        return False
+    if "�" in text:
+        return False
+    alnum = sum(1 for char in chars if char.isalnum())
+    return alnum / len(chars) >= min_alnum_ratio
+
+
+def parse_bbox_output(output: str, first_page: int = 1) -> List[PageTextLayer]:
+    """Converte a saída de `pdftotext -bbox` nas camadas de texto das páginas"""
+    pages = []
+    for index, (width, height, body) in enumerate(_PAGE_PATTERN.findall(output)):
+        words = [
+            TextWord(html.unescape(text), float(x_min), float(y_min), float(x_max), float(y_max))
+            for x_min, y_min, x_max, y_max, text in _WORD_PATTERN.findall(body)
+        ]
+        pages.append(PageTextLayer(first_page + index, float(width), float(height), words))
+    return pages
+
+
+def extract_text_layer(
+    pdf_path: str,
+    page_numbers: List[int],
+    timeout: Optional[float] = 60
+) -> Dict[int, PageTextLayer]:
+    """
+    Lê a camada de texto (com a caixa de cada palavra) das páginas (base 1)
+
+    Um único pdftotext cobre o intervalo entre a menor e a maior página pedida.
+
+    Returns:
+        Dicionário {número da página: camada de texto}
+    """
+    if not page_numbers:
+        return {}
+
+    first, last = min(page_numbers), max(page_numbers)
+    command = ["pdftotext", "-bbox", "-enc", "UTF-8", "-f", str(first), "-l", str(last), pdf_path, "-"]
+    try:
+        proc = subprocess.run(command, capture_output=True, timeout=timeout)
+    except FileNotFoundError:
+        raise PdfTextError("pdftotext não encontrado. O Poppler está instalado e no PATH?")
+    except subprocess.TimeoutExpired:
+        raise PdfTextError("Tempo esgotado ao ler a camada de texto do PDF")
+
+    if proc.returncode != 0:
+        error = proc.stderr.decode("utf8", "ignore").strip()
+        raise PdfTextError(error or f"pdftotext terminou com código {proc.returncode}")
+
+    wanted = set(page_numbers)
+    return {
+        page.page_number: page
+        for page in parse_bbox_output(proc.stdout.decode("utf8", "ignore"), first_page=first)
+        if page.page_number in wanted
+    }
@@ -0,0 +1,128 @@
+import importlib
+import re
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Tuple
+
+# Pós-processamento do texto de uma área (recebe e devolve o texto já limpo)
+PostProcessor = Callable[[str], str]
+
+
+def clean_text(text: str) -> str:
+    """Limpa o texto removendo quebras de linha e espaços extras"""
+    if not text:
+        return ""
+
+    # Substituir quebras de linha por espaços
+    cleaned_text = text.replace('\n', ' ')
+
+    # Remover espaços extras (múltiplos espaços se tornam um só)
+    cleaned_text = ' '.join(cleaned_text.split())
+
+    return cleaned_text
+
+
+# Demonstrativo Agibank: transação = data + descrição (sem dígitos nem "/") até a próxima data ou o fim
+AGIBANK_TRANSACTION_PATTERN = re.compile(r'(\d{2}/\d{2}/\d{4})\s+([^0-9/]+?)(?=\s*\d{2}/\d{2}/\d{4}|$)')
+# Valores no texto que sobra: números com vírgulas, pontos, sinais negativos
+AGIBANK_VALUE_PATTERN = re.compile(r'[-+]?\d{1,3}(?:\.\d{3})*(?:,\d{2})?|\d+,\d{2}|\d+')
+
+
+@dataclass
+class AgibankTransaction:
+    """Transação do demonstrativo Agibank (`value` None quando faltou valor para associar)"""
+    date: str
+    description: str
+    value: Optional[str] = None
+
+    def to_text(self) -> str:
+        if self.value is None:
+            return f"{self.date} - {self.description} - Valor: N/A"
+        return f"{self.date} - {self.description} - R$ {self.value}"
+
+
+def parse_agibank_demonstrativo(raw_text: str) -> Tuple[List[AgibankTransaction], List[str]]:
+    """
+    Associa as datas/descrições do demonstrativo Agibank aos valores
+
+    Padrão esperado: "data descrição data descrição ... valores valores valores".
+    Os valores saem do texto sem as transações, montado numa única passagem
+    pelas posições das transações encontradas; o i-ésimo valor vai para a
+    i-ésima transação.
+
+    Returns:
+        (transações, valores que sobraram depois da última transação)
+    """
+    transactions = []
+    value_parts = []
+    position = 0
+    for match in AGIBANK_TRANSACTION_PATTERN.finditer(raw_text):
+        transactions.append(AgibankTransaction(match.group(1), match.group(2).strip()))
+        value_parts.append(raw_text[position:match.start()])
+        position = match.end()
+    value_parts.append(raw_text[position:])
+
+    # Aceitar valores que tenham pelo menos um dígito e formato monetário
+    monetary_values = [
+        value for value in AGIBANK_VALUE_PATTERN.findall("".join(value_parts))
+        if len(value) >= 2 and (',' in value or len(value) >= 3)
+    ]
+
+    for transaction, value in zip(transactions, monetary_values):
+        transaction.value = value
+    return transactions, monetary_values[len(transactions):]
+
+
+def process_agibank_demonstrativo_text(raw_text: str) -> str:
+    """
+    Processa o texto do demonstrativo Agibank para associar títulos com valores
+
+    Padrão esperado: "data descrição data descrição ... valores valores valores"
+    """
+    if not raw_text:
+        return ""
+
+    transactions, extra_values = parse_agibank_demonstrativo(raw_text)
+    parts = [transaction.to_text() for transaction in transactions]
+    # Se sobraram valores, mostrar separadamente
+    if extra_values:
+        parts.append(f"Valores extras: {', '.join(extra_values)}")
+
+    return ' | '.join(parts) if parts else raw_text
+
+
+def process_bmg_transacoes_text(raw_text: str) -> str:
+    """
+    Retorna o texto PURO extraído pelo Vision API - sem organização
+
+    Apenas limpa quebras de linha e espaços extras, mantendo a ordem original do Vision
+    """
+    if not raw_text:
+        return ""
+
+    # Usar apenas a função clean_text que já existe
+    return clean_text(raw_text)
+
+
+# Pós-processadores disponíveis para os templates (campo "postprocess")
+POSTPROCESSORS: Dict[str, PostProcessor] = {
+    "clean": clean_text,
+    "agibank_demonstrativo": process_agibank_demonstrativo_text,
+    "bmg_transacoes": process_bmg_transacoes_text,
+}
+
+
+def resolve_postprocessor(name: str) -> PostProcessor:
+    """Pós-processador pelo nome registrado ou por `<módulo>:<função>`"""
+    name = (name or "clean").strip()
+    if name in POSTPROCESSORS:
+        return POSTPROCESSORS[name]
+    if ":" in name:
+        module_name, function_name = name.split(":", 1)
+        try:
+            function = getattr(importlib.import_module(module_name), function_name)
+        except (ImportError, AttributeError) as e:
+            raise ValueError(f"Pós-processador inválido: '{name}' ({str(e)})")
+        if not callable(function):
+            raise ValueError(f"Pós-processador inválido: '{name}' não é uma função")
+        return function
+    raise ValueError(f"Pós-processador inválido: '{name}'. Use: {', '.join(POSTPROCESSORS)} ou <módulo>:<função>")
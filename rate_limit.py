@@ -0,0 +1,301 @@
+import asyncio
+import importlib
+import json
+import logging
+import os
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from ocr_backends import OCRBackend, OCRPageResult
+from ocr_resilience import mark_dispatched
+
+try:
+    import fcntl
+except ImportError:  # Windows: só o armazenamento em memória
+    fcntl = None
+
+logger = logging.getLogger("PDF_OCR_API")
+
+RATE_LIMIT_STORES = ("memory", "file")
+
+# Baldes da cota da Vision API: chamadas e imagens (ou páginas de PDF)
+BUCKET_REQUESTS = "requests"
+BUCKET_IMAGES = "images"
+
+# Limites de cada balde: {nome: (tokens por segundo, capacidade)}
+BucketLimits = Dict[str, Tuple[float, float]]
+
+
+def _refill(state: Optional[List[float]], rate: float, capacity: float, now: float) -> float:
+    """Tokens disponíveis agora no balde (`state` = [tokens, atualizado em]; None = balde cheio)"""
+    if state is None:
+        return capacity
+    tokens, updated = state
+    return min(capacity, tokens + max(0.0, now - updated) * rate)
+
+
+def reserve_tokens(buckets: Dict[str, List[float]], costs: Dict[str, float], limits: BucketLimits, now: float) -> float:
+    """
+    Reserva `costs` tokens em cada balde e devolve a espera (segundos) até a reserva valer
+
+    A reserva sempre é feita, mesmo sem tokens suficientes: o saldo fica
+    negativo e quem chega depois espera a dívida ser paga. Assim a fila é
+    atendida por ordem de chegada e a vazão fica no limite da cota.
+    """
+    wait = 0.0
+    for name, cost in costs.items():
+        if name not in limits or cost <= 0:
+            continue
+        rate, capacity = limits[name]
+        tokens = _refill(buckets.get(name), rate, capacity, now) - cost
+        buckets[name] = [tokens, now]
+        if tokens < 0:
+            wait = max(wait, -tokens / rate)
+    return wait
+
+
+def refund_tokens(buckets: Dict[str, List[float]], costs: Dict[str, float], limits: BucketLimits, now: float):
+    """Devolve uma reserva que não foi usada (chamada cancelada durante a espera)"""
+    for name, cost in costs.items():
+        if name not in limits or cost <= 0:
+            continue
+        rate, capacity = limits[name]
+        buckets[name] = [min(capacity, _refill(buckets.get(name), rate, capacity, now) + cost), now]
+
+
+class BucketStore:
+    """
+    Armazenamento do estado dos baldes
+
+    `reserve` e `refund` precisam ser atômicos para todos os processos que
+    compartilham a cota. Implementações externas (ex: Redis) podem ser
+    carregadas por `OCR_RATE_LIMIT_STORE=<módulo>:<fábrica>`; a fábrica recebe
+    as configurações e devolve o armazenamento.
+    """
+    name = "base"
+
+    def reserve(self, costs: Dict[str, float], limits: BucketLimits) -> float:
+        raise NotImplementedError
+
+    def refund(self, costs: Dict[str, float], limits: BucketLimits):
+        raise NotImplementedError
+
+    def snapshot(self, limits: BucketLimits) -> Dict[str, float]:
+        """Tokens disponíveis agora em cada balde"""
+        return {}
+
+
+class MemoryBucketStore(BucketStore):
+    """Baldes na memória do processo (um único worker)"""
+    name = "memory"
+
+    def __init__(self):
+        self._buckets: Dict[str, List[float]] = {}
+        self._lock = threading.Lock()
+
+    def reserve(self, costs: Dict[str, float], limits: BucketLimits) -> float:
+        with self._lock:
+            return reserve_tokens(self._buckets, costs, limits, time.time())
+
+    def refund(self, costs: Dict[str, float], limits: BucketLimits):
+        with self._lock:
+            refund_tokens(self._buckets, costs, limits, time.time())
+
+    def snapshot(self, limits: BucketLimits) -> Dict[str, float]:
+        with self._lock:
+            now = time.time()
+            return {name: round(_refill(self._buckets.get(name), *limits[name], now), 2) for name in limits}
+
+
+class FileBucketStore(BucketStore):
+    """
+    Baldes num arquivo JSON protegido por `flock`, compartilhado pelos
+    processos do mesmo host (uvicorn --workers, contêineres com o volume montado)
+
+    O relógio é o de parede (`time.time()`), comum a todos os processos.
+    """
+    name = "file"
+
+    def __init__(self, path: str):
+        if fcntl is None:
+            raise ValueError("OCR_RATE_LIMIT_STORE=file exige fcntl (Linux/macOS); use 'memory'")
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+
+    def _update(self, change):
+        with self._lock, open(self.path, "a+") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                f.seek(0)
+                try:
+                    buckets = json.loads(f.read() or "{}")
+                except ValueError:
+                    buckets = {}
+                result = change(buckets, time.time())
+                f.seek(0)
+                f.truncate()
+                f.write(json.dumps(buckets))
+                f.flush()
+                return result
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def reserve(self, costs: Dict[str, float], limits: BucketLimits) -> float:
+        return self._update(lambda buckets, now: reserve_tokens(buckets, costs, limits, now))
+
+    def refund(self, costs: Dict[str, float], limits: BucketLimits):
+        self._update(lambda buckets, now: refund_tokens(buckets, costs, limits, now))
+
+    def snapshot(self, limits: BucketLimits) -> Dict[str, float]:
+        # Só leitura (trava compartilhada): consultar a cota não altera o arquivo
+        try:
+            with open(self.path) as f:
+                fcntl.flock(f, fcntl.LOCK_SH)
+                try:
+                    buckets = json.loads(f.read() or "{}")
+                except ValueError:
+                    buckets = {}
+                finally:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+        except FileNotFoundError:
+            buckets = {}
+        now = time.time()
+        return {name: round(_refill(buckets.get(name), *limits[name], now), 2) for name in limits}
+
+
+def create_bucket_store(name: str, settings) -> BucketStore:
+    """Cria o armazenamento dos baldes configurado (`OCR_RATE_LIMIT_STORE`)"""
+    name = (name or "file").strip()
+    if name == "memory":
+        return MemoryBucketStore()
+    if name == "file":
+        return FileBucketStore(settings.OCR_RATE_LIMIT_PATH)
+    if ":" in name:
+        module_name, factory_name = name.split(":", 1)
+        try:
+            factory = getattr(importlib.import_module(module_name), factory_name)
+        except (ImportError, AttributeError) as e:
+            raise ValueError(f"Armazenamento de cota inválido: '{name}' ({str(e)})")
+        return factory(settings)
+    raise ValueError(f"Armazenamento de cota inválido: '{name}'. Use: {', '.join(RATE_LIMIT_STORES)} ou <módulo>:<fábrica>")
+
+
+class RateLimiter:
+    """
+    Limite de cota (token bucket) em chamadas e imagens por minuto
+
+    Cada chamada reserva 1 token de chamada e um token por imagem (ou página
+    de PDF) e espera a reserva valer; nunca é recusada. Com o armazenamento
+    compartilhado, todos os processos dividem a mesma cota. A capacidade dos
+    baldes (`burst_seconds` de cota) define a rajada permitida após um período
+    ocioso. Limites 0 desativam o respectivo balde.
+    """
+
+    def __init__(
+        self,
+        store: BucketStore,
+        requests_per_minute: float = 0,
+        images_per_minute: float = 0,
+        burst_seconds: float = 1.0
+    ):
+        self.store = store
+        self.limits: BucketLimits = {}
+        for name, per_minute in ((BUCKET_REQUESTS, requests_per_minute), (BUCKET_IMAGES, images_per_minute)):
+            if per_minute > 0:
+                rate = per_minute / 60
+                self.limits[name] = (rate, max(1.0, rate * max(0.0, burst_seconds)))
+        self.waiting = 0
+        self.total_wait = 0.0
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.limits)
+
+    async def acquire(self, images: int) -> float:
+        """Aguarda a vez de uma chamada com `images` imagens; devolve o tempo de espera"""
+        if not self.enabled:
+            return 0.0
+        costs = {BUCKET_REQUESTS: 1, BUCKET_IMAGES: images}
+        wait = await asyncio.to_thread(self.store.reserve, costs, self.limits)
+        if wait <= 0:
+            return 0.0
+
+        self.waiting += 1
+        try:
+            await asyncio.sleep(wait)
+        except asyncio.CancelledError:
+            # Chamada cancelada na fila: a vaga volta para quem vem depois (numa thread, sem
+            # bloquear o event loop nem atrasar o cancelamento)
+            asyncio.get_running_loop().run_in_executor(None, self._refund, costs)
+            raise
+        finally:
+            self.waiting -= 1
+        self.total_wait += wait
+        return wait
+
+    def _refund(self, costs: Dict[str, float]):
+        try:
+            self.store.refund(costs, self.limits)
+        except Exception as e:
+            logger.warning(f"⚠️ Cota - Erro ao devolver reserva: {str(e)}")
+
+    async def snapshot(self) -> dict:
+        if not self.enabled:
+            return {"enabled": False}
+        try:
+            available = await asyncio.to_thread(self.store.snapshot, self.limits)
+        except Exception as e:
+            available = {"error": str(e)}
+        return {
+            "enabled": True,
+            "store": self.store.name,
+            "per_minute": {name: round(rate * 60, 1) for name, (rate, _) in self.limits.items()},
+            "available": available,
+            "waiting": self.waiting,
+            "total_wait_seconds": round(self.total_wait, 2)
+        }
+
+
+class RateLimitedBackend(OCRBackend):
+    """
+    Backend de OCR que passa pelo limite de cota antes de cada chamada (inclusive retentativas e hedging)
+
+    O envio é sinalizado (`mark_dispatched`) depois da cota: a espera não conta
+    no tempo limite da tentativa. O `VisionBatcher` usa `acquire` e o backend
+    interno diretamente, reservando a cota uma vez por lote.
+    """
+    queued = True
+
+    def __init__(self, backend: OCRBackend, limiter: RateLimiter, on_wait=None):
+        self.backend = backend
+        self.limiter = limiter
+        self.on_wait = on_wait
+        self.name = backend.name
+        self.max_images_per_batch = backend.max_images_per_batch
+        self.max_pages_per_pdf_request = backend.max_pages_per_pdf_request
+
+    async def acquire(self, images: int):
+        """Aguarda a cota de uma chamada com `images` imagens (ou páginas de PDF)"""
+        wait = await self.limiter.acquire(images)
+        if self.on_wait:
+            self.on_wait(wait)
+
+    async def annotate_images(self, contents: List[bytes]) -> List[OCRPageResult]:
+        await self.acquire(len(contents))
+        mark_dispatched()
+        return await self.backend.annotate_images(contents)
+
+    async def annotate_pdf(self, pdf_content: bytes, page_numbers: List[int]) -> Dict[int, OCRPageResult]:
+        await self.acquire(len(page_numbers))
+        mark_dispatched()
+        return await self.backend.annotate_pdf(pdf_content, page_numbers)
+
+    def open(self):
+        self.backend.open()
+
+    async def close(self):
+        await self.backend.close()
@@ -0,0 +1,237 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+import shutil
+import signal
+import tempfile
+import time
+from concurrent.futures import Executor, Future, ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import List, Optional, Sequence, Tuple
+
+from PIL import Image
+
+from image_encoding import EncodingPreset, encode_image
+from pdf_render import MAX_RENDER_HEIGHT, MAX_RENDER_WIDTH, stream_pages
+
+logger = logging.getLogger("PDF_OCR_API")
+
+
+def default_spool_dir() -> str:
+    """Memória compartilhada (/dev/shm) quando disponível; senão, o diretório temporário do sistema"""
+    return "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+
+
+@dataclass(frozen=True)
+class RenderTask:
+    """
+    Bloco de páginas (base 1) a renderizar e codificar num processo do pool
+
+    Com `box` (frações da página), só a região é renderizada; as páginas sem
+    tamanho em `page_sizes` são renderizadas inteiras e recortadas. O PNG das
+    páginas de `debug_pages` é a mesma imagem enviada ao OCR. Só dados
+    simples: a tarefa vai para outro processo.
+    """
+    pdf_path: str
+    page_numbers: Tuple[int, ...]
+    dpi: float
+    encoding: EncodingPreset
+    output_dir: str
+    debug_pages: frozenset = frozenset()  # Páginas também gravadas em PNG (artefatos de depuração)
+    box: Optional[Tuple[float, float, float, float]] = None  # Região renderizada (None = página inteira)
+    page_sizes: Tuple[Tuple[int, Tuple[float, float]], ...] = ()  # (página, tamanho em pontos), para a região
+
+
+@dataclass
+class RenderedPage:
+    """Página codificada, gravada em arquivo pelo processo do pool (`path` None = falha)"""
+    page_number: int
+    path: Optional[str] = None
+    size: int = 0
+    render_seconds: float = 0.0
+    encode_seconds: float = 0.0
+    debug_path: Optional[str] = None
+    error: Optional[str] = None
+
+    def read(self) -> bytes:
+        """Lê os bytes codificados e remove o arquivo"""
+        try:
+            with open(self.path, "rb") as f:
+                return f.read()
+        finally:
+            self.discard(keep_debug=True)
+
+    def discard(self, keep_debug: bool = False):
+        """Remove os arquivos da página (os bytes codificados e, se não mantido, o PNG de depuração)"""
+        paths = [self.path] if keep_debug else [self.path, self.debug_path]
+        for path in paths:
+            if path:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+
+def _crop_region(image: Image.Image, box: Sequence[float]) -> Image.Image:
+    """Recorta a região da página inteira, reduzida a MAX_RENDER_WIDTH x MAX_RENDER_HEIGHT se passar disso"""
+    width, height = image.size
+    region = image.crop((int(width * box[0]), int(height * box[1]), int(width * box[2]), int(height * box[3])))
+    ratio = min(1.0, MAX_RENDER_WIDTH / region.size[0], MAX_RENDER_HEIGHT / region.size[1])
+    if ratio < 1.0:
+        resized = region.resize((int(region.size[0] * ratio), int(region.size[1] * ratio)), Image.Resampling.LANCZOS)
+        region.close()
+        region = resized
+    return region
+
+
+def _write(directory: str, suffix: str, writer) -> str:
+    fd, path = tempfile.mkstemp(dir=directory, suffix=suffix)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            writer(f)
+    except BaseException:
+        os.remove(path)
+        raise
+    return path
+
+
+def render_and_encode(task: RenderTask) -> List[RenderedPage]:
+    """
+    Renderiza e codifica as páginas da tarefa, gravando cada uma em arquivo
+
+    Executada num processo do pool (ou numa thread, sem pool). Um único
+    pdftoppm renderiza o bloco, uma página por vez; cada imagem é liberada
+    logo após a codificação. Uma página com falha volta com `error`.
+    """
+    results: List[RenderedPage] = []
+    page_sizes = dict(task.page_sizes)
+    pages = iter(stream_pages(task.pdf_path, list(task.page_numbers), task.dpi, page_sizes, task.box))
+    try:
+        while True:
+            start = time.perf_counter()
+            try:
+                page_number, image = next(pages)
+            except StopIteration:
+                break
+            except Exception as e:
+                # Falha fora de uma página específica: as páginas restantes falham juntas
+                done = {result.page_number for result in results}
+                results.extend(RenderedPage(n, error=str(e)) for n in task.page_numbers if n not in done)
+                break
+            page = RenderedPage(page_number, render_seconds=time.perf_counter() - start)
+            results.append(page)
+            if image is None:
+                page.error = "Não foi possível carregar a página"
+                continue
+
+            try:
+                if task.box and page_number not in page_sizes:
+                    # Tamanho da página desconhecido: o pdftoppm renderizou a página inteira
+                    region = _crop_region(image, task.box)
+                    image.close()
+                    image = region
+                if page_number in task.debug_pages:
+                    page.debug_path = _write(task.output_dir, ".png", lambda f: image.save(f, format="PNG"))
+
+                start = time.perf_counter()
+                content = encode_image(image, task.encoding)
+                page.encode_seconds = time.perf_counter() - start
+                page.path = _write(task.output_dir, ".bin", lambda f: f.write(content))
+                page.size = len(content)
+            except Exception as e:
+                page.error = f"Erro ao preparar a página: {str(e)}"
+            finally:
+                image.close()
+    except BaseException:
+        for page in results:
+            page.discard()
+        raise
+    finally:
+        pages.close()
+    return results
+
+
+def _init_worker():
+    # O Ctrl+C vai para o grupo de processos inteiro: quem encerra o pool é o processo principal
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+def _discard_results(future: Future):
+    # Resultado de uma tarefa abandonada (requisição cancelada): remover os arquivos
+    if not future.cancelled() and future.exception() is None:
+        for page in future.result():
+            page.discard()
+
+
+class RenderPool:
+    """
+    Pool de processos para renderização e codificação das páginas
+
+    Cada tarefa é um bloco de até `chunk_pages` páginas consecutivas (um
+    pdftoppm por bloco), executado num dos `workers` processos; assim um único
+    documento grande usa todos os núcleos e o event loop fica livre. As páginas
+    voltam como arquivos em `spool_dir` (memória compartilhada em /dev/shm
+    quando disponível), não como imagens PIL serializadas. Com `workers` 0, as
+    tarefas rodam no executor de threads informado em `render`.
+    """
+
+    def __init__(self, workers: int, chunk_pages: int = 4, spool_dir: Optional[str] = None):
+        self.workers = max(0, workers)
+        self.chunk_pages = max(1, chunk_pages)
+        self.spool_dir = spool_dir or default_spool_dir()
+        self.output_dir: Optional[str] = None
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    def start(self):
+        """Cria o diretório de saída deste processo e os processos do pool"""
+        if self.output_dir is None:
+            os.makedirs(self.spool_dir, exist_ok=True)
+            self.output_dir = tempfile.mkdtemp(prefix=f"pdf_ocr_render_{os.getpid()}_", dir=self.spool_dir)
+        if self.workers and self._executor is None:
+            # forkserver: os processos não herdam as threads e o event loop do servidor
+            methods = multiprocessing.get_all_start_methods()
+            context = multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+            if "forkserver" in methods:
+                context.set_forkserver_preload(["render_pool"])
+            self._executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=context, initializer=_init_worker)
+            logger.info(f"🖨️ Renderização - {self.workers} processo(s), blocos de {self.chunk_pages} página(s), saída em {self.output_dir}")
+
+    def chunks(self, page_numbers: Sequence[int]) -> List[List[int]]:
+        """Divide as páginas (ordenadas) em blocos de páginas consecutivas de até `chunk_pages`"""
+        chunks: List[List[int]] = []
+        for page_number in sorted(set(page_numbers)):
+            if chunks and page_number == chunks[-1][-1] + 1 and len(chunks[-1]) < self.chunk_pages:
+                chunks[-1].append(page_number)
+            else:
+                chunks.append([page_number])
+        return chunks
+
+    def task(self, pdf_path: str, page_numbers: Sequence[int], dpi: float, encoding: EncodingPreset, **options) -> RenderTask:
+        """Monta a tarefa de um bloco, com a saída no diretório deste processo"""
+        self.start()
+        return RenderTask(pdf_path, tuple(page_numbers), dpi, encoding, self.output_dir, **options)
+
+    async def render(self, task: RenderTask, fallback: Optional[Executor] = None) -> List[RenderedPage]:
+        """Executa a tarefa no pool (ou em `fallback`, sem processos) e aguarda as páginas"""
+        self.start()
+        executor = self._executor or fallback
+        if executor is None:
+            return await asyncio.to_thread(render_and_encode, task)
+
+        future = executor.submit(render_and_encode, task)
+        try:
+            return await asyncio.wrap_future(future)
+        except asyncio.CancelledError:
+            future.add_done_callback(_discard_results)
+            raise
+
+    def shutdown(self):
+        """Encerra os processos e remove o diretório de saída"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+        if self.output_dir is not None:
+            shutil.rmtree(self.output_dir, ignore_errors=True)
+            self.output_dir = None
+        logger.info("🧹 Pool de renderização encerrado")
@@ -0,0 +1,90 @@
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, Iterator, List, TypeVar
+
+T = TypeVar("T")
+
+# Etapas do pipeline medidas em todos os endpoints
+STAGES = ("inspect", "detect", "text_layer", "render", "crop", "encode", "ocr", "postprocess")
+
+
+class StageTimings:
+    """
+    Tempo acumulado por etapa do pipeline (atualizado pelas threads do motor de OCR)
+
+    Os totais são do processo inteiro; para medir um trecho, compare dois
+    `snapshot()` (é o que o benchmark faz entre cenários).
+    """
+
+    def __init__(self):
+        self._totals: Dict[str, list] = {}
+        self._lock = threading.Lock()
+
+    def add(self, stage: str, seconds: float):
+        with self._lock:
+            totals = self._totals.setdefault(stage, [0, 0.0])
+            totals[0] += 1
+            totals[1] += seconds
+
+    def snapshot(self) -> Dict[str, dict]:
+        """Cópia dos totais: {etapa: {"count": n, "seconds": s}}"""
+        with self._lock:
+            return {stage: {"count": count, "seconds": seconds} for stage, (count, seconds) in self._totals.items()}
+
+    def reset(self):
+        with self._lock:
+            self._totals.clear()
+
+
+# Totais do processo
+stage_timings = StageTimings()
+
+# Funções chamadas a cada medição (ex: histogramas do /metrics)
+_observers: List[Callable[[str, float], None]] = []
+
+
+def add_observer(callback: Callable[[str, float], None]):
+    """Registra `callback(etapa, segundos)`, chamado a cada medição"""
+    _observers.append(callback)
+
+
+def record(stage: str, seconds: float):
+    """Registra uma medição de `stage`"""
+    stage_timings.add(stage, seconds)
+    for callback in _observers:
+        callback(stage, seconds)
+
+
+@contextmanager
+def timed(stage: str) -> Iterator[None]:
+    """Soma ao total de `stage` o tempo gasto dentro do bloco"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(stage, time.perf_counter() - start)
+
+
+def timed_call(stage: str, func: Callable[..., T], *args, **kwargs) -> T:
+    """Chama `func` medindo o tempo em `stage` (útil com `OCREngine.run`)"""
+    with timed(stage):
+        return func(*args, **kwargs)
+
+
+def timed_iter(stage: str, items: Iterable[T]) -> Iterator[T]:
+    """Itera sobre `items` medindo em `stage` o tempo de produção de cada item"""
+    iterator = iter(items)
+    try:
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            record(stage, time.perf_counter() - start)
+            yield item
+    finally:
+        close = getattr(iterator, "close", None)
+        if close:
+            close()
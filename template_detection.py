@@ -0,0 +1,180 @@
+import logging
+import re
+import threading
+import unicodedata
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from PIL import Image
+
+from layout_templates import LayoutTemplate
+from ocr_layout import Box, union_box
+from pdf_render import PdfRenderError, stream_pages
+
+logger = logging.getLogger("PDF_OCR_API")
+
+# Métodos de detecção, do mais barato ao mais caro
+DETECT_CACHE = "cache"            # Documento já identificado antes (hash do PDF)
+DETECT_TEXT_LAYER = "text_layer"  # Palavras-chave na camada de texto do cabeçalho
+DETECT_THUMBNAIL = "thumbnail"    # Miniatura parecida com a de um documento já identificado
+DETECT_OCR_PROBE = "ocr_probe"    # OCR em baixa resolução da faixa do cabeçalho
+
+# Lado da grade da miniatura (hash de diferenças: hash_size² bits)
+FINGERPRINT_HASH_SIZE = 16
+
+
+def normalize_text(text: str) -> str:
+    """Maiúsculas, sem acentos e com os espaços normalizados (comparação de palavras-chave)"""
+    text = unicodedata.normalize("NFKD", text or "")
+    text = "".join(char for char in text if not unicodedata.combining(char))
+    return " ".join(text.upper().split())
+
+
+def image_fingerprint(image: Image.Image, hash_size: int = FINGERPRINT_HASH_SIZE) -> int:
+    """
+    Hash de diferenças (dHash) da página: tons de cinza reduzidos a uma grade
+    (hash_size + 1) x hash_size, um bit por par de vizinhos na horizontal
+
+    Páginas do mesmo layout (cabeçalho, logotipo, colunas) têm hashes próximos
+    em distância de Hamming, mesmo com conteúdo diferente.
+    """
+    small = image.convert("L").resize((hash_size + 1, hash_size), Image.BILINEAR)
+    pixels = list(small.getdata())
+    value = 0
+    for row in range(hash_size):
+        offset = row * (hash_size + 1)
+        for col in range(hash_size):
+            value = (value << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return value
+
+
+def hamming_distance(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+def probe_page(pdf_path: str, page_number: int, dpi: float, header_box: Sequence[float]) -> Tuple[int, Image.Image]:
+    """
+    Renderiza a página (base 1) em baixa resolução para a detecção
+
+    Returns:
+        (hash da miniatura, imagem da faixa do cabeçalho)
+    """
+    pages = stream_pages(pdf_path, [page_number], dpi)
+    try:
+        for _, image in pages:
+            if image is None:
+                break
+            try:
+                width, height = image.size
+                header = image.crop((
+                    int(width * header_box[0]), int(height * header_box[1]),
+                    int(width * header_box[2]), int(height * header_box[3])
+                ))
+                return image_fingerprint(image), header
+            finally:
+                image.close()
+    finally:
+        pages.close()
+    raise PdfRenderError(f"Não foi possível renderizar a página {page_number}")
+
+
+@dataclass
+class Detection:
+    """Resultado da detecção automática do template"""
+    template: LayoutTemplate
+    method: str
+    seconds: float = 0.0
+    fingerprint: Optional[int] = None
+
+
+class TemplateDetector:
+    """
+    Identifica o template de um documento a partir de sinais baratos
+
+    - palavras-chave (`match.keywords` do template) no texto do cabeçalho,
+      vindo da camada de texto do PDF ou do OCR em baixa resolução; vence o
+      template com mais palavras encontradas, e empate não identifica nada;
+    - miniaturas: cada documento identificado ensina o hash da miniatura da
+      página, e uma página com hash a até `max_distance` bits de um único
+      template é identificada sem OCR. Os hashes ficam em memória (os
+      `max_fingerprints` mais recentes).
+    """
+
+    def __init__(self, templates: Iterable[LayoutTemplate], max_distance: int = 12, max_fingerprints: int = 1000):
+        self.templates = [template for template in templates if template.detectable]
+        self.max_distance = max(0, max_distance)
+        self.max_fingerprints = max(0, max_fingerprints)
+        # Palavras-chave compiladas uma única vez, como palavras inteiras
+        self._patterns = {
+            template.name: [re.compile(rf"\b{re.escape(normalize_text(keyword))}\b") for keyword in template.keywords]
+            for template in self.templates
+        }
+        self._by_name = {template.name: template for template in self.templates}
+        self._fingerprints: "OrderedDict[int, str]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.detections: Dict[str, int] = {}
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.templates)
+
+    @property
+    def header_box(self) -> Box:
+        """Faixa que cobre o cabeçalho de todos os templates detectáveis"""
+        return union_box([template.header for template in self.templates])
+
+    def get(self, name: Optional[str]) -> Optional[LayoutTemplate]:
+        return self._by_name.get(name or "")
+
+    def match_text(self, text: str) -> Optional[LayoutTemplate]:
+        """Template cujas palavras-chave aparecem no texto (None se nenhum ou empate)"""
+        normalized = normalize_text(text)
+        if not normalized:
+            return None
+        scores: List[Tuple[int, LayoutTemplate]] = []
+        for template in self.templates:
+            score = sum(1 for pattern in self._patterns[template.name] if pattern.search(normalized))
+            if score:
+                scores.append((score, template))
+        if not scores:
+            return None
+        scores.sort(key=lambda item: item[0], reverse=True)
+        if len(scores) > 1 and scores[0][0] == scores[1][0]:
+            return None
+        return scores[0][1]
+
+    def match_fingerprint(self, fingerprint: int) -> Optional[LayoutTemplate]:
+        """Template das miniaturas próximas (None se nenhuma, ou se houver mais de um template próximo)"""
+        if not self.max_distance:
+            return None
+        with self._lock:
+            nearby = {
+                name for known, name in self._fingerprints.items()
+                if hamming_distance(known, fingerprint) <= self.max_distance
+            }
+        if len(nearby) != 1:
+            return None
+        return self._by_name.get(nearby.pop())
+
+    def learn(self, fingerprint: Optional[int], template: LayoutTemplate):
+        """Guarda o hash da miniatura de um documento identificado"""
+        if fingerprint is None or not self.max_fingerprints:
+            return
+        with self._lock:
+            self._fingerprints[fingerprint] = template.name
+            self._fingerprints.move_to_end(fingerprint)
+            while len(self._fingerprints) > self.max_fingerprints:
+                self._fingerprints.popitem(last=False)
+
+    def record(self, detection: Detection):
+        with self._lock:
+            self.detections[detection.method] = self.detections.get(detection.method, 0) + 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "templates": [template.name for template in self.templates],
+                "fingerprints": len(self._fingerprints),
+                "detections": dict(self.detections)
+            }
@@ -0,0 +1,248 @@
+import asyncio
+import hashlib
+import os
+import re
+import tempfile
+from dataclasses import dataclass
+from typing import Callable, List, Optional, Type
+
+from fastapi import HTTPException, Request
+from fastapi.routing import APIRoute
+from starlette.datastructures import FormData, Headers, UploadFile
+from starlette.formparsers import MultiPartParser
+
+# Tamanho dos blocos lidos do upload e do disco
+SPOOL_CHUNK_SIZE = 1024 * 1024
+
+# Extensões aceitas no nome do arquivo gravado (ex: ".pdf", ".jpeg")
+_SUFFIX_PATTERN = re.compile(r"^\.[a-z0-9]{1,8}$")
+
+
+class UploadTooLarge(Exception):
+    """O upload ultrapassou o tamanho máximo permitido"""
+
+    def __init__(self, max_size: int):
+        super().__init__(f"Arquivo excede o tamanho máximo de {max_size} bytes")
+        self.max_size = max_size
+
+
+@dataclass
+class SpooledUpload:
+    """
+    Arquivo enviado, gravado uma única vez em disco
+
+    Todas as etapas (inspeção, renderização, camada de texto, jobs) usam
+    `path`; o conteúdo só é lido para a memória quando o backend exige os
+    bytes (modo nativo). O hash SHA-256 é calculado durante a gravação.
+    """
+    path: str
+    size: int
+    sha256: str
+    filename: Optional[str] = None
+
+    def read_bytes(self) -> bytes:
+        with open(self.path, "rb") as f:
+            return f.read()
+
+    def remove(self):
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+    @classmethod
+    def from_path(cls, path: str, filename: Optional[str] = None) -> "SpooledUpload":
+        """Referência a um arquivo já gravado (o hash é calculado lendo em blocos)"""
+        digest = hashlib.sha256()
+        size = 0
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(SPOOL_CHUNK_SIZE), b""):
+                digest.update(chunk)
+                size += len(chunk)
+        return cls(path=path, size=size, sha256=digest.hexdigest(), filename=filename)
+
+    @classmethod
+    def from_bytes(cls, content: bytes, directory: Optional[str] = None, suffix: str = ".pdf", filename: Optional[str] = None) -> "SpooledUpload":
+        """Grava um conteúdo em memória como arquivo de upload"""
+        fd, path = tempfile.mkstemp(prefix="upload_", suffix=suffix, dir=directory)
+        with os.fdopen(fd, "wb") as f:
+            f.write(content)
+        return cls(path=path, size=len(content), sha256=hashlib.sha256(content).hexdigest(), filename=filename)
+
+
+def _remove(path: str):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+class SpoolingUploadFile(UploadFile):
+    """
+    Arquivo do corpo multipart gravado direto em `directory` enquanto é recebido
+
+    Substitui o arquivo temporário do Starlette: o hash e o tamanho são
+    calculados na gravação, e o recebimento é interrompido assim que
+    `max_size` é ultrapassado (`UploadTooLarge`). `claim` entrega o arquivo
+    como SpooledUpload, sem cópia; se ninguém o reivindicar, ele é removido ao
+    final da requisição (`close`).
+    """
+
+    def __init__(self, directory: str, max_size: int, filename: Optional[str], headers: Headers):
+        super().__init__(file=None, size=0, filename=filename, headers=headers)  # type: ignore[arg-type]
+        self.directory = directory
+        self.max_size = max_size
+        self.path: Optional[str] = None
+        self.claimed = False
+        self._digest = hashlib.sha256()
+
+    @property
+    def _in_memory(self) -> bool:
+        return False
+
+    async def _open(self):
+        if self.path is None:
+            suffix = os.path.splitext(self.filename or "")[1].lower()
+            fd, self.path = await asyncio.to_thread(
+                tempfile.mkstemp, prefix="upload_", suffix=suffix if _SUFFIX_PATTERN.match(suffix) else "", dir=self.directory
+            )
+            self.file = os.fdopen(fd, "w+b")
+
+    async def write(self, data: bytes) -> None:
+        await self._open()
+        if self.max_size and self.size + len(data) > self.max_size:
+            raise UploadTooLarge(self.max_size)
+        self._digest.update(data)
+        self.size += len(data)
+        await asyncio.to_thread(self.file.write, data)
+
+    async def seek(self, offset: int) -> None:
+        await self._open()
+        await super().seek(offset)
+
+    async def read(self, size: int = -1) -> bytes:
+        await self._open()
+        return await super().read(size)
+
+    async def claim(self, suffix: Optional[str] = None) -> SpooledUpload:
+        """Fecha o arquivo e o entrega como SpooledUpload (renomeado para `suffix`, se diferente)"""
+        await self._open()
+        await asyncio.to_thread(self.file.close)
+        path = self.path
+        if suffix is not None and not path.endswith(suffix):
+            path = os.path.splitext(path)[0] + suffix
+            await asyncio.to_thread(os.rename, self.path, path)
+        self.path = path
+        self.claimed = True
+        return SpooledUpload(path=path, size=self.size, sha256=self._digest.hexdigest(), filename=self.filename)
+
+    async def close(self) -> None:
+        if self.file is not None and not self.file.closed:
+            await asyncio.to_thread(self.file.close)
+        if self.path is not None and not self.claimed:
+            await asyncio.to_thread(_remove, self.path)
+
+
+class SpoolingMultiPartParser(MultiPartParser):
+    """Parser multipart do Starlette com as partes de arquivo gravadas como SpoolingUploadFile"""
+
+    def __init__(self, headers: Headers, stream, directory: str, max_size: int, **options):
+        super().__init__(headers, stream, **options)
+        self.directory = directory
+        self.max_size = max_size
+        self.spooled: List[SpoolingUploadFile] = []
+
+    def on_headers_finished(self) -> None:
+        super().on_headers_finished()
+        part = self._current_part
+        if part.file is not None:
+            # Trocar o arquivo temporário (ainda vazio, em memória) pelo arquivo em `directory`
+            part.file.file.close()
+            self._files_to_close_on_error.pop()
+            part.file = SpoolingUploadFile(self.directory, self.max_size, part.file.filename, part.file.headers)
+            self.spooled.append(part.file)
+
+
+class SpoolingRequest(Request):
+    """
+    Requisição cujo formulário multipart grava os arquivos direto em `directory`
+
+    Sem a cópia do arquivo temporário do Starlette para o diretório de
+    uploads: o corpo é gravado uma única vez, conforme chega. Um arquivo acima
+    de `max_size` interrompe o recebimento com 413.
+    """
+
+    def __init__(self, scope, receive, directory: str, max_size: int):
+        super().__init__(scope, receive)
+        self.directory = directory
+        self.max_size = max_size
+
+    async def form(self, **options) -> FormData:
+        content_type = self.headers.get("content-type", "")
+        if self._form is not None or not content_type.startswith("multipart/form-data"):
+            return await super().form(**options)
+
+        parser = SpoolingMultiPartParser(self.headers, self.stream(), self.directory, self.max_size, **options)
+        try:
+            self._form = await parser.parse()
+        except BaseException as e:
+            for file in parser.spooled:
+                await file.close()
+            if isinstance(e, UploadTooLarge):
+                raise HTTPException(status_code=413, detail=str(e))
+            raise
+        return self._form
+
+
+def spooling_route_class(directory: str, max_size: int) -> Type[APIRoute]:
+    """Classe de rota (`app.router.route_class`) que recebe os uploads com SpoolingRequest"""
+
+    class SpoolingRoute(APIRoute):
+        def get_route_handler(self) -> Callable:
+            handler = super().get_route_handler()
+
+            async def spooling_handler(request: Request):
+                return await handler(SpoolingRequest(request.scope, request.receive, directory, max_size))
+
+            return spooling_handler
+
+    return SpoolingRoute
+
+
+async def spool_upload(file, directory: str, max_size: int, suffix: str = ".pdf") -> SpooledUpload:
+    """
+    Grava o upload (`UploadFile`) em um arquivo em `directory`
+
+    Recebido por uma rota de `spooling_route_class`, o arquivo já foi gravado
+    em disco durante o recebimento e só é reivindicado, sem cópia. Qualquer
+    outro `UploadFile` é copiado em blocos, com a criação e a gravação do
+    arquivo em threads, fora do event loop; a cópia é interrompida e o arquivo
+    removido assim que `max_size` é ultrapassado (`UploadTooLarge`).
+    """
+    if isinstance(file, SpoolingUploadFile):
+        return await file.claim(suffix)
+
+    fd, path = await asyncio.to_thread(tempfile.mkstemp, prefix="upload_", suffix=suffix, dir=directory)
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        f = os.fdopen(fd, "wb")
+        try:
+            while True:
+                chunk = await file.read(SPOOL_CHUNK_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if max_size and size > max_size:
+                    raise UploadTooLarge(max_size)
+                digest.update(chunk)
+                await asyncio.to_thread(f.write, chunk)
+        finally:
+            await asyncio.to_thread(f.close)
+    except BaseException:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        raise
+    return SpooledUpload(path=path, size=size, sha256=digest.hexdigest(), filename=getattr(file, "filename", None))
@@ -0,0 +1,116 @@
+import asyncio
+import logging
+from typing import Awaitable, Callable, List, Optional, Set, Tuple
+
+from ocr_backends import OCRBackend, OCRPageResult
+from ocr_resilience import dispatch_signal, mark_dispatched
+
+logger = logging.getLogger("PDF_OCR_API")
+
+# Limite da Vision API para batch_annotate_images
+VISION_MAX_IMAGES_PER_BATCH = 16
+
+
+class VisionBatcher:
+    """
+    Agrupa imagens de várias páginas (ou de várias requisições) em uma única
+    chamada de lote do backend de OCR (`batch_annotate_images` na Vision API)
+
+    Cada imagem submetida aguarda até `linger_ms` por outras imagens. O lote é
+    enviado assim que atinge `batch_size` imagens, `max_batch_bytes` bytes ou
+    quando o tempo de espera expira. Cada resposta é devolvida à página que a
+    solicitou, na mesma posição em que a imagem entrou no lote.
+
+    Com `acquire` (cota), o lote reserva a cota das imagens antes do envio. As
+    imagens cujo chamador já desistiu (tempo esgotado, cancelamento) saem do
+    lote antes da reserva e de novo antes do envio. O envio é sinalizado a cada
+    tentativa (`mark_dispatched`): a espera na fila e na cota não conta no tempo
+    limite da tentativa.
+    """
+    queued = True
+
+    def __init__(
+        self,
+        backend: OCRBackend,
+        batch_size: int = VISION_MAX_IMAGES_PER_BATCH,
+        linger_ms: float = 20,
+        max_batch_bytes: int = 8 * 1024 * 1024,
+        acquire: Optional[Callable[[int], Awaitable[None]]] = None
+    ):
+        self.backend = backend
+        self.acquire = acquire
+        self.batch_size = max(1, min(batch_size, backend.max_images_per_batch, VISION_MAX_IMAGES_PER_BATCH))
+        self.linger = max(0.0, linger_ms / 1000)
+        self.max_batch_bytes = max_batch_bytes
+        self._pending: List[Tuple[bytes, asyncio.Future, Optional[asyncio.Future]]] = []
+        self._pending_bytes = 0
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self._tasks: Set[asyncio.Task] = set()
+
+    async def annotate(self, content: bytes) -> OCRPageResult:
+        """Submete uma imagem codificada e aguarda a resposta correspondente do lote"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+
+        # Não deixar o lote ultrapassar o tamanho máximo de payload
+        if self._pending and self._pending_bytes + len(content) > self.max_batch_bytes:
+            self._flush()
+
+        self._pending.append((content, future, dispatch_signal()))
+        self._pending_bytes += len(content)
+
+        if len(self._pending) >= self.batch_size:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = loop.call_later(self.linger, self._flush)
+
+        return await future
+
+    def _flush(self):
+        """Envia o lote pendente em segundo plano"""
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+
+        batch = self._pending
+        self._pending = []
+        self._pending_bytes = 0
+        if not batch:
+            return
+
+        task = asyncio.get_running_loop().create_task(self._send(batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _send(self, batch: List[Tuple[bytes, asyncio.Future, Optional[asyncio.Future]]]):
+        try:
+            if self.acquire is not None:
+                # Imagens abandonadas não consomem cota
+                batch = [item for item in batch if not item[1].done()]
+                if not batch:
+                    return
+                await self.acquire(len(batch))
+            batch = [item for item in batch if not item[1].done()]
+            if not batch:
+                return
+            for _, _, signal in batch:
+                if signal is not None:
+                    mark_dispatched(signal)
+            responses = await self._annotate_batch([content for content, _, _ in batch])
+        except Exception as e:
+            logger.error(f"❌ OCR - Erro no lote de {len(batch)} imagem(ns): {str(e)}")
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for (_, future, _), response in zip(batch, responses):
+            if not future.done():
+                future.set_result(response)
+
+    async def _annotate_batch(self, contents: List[bytes]) -> List[OCRPageResult]:
+        """Executa a chamada de lote do backend (aguardada no event loop)"""
+        results = await self.backend.annotate_images(contents)
+        if len(results) != len(contents):
+            raise Exception(f"Backend de OCR retornou {len(results)} respostas para {len(contents)} imagens")
+        return results
@@ -0,0 +1,61 @@
+import logging
+from typing import Dict, List
+
+from google.cloud import vision
+
+logger = logging.getLogger("PDF_OCR_API")
+
+# Limite da Vision API para batch_annotate_files (páginas por AnnotateFileRequest)
+VISION_MAX_PAGES_PER_FILE_REQUEST = 5
+
+
+class VisionFileError(Exception):
+    """Erro retornado pela Vision API para o arquivo inteiro, com o código de status gRPC"""
+
+    def __init__(self, message: str, code: int = 0):
+        super().__init__(message)
+        self.code = code
+
+
+def chunk_pages(page_numbers: List[int], chunk_size: int = VISION_MAX_PAGES_PER_FILE_REQUEST) -> List[List[int]]:
+    """Divide a lista de páginas (base 1) em blocos aceitos pela Vision API"""
+    chunk_size = max(1, min(chunk_size, VISION_MAX_PAGES_PER_FILE_REQUEST))
+    return [page_numbers[i:i + chunk_size] for i in range(0, len(page_numbers), chunk_size)]
+
+
+async def annotate_pdf_pages(client, pdf_content: bytes, page_numbers: List[int]) -> Dict[int, vision.AnnotateImageResponse]:
+    """
+    Envia o PDF diretamente para a Vision API, sem rasterização local
+
+    Args:
+        client: Cliente assíncrono da Vision API
+        pdf_content: Conteúdo do arquivo PDF
+        page_numbers: Páginas (base 1) a processar, no máximo 5 por chamada
+
+    Returns:
+        Dicionário {número da página: resposta da Vision API}
+    """
+    if len(page_numbers) > VISION_MAX_PAGES_PER_FILE_REQUEST:
+        raise ValueError(f"No máximo {VISION_MAX_PAGES_PER_FILE_REQUEST} páginas por chamada (recebido: {len(page_numbers)})")
+
+    request = vision.AnnotateFileRequest(
+        input_config=vision.InputConfig(content=pdf_content, mime_type="application/pdf"),
+        features=[vision.Feature(type_=vision.Feature.Type.TEXT_DETECTION)],
+        pages=page_numbers
+    )
+
+    # A Vision API aceita apenas um AnnotateFileRequest por chamada
+    response = await client.batch_annotate_files(requests=[request])
+    file_response = response.responses[0]
+
+    if file_response.error.message:
+        raise VisionFileError(f"Erro na Vision API: {file_response.error.message}", file_response.error.code)
+
+    # Associar cada resposta à sua página (o contexto traz a página de origem)
+    page_responses = {}
+    for position, page_response in enumerate(file_response.responses):
+        page_number = page_response.context.page_number or page_numbers[position]
+        page_responses[page_number] = page_response
+
+    logger.info(f"📄 Vision API - PDF nativo, páginas {page_numbers[0]}-{page_numbers[-1]} processadas")
+    return page_responses
@@ -0,0 +1,94 @@
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Callable, List
+
+from google.cloud import vision
+from google.cloud.vision_v1.services.image_annotator.transports.grpc_asyncio import ImageAnnotatorGrpcAsyncIOTransport
+
+logger = logging.getLogger("PDF_OCR_API")
+
+
+def create_async_client() -> vision.ImageAnnotatorAsyncClient:
+    """
+    Cliente assíncrono da Vision API com um canal gRPC próprio
+
+    Por padrão o gRPC compartilha a conexão entre canais com os mesmos
+    parâmetros; o pool de subcanais local garante uma conexão HTTP/2 por
+    cliente, para que o pool realmente distribua as chamadas.
+    """
+    channel = ImageAnnotatorGrpcAsyncIOTransport.create_channel(
+        options=[
+            ("grpc.max_send_message_length", -1),
+            ("grpc.max_receive_message_length", -1),
+            ("grpc.use_local_subchannel_pool", 1),
+        ]
+    )
+    return vision.ImageAnnotatorAsyncClient(transport=ImageAnnotatorGrpcAsyncIOTransport(channel=channel))
+
+
+class VisionClientPool:
+    """
+    Pool de clientes assíncronos da Vision API (um canal gRPC por cliente)
+
+    As chamadas são aguardadas no event loop, sem ocupar threads: cada
+    processo pode manter dezenas de chamadas em andamento. Cada chamada usa o
+    cliente com menos chamadas em andamento, limitadas a
+    `max_concurrent_per_client` por canal (acima disso, aguarda).
+    Os clientes são criados no event loop em execução (exigência do gRPC asyncio).
+    """
+
+    def __init__(
+        self,
+        size: int = 2,
+        max_concurrent_per_client: int = 32,
+        client_factory: Callable = create_async_client
+    ):
+        self.size = max(1, size)
+        self.max_concurrent_per_client = max(1, max_concurrent_per_client)
+        self.client_factory = client_factory
+        self._clients: List = []
+        self._semaphores: List[asyncio.Semaphore] = []
+        self._in_flight: List[int] = []
+        self._next = 0
+
+    def open(self):
+        """Cria os clientes do pool (chamado no lifespan, dentro do event loop)"""
+        if self._clients:
+            return
+        clients = [self.client_factory() for _ in range(self.size)]
+        self._clients = clients
+        self._semaphores = [asyncio.Semaphore(self.max_concurrent_per_client) for _ in clients]
+        self._in_flight = [0] * len(clients)
+        logger.info(f"🔌 Vision API - {self.size} cliente(s) assíncrono(s), até {self.max_concurrent_per_client} chamada(s) por canal")
+
+    @asynccontextmanager
+    async def client(self) -> AsyncIterator:
+        """Reserva uma vaga no cliente menos ocupado enquanto a chamada executa"""
+        self.open()
+        # Menor número de chamadas em andamento; empates em rodízio
+        order = [(self._next + i) % len(self._clients) for i in range(len(self._clients))]
+        index = min(order, key=lambda i: self._in_flight[i])
+        self._next = (index + 1) % len(self._clients)
+
+        self._in_flight[index] += 1
+        try:
+            async with self._semaphores[index]:
+                yield self._clients[index]
+        finally:
+            self._in_flight[index] -= 1
+
+    @property
+    def in_flight(self) -> int:
+        return sum(self._in_flight)
+
+    async def close(self):
+        """Fecha os canais gRPC"""
+        clients, self._clients = self._clients, []
+        for client in clients:
+            try:
+                await client.transport.close()
+            except Exception as e:
+                logger.warning(f"⚠️ Erro ao fechar cliente da Vision API: {str(e)}")
+        self._semaphores = []
+        self._in_flight = []